@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import contextlib
 import httpx
 import typing
 import json
@@ -12,14 +13,32 @@ class AsyncDifyServiceClient:
 
     api_key: str
     base_url: str
+    http_client: typing.Optional[httpx.AsyncClient]
+    """外部传入的共享客户端，base_url 须与 self.base_url 一致；为 None 时每次请求新建客户端"""
 
     def __init__(
         self,
         api_key: str,
         base_url: str = 'https://api.dify.ai/v1',
+        http_client: typing.Optional[httpx.AsyncClient] = None,
     ) -> None:
         self.api_key = api_key
         self.base_url = base_url
+        self.http_client = http_client
+
+    @contextlib.asynccontextmanager
+    async def _client(self, timeout: float) -> typing.AsyncIterator[httpx.AsyncClient]:
+        if self.http_client is not None:
+            # 共享的客户端由外部管理，不在这里关闭
+            yield self.http_client
+            return
+
+        async with httpx.AsyncClient(
+            base_url=self.base_url,
+            trust_env=True,
+            timeout=timeout,
+        ) as client:
+            yield client
 
     async def chat_messages(
         self,
@@ -35,11 +54,7 @@ class AsyncDifyServiceClient:
         if response_mode != 'streaming':
             raise DifyAPIError('当前仅支持 streaming 模式')
 
-        async with httpx.AsyncClient(
-            base_url=self.base_url,
-            trust_env=True,
-            timeout=timeout,
-        ) as client:
+        async with self._client(timeout) as client:
             async with client.stream(
                 'POST',
                 '/chat-messages',
@@ -55,6 +70,7 @@ class AsyncDifyServiceClient:
                     'conversation_id': conversation_id,
                     'files': files,
                 },
+                timeout=timeout,
             ) as r:
                 async for chunk in r.aiter_lines():
                     if r.status_code != 200:
@@ -76,11 +92,7 @@ class AsyncDifyServiceClient:
         if response_mode != 'streaming':
             raise DifyAPIError('当前仅支持 streaming 模式')
 
-        async with httpx.AsyncClient(
-            base_url=self.base_url,
-            trust_env=True,
-            timeout=timeout,
-        ) as client:
+        async with self._client(timeout) as client:
             async with client.stream(
                 'POST',
                 '/workflows/run',
@@ -94,6 +106,7 @@ class AsyncDifyServiceClient:
                     'response_mode': response_mode,
                     'files': files,
                 },
+                timeout=timeout,
             ) as r:
                 async for chunk in r.aiter_lines():
                     if r.status_code != 200:
@@ -110,11 +123,7 @@ class AsyncDifyServiceClient:
         timeout: float = 30.0,
     ) -> str:
         """上传文件"""
-        async with httpx.AsyncClient(
-            base_url=self.base_url,
-            trust_env=True,
-            timeout=timeout,
-        ) as client:
+        async with self._client(timeout) as client:
             # multipart/form-data
             response = await client.post(
                 '/files/upload',
@@ -123,6 +132,7 @@ class AsyncDifyServiceClient:
                     'file': file,
                     'user': (None, user),
                 },
+                timeout=timeout,
             )
 
             if response.status_code != 201:
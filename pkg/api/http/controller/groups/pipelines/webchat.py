@@ -1,3 +1,5 @@
+import json
+
 import quart
 
 from ... import group
@@ -25,6 +27,16 @@ class WebChatDebugRouterGroup(group.RouterGroup):
                 if not webchat_adapter:
                     return self.http_status(404, -1, 'WebChat adapter not found')
 
+                if data.get('stream', False):
+                    # 以 Server-Sent Events 逐段返回，最后一段的 is_final 为 true
+                    async def stream_messages():
+                        async for message in webchat_adapter.send_webchat_message_stream(
+                            pipeline_uuid, session_type, message_chain_obj
+                        ):
+                            yield f'data: {json.dumps({"message": message}, ensure_ascii=False)}\n\n'
+
+                    return quart.Response(stream_messages(), mimetype='text/event-stream')
+
                 result = await webchat_adapter.send_webchat_message(pipeline_uuid, session_type, message_chain_obj)
 
                 return self.success(
@@ -1,3 +1,7 @@
+from __future__ import annotations
+
+import quart
+
 from .. import group
 
 
@@ -7,13 +11,94 @@ class StatsRouterGroup(group.RouterGroup):
         @self.route('/basic', methods=['GET'], auth_type=group.AuthType.USER_TOKEN)
         async def _() -> str:
             conv_count = 0
-            for session in self.ap.sess_mgr.session_list:
+            for session in self.ap.sess_mgr.sessions.values():
                 conv_count += len(session.conversations if session.conversations is not None else [])
 
             return self.success(
                 data={
-                    'active_session_count': len(self.ap.sess_mgr.session_list),
+                    'active_session_count': len(self.ap.sess_mgr.sessions),
                     'conversation_count': conv_count,
                     'query_count': self.ap.query_pool.query_id_counter,
+                    **self.ap.sess_mgr.get_eviction_stats(),
+                    'queue_depths': self.ap.query_pool.get_lane_depths(),
+                    'shed_query_counts': self.ap.query_pool.get_shed_counts(),
+                    'coalesced_query_count': self.ap.query_pool.coalesced_count,
+                    'dispatch_latency': self.ap.ctrl.dispatch_latency.to_dict(),
+                    'response_cache': self.ap.model_mgr.response_cache.to_dict(),
+                }
+            )
+
+        @self.route('/models', methods=['GET'], auth_type=group.AuthType.USER_TOKEN)
+        async def _() -> str:
+            return self.success(
+                data={
+                    'models': [
+                        {
+                            'uuid': model.model_entity.uuid,
+                            'name': model.model_entity.name,
+                            'usage': model.usage_stats.to_dict(),
+                            'tokens': model.token_mgr.stats(),
+                            'latency': model.latency.to_dict(),
+                            'limiter': model.limiter.to_dict(),
+                            'retry': model.retry_stats.to_dict(),
+                        }
+                        for model in self.ap.model_mgr.llm_models
+                    ]
+                }
+            )
+
+
+@group.group_class('stats-pipelines', '/api/v1/stats/pipelines')
+class PipelineStatsRouterGroup(group.RouterGroup):
+    async def initialize(self) -> None:
+        @self.route('', methods=['GET'], auth_type=group.AuthType.USER_TOKEN)
+        async def _() -> str:
+            profiler = self.ap.pipeline_mgr.profiler
+
+            return self.success(
+                data={
+                    'pipelines': [profiler.get_pipeline_stats(uuid) for uuid in profiler.get_pipeline_uuids()],
+                    'profiler': profiler.get_sampling_config(),
+                }
+            )
+
+        @self.route('/_/profiler', methods=['GET', 'PUT'], auth_type=group.AuthType.USER_TOKEN)
+        async def _() -> str:
+            profiler = self.ap.pipeline_mgr.profiler
+
+            if quart.request.method == 'PUT':
+                json_data = await quart.request.json
+
+                profiler.set_sampling(
+                    enabled=bool(json_data.get('enabled', profiler.sampling_enabled)),
+                    slow_threshold=json_data.get('slow_threshold'),
+                    max_samples=json_data.get('max_samples'),
+                )
+
+            return self.success(data={'profiler': profiler.get_sampling_config()})
+
+        @self.route('/_/slow-queries', methods=['GET'], auth_type=group.AuthType.USER_TOKEN)
+        async def _() -> str:
+            return self.success(data={'slow_queries': self.ap.pipeline_mgr.profiler.get_slow_queries()})
+
+        @self.route('/_/reset', methods=['POST'], auth_type=group.AuthType.USER_TOKEN)
+        async def _() -> str:
+            self.ap.pipeline_mgr.profiler.reset()
+
+            return self.success()
+
+        @self.route('/<pipeline_uuid>', methods=['GET', 'DELETE'], auth_type=group.AuthType.USER_TOKEN)
+        async def _(pipeline_uuid: str) -> str:
+            profiler = self.ap.pipeline_mgr.profiler
+
+            if quart.request.method == 'DELETE':
+                profiler.reset(pipeline_uuid)
+
+                return self.success()
+
+            return self.success(
+                data={
+                    **profiler.get_pipeline_stats(pipeline_uuid),
+                    'slow_queries': profiler.get_slow_queries(pipeline_uuid),
                 }
             )
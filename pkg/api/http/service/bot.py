@@ -94,8 +94,9 @@ class BotService:
             await runtime_bot.run()
 
         # update all conversation that use this bot
-        for session in self.ap.sess_mgr.session_list:
+        for session in self.ap.sess_mgr.sessions.values():
             if session.using_conversation is not None and session.using_conversation.bot_uuid == bot_uuid:
+                self.ap.sess_mgr.conversation_store.archive_conversation(session.using_conversation)
                 session.using_conversation = None
 
     async def delete_bot(self, bot_uuid: str) -> None:
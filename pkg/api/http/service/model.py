@@ -68,10 +68,9 @@ class ModelsService:
             .values(**model_data)
         )
 
-        await self.ap.model_mgr.remove_llm_model(model_uuid)
-
         llm_model = await self.get_llm_model(model_uuid)
 
+        # 新模型初始化完成后原地替换
         await self.ap.model_mgr.load_llm_model(llm_model)
 
     async def delete_llm_model(self, model_uuid: str) -> None:
@@ -85,10 +84,7 @@ class ModelsService:
         runtime_llm_model: model_requester.RuntimeLLMModel | None = None
 
         if model_uuid != '_':
-            for model in self.ap.model_mgr.llm_models:
-                if model.model_entity.uuid == model_uuid:
-                    runtime_llm_model = model
-                    break
+            runtime_llm_model = self.ap.model_mgr.llm_models_by_uuid.get(model_uuid)
 
             if runtime_llm_model is None:
                 raise Exception('model not found')
@@ -24,6 +24,20 @@ default_stage_order = [
 ]
 
 
+def _conversation_binding_changed(old_ai_config: dict, new_ai_config: dict) -> bool:
+    """运行器或外部运行器的配置改变时，已有对话（可能绑定了外部会话）不能继续使用"""
+    old_runner = old_ai_config['runner']['runner']
+    new_runner = new_ai_config['runner']['runner']
+
+    if old_runner != new_runner:
+        return True
+
+    if new_runner == 'local-agent':
+        return False
+
+    return old_ai_config.get(new_runner) != new_ai_config.get(new_runner)
+
+
 class PipelineService:
     ap: app.Application
 
@@ -109,13 +123,21 @@ class PipelineService:
                 bot_data = {'use_pipeline_name': pipeline_data['name']}
                 await self.ap.bot_service.update_bot(bot.uuid, bot_data)
 
-        await self.ap.pipeline_mgr.remove_pipeline(pipeline_uuid)
+        old_pipeline = await self.ap.pipeline_mgr.get_pipeline_by_uuid(pipeline_uuid)
+        old_config = old_pipeline.pipeline_entity.config if old_pipeline is not None else None
+
+        # hot reload, queries in flight finish on the old version
         await self.ap.pipeline_mgr.load_pipeline(pipeline)
 
         # update all conversation that use this pipeline
-        for session in self.ap.sess_mgr.session_list:
-            if session.using_conversation is not None and session.using_conversation.pipeline_uuid == pipeline_uuid:
-                session.using_conversation = None
+        new_config = pipeline['config']
+
+        if old_config is None or _conversation_binding_changed(old_config['ai'], new_config['ai']):
+            self.ap.sess_mgr.refresh_pipeline_conversations(pipeline_uuid, reset=True)
+        elif old_config['ai']['local-agent']['prompt'] != new_config['ai']['local-agent']['prompt']:
+            self.ap.sess_mgr.refresh_pipeline_conversations(
+                pipeline_uuid, prompt_config=new_config['ai']['local-agent']['prompt']
+            )
 
     async def delete_pipeline(self, pipeline_uuid: str) -> None:
         await self.ap.persistence_mgr.execute_async(
@@ -27,6 +27,8 @@ class DelOperator(operator.CommandOperator):
             if context.session.conversations[to_delete_index] == context.session.using_conversation:
                 context.session.using_conversation = None
 
+            self.ap.sess_mgr.conversation_store.delete_conversation(context.session.conversations[to_delete_index])
+
             del context.session.conversations[to_delete_index]
 
             yield entities.CommandReturn(text=f'已删除对话: {delete_index}')
@@ -37,6 +39,8 @@ class DelOperator(operator.CommandOperator):
 @operator.operator_class(name='all', help='删除此会话的所有历史记录', parent_class=DelOperator)
 class DelAllOperator(operator.CommandOperator):
     async def execute(self, context: entities.ExecuteContext) -> typing.AsyncGenerator[entities.CommandReturn, None]:
+        self.ap.sess_mgr.conversation_store.delete_session_conversations(context.session)
+
         context.session.conversations = []
         context.session.using_conversation = None
 
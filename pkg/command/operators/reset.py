@@ -9,6 +9,9 @@ from .. import operator, entities
 class ResetOperator(operator.CommandOperator):
     async def execute(self, context: entities.ExecuteContext) -> typing.AsyncGenerator[entities.CommandReturn, None]:
         """执行"""
+        if context.session.using_conversation is not None:
+            self.ap.sess_mgr.conversation_store.archive_conversation(context.session.using_conversation)
+
         context.session.using_conversation = None
 
         yield entities.CommandReturn(text='已重置当前会话')
@@ -25,6 +25,7 @@ from ..api.http.service import bot as bot_service
 from ..discover import engine as discover_engine
 from ..storage import mgr as storagemgr
 from ..utils import logcache
+from ..utils import httpclient
 from . import taskmgr
 from . import entities as core_entities
 
@@ -143,6 +144,11 @@ class Application:
                 name='http-api-controller',
                 scopes=[core_entities.LifecycleControlScope.APPLICATION],
             )
+            self.task_mgr.create_task(
+                self.sess_mgr.conversation_store.run(),
+                name='conversation-store',
+                scopes=[core_entities.LifecycleControlScope.APPLICATION],
+            )
             self.task_mgr.create_task(
                 never_ending(),
                 name='never-ending-task',
@@ -156,6 +162,8 @@ class Application:
         except Exception as e:
             self.logger.error(f'应用运行致命异常: {e}')
             self.logger.debug(f'Traceback: {traceback.format_exc()}')
+        finally:
+            await httpclient.close_all()
 
     async def print_web_access_info(self):
         """打印访问 webui 的提示"""
@@ -3,7 +3,6 @@ from __future__ import annotations
 import enum
 import typing
 import datetime
-import asyncio
 
 import pydantic.v1 as pydantic
 
@@ -32,8 +31,49 @@ class LauncherTypes(enum.Enum):
     """群聊"""
 
 
-class Query(pydantic.BaseModel):
-    """一次请求的信息封装"""
+def _coerce_id(value: typing.Union[int, str]) -> typing.Union[int, str]:
+    """与 pydantic 对 Union[int, str] 字段的处理保持一致：能转为整数的转为整数"""
+    if isinstance(value, int):
+        return value
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+class Query:
+    """一次请求的信息封装
+
+    每条消息都会构造一个，并在各阶段间传递，因此使用 __slots__ 的普通类实现：
+    构造和赋值时不做校验，只在交给插件前（插件事件）调用 validate 校验字段类型。
+    属性与原 pydantic 模型保持一致。
+    """
+
+    __slots__ = (
+        'query_id',
+        'launcher_type',
+        'launcher_id',
+        'sender_id',
+        'message_event',
+        'message_chain',
+        'bot_uuid',
+        'pipeline_uuid',
+        'pipeline_config',
+        'adapter',
+        'session',
+        'messages',
+        'prompt',
+        'user_message',
+        'variables',
+        'use_llm_model',
+        'use_funcs',
+        'resp_messages',
+        'resp_message_chain',
+        'resp_stream',
+        'current_stage',
+        'enqueue_time',
+        'deadline',
+    )
 
     query_id: int
     """请求ID，添加进请求池时生成"""
@@ -53,53 +93,160 @@ class Query(pydantic.BaseModel):
     message_chain: platform_message.MessageChain
     """消息链，platform收到的原始消息链"""
 
-    bot_uuid: typing.Optional[str] = None
+    bot_uuid: typing.Optional[str]
     """机器人UUID。"""
 
-    pipeline_uuid: typing.Optional[str] = None
+    pipeline_uuid: typing.Optional[str]
     """流水线UUID。"""
 
-    pipeline_config: typing.Optional[dict[str, typing.Any]] = None
+    pipeline_config: typing.Optional[dict[str, typing.Any]]
     """流水线配置，由 Pipeline 在运行开始时设置。"""
 
     adapter: msadapter.MessagePlatformAdapter
     """消息平台适配器对象，单个app中可能启用了多个消息平台适配器，此对象表明发起此query的适配器"""
 
-    session: typing.Optional[Session] = None
+    session: typing.Optional[Session]
     """会话对象，由前置处理器阶段设置"""
 
-    messages: typing.Optional[list[llm_entities.Message]] = []
-    """历史消息列表，由前置处理器阶段设置"""
+    messages: typing.Optional[typing.Union[list[llm_entities.Message], llm_entities.MessageHistory]]
+    """历史消息列表，由前置处理器阶段设置，为与对话共享的写时复制视图"""
 
-    prompt: typing.Optional[llm_entities.Prompt] = None
+    prompt: typing.Optional[llm_entities.Prompt]
     """情景预设内容，由前置处理器阶段设置"""
 
-    user_message: typing.Optional[llm_entities.Message] = None
+    user_message: typing.Optional[llm_entities.Message]
     """此次请求的用户消息对象，由前置处理器阶段设置"""
 
-    variables: typing.Optional[dict[str, typing.Any]] = None
+    variables: typing.Optional[dict[str, typing.Any]]
     """变量，由前置处理器阶段设置。在prompt中嵌入或由 Runner 传递到 LLMOps 平台。"""
 
-    use_llm_model: typing.Optional[requester.RuntimeLLMModel] = None
+    use_llm_model: typing.Optional[requester.RuntimeLLMModel]
     """使用的对话模型，由前置处理器阶段设置"""
 
-    use_funcs: typing.Optional[list[tools_entities.LLMFunction]] = None
+    use_funcs: typing.Optional[list[tools_entities.LLMFunction]]
     """使用的函数，由前置处理器阶段设置"""
 
-    resp_messages: (
-        typing.Optional[list[llm_entities.Message]] | typing.Optional[list[platform_message.MessageChain]]
-    ) = []
+    resp_messages: typing.Optional[list[llm_entities.Message]] | typing.Optional[list[platform_message.MessageChain]]
     """由Process阶段生成的回复消息对象列表"""
 
-    resp_message_chain: typing.Optional[list[platform_message.MessageChain]] = None
+    resp_message_chain: typing.Optional[list[platform_message.MessageChain]]
     """回复消息链，从resp_messages包装而得"""
 
+    resp_stream: typing.Optional[msadapter.StreamReply]
+    """正在流式输出的回复，由发送回复阶段在输出第一段时设置，输出完整回复后清空"""
+
     # ======= 内部保留 =======
-    current_stage: typing.Optional['pkg.pipeline.pipelinemgr.StageInstContainer'] = None
+    current_stage: typing.Optional['pkg.pipeline.pipelinemgr.StageInstContainer']
     """当前所处阶段"""
 
-    class Config:
-        arbitrary_types_allowed = True
+    enqueue_time: typing.Optional[float]
+    """加入请求池的时间（time.monotonic()），用于统计调度延迟"""
+
+    deadline: typing.Optional[float]
+    """请求有效期截止时间（time.monotonic()），超过后尚未处理的请求会被丢弃"""
+
+    def __init__(
+        self,
+        query_id: int,
+        launcher_type: LauncherTypes,
+        launcher_id: typing.Union[int, str],
+        sender_id: typing.Union[int, str],
+        message_event: platform_events.MessageEvent,
+        message_chain: platform_message.MessageChain,
+        adapter: msadapter.MessagePlatformAdapter,
+        bot_uuid: typing.Optional[str] = None,
+        pipeline_uuid: typing.Optional[str] = None,
+        pipeline_config: typing.Optional[dict[str, typing.Any]] = None,
+        session: typing.Optional[Session] = None,
+        messages: typing.Optional[list[llm_entities.Message]] = None,
+        prompt: typing.Optional[llm_entities.Prompt] = None,
+        user_message: typing.Optional[llm_entities.Message] = None,
+        variables: typing.Optional[dict[str, typing.Any]] = None,
+        use_llm_model: typing.Optional[requester.RuntimeLLMModel] = None,
+        use_funcs: typing.Optional[list[tools_entities.LLMFunction]] = None,
+        resp_messages: typing.Optional[list] = None,
+        resp_message_chain: typing.Optional[list[platform_message.MessageChain]] = None,
+        resp_stream: typing.Optional[msadapter.StreamReply] = None,
+        current_stage: typing.Optional['pkg.pipeline.pipelinemgr.StageInstContainer'] = None,
+        enqueue_time: typing.Optional[float] = None,
+        deadline: typing.Optional[float] = None,
+    ):
+        self.query_id = query_id
+        self.launcher_type = launcher_type
+        self.launcher_id = _coerce_id(launcher_id)
+        self.sender_id = _coerce_id(sender_id)
+        self.message_event = message_event
+        self.message_chain = message_chain
+        self.adapter = adapter
+        self.bot_uuid = bot_uuid
+        self.pipeline_uuid = pipeline_uuid
+        self.pipeline_config = pipeline_config
+        self.session = session
+        self.messages = messages if messages is not None else []
+        self.prompt = prompt
+        self.user_message = user_message
+        self.variables = variables
+        self.use_llm_model = use_llm_model
+        self.use_funcs = use_funcs
+        self.resp_messages = resp_messages if resp_messages is not None else []
+        self.resp_message_chain = resp_message_chain
+        self.resp_stream = resp_stream
+        self.current_stage = current_stage
+        self.enqueue_time = enqueue_time
+        self.deadline = deadline
+
+    def __repr__(self) -> str:
+        # 只输出标识字段，避免在日志中展开消息事件、会话等大对象
+        return (
+            f'Query(query_id={self.query_id}, launcher_type={self.launcher_type.value}, '
+            f'launcher_id={self.launcher_id}, sender_id={self.sender_id}, '
+            f'bot_uuid={self.bot_uuid}, pipeline_uuid={self.pipeline_uuid})'
+        )
+
+    __str__ = __repr__
+
+    # ======= 校验 =======
+
+    @classmethod
+    def __get_validators__(cls):
+        """作为 pydantic 模型的字段时只检查类型，不复制、不逐字段校验"""
+        yield cls._check_instance
+
+    @classmethod
+    def _check_instance(cls, value: typing.Any) -> Query:
+        if not isinstance(value, cls):
+            raise TypeError(f'Query expected, got {type(value).__name__}')
+        return value
+
+    def validate(self) -> Query:
+        """校验各字段类型，在交给插件前调用
+
+        Raises:
+            TypeError: 字段类型不符
+        """
+        for name, expected_types, optional in query_field_types:
+            value = getattr(self, name)
+
+            if value is None and optional:
+                continue
+
+            if not isinstance(value, expected_types):
+                raise TypeError(f'Query.{name} expected {expected_types}, got {type(value).__name__}')
+
+        return self
+
+    # ======= 与原 pydantic 模型兼容的方法 =======
+
+    def copy(self) -> Query:
+        """浅复制"""
+        new_query = Query.__new__(Query)
+        for name in Query.__slots__:
+            setattr(new_query, name, getattr(self, name))
+        return new_query
+
+    def dict(self) -> dict[str, typing.Any]:
+        """以字典形式返回各字段（不递归转换）"""
+        return {name: getattr(self, name) for name in Query.__slots__}
 
     # ========== 插件可调用的 API（请求 API） ==========
 
@@ -146,6 +293,15 @@ class Conversation(pydantic.BaseModel):
     uuid: typing.Optional[str] = None
     """该对话的 uuid，在创建时不会自动生成。而是当使用 Dify API 等由外部管理对话信息的服务时，用于绑定外部的会话。具体如何使用，取决于 Runner。"""
 
+    record_uuid: typing.Optional[str] = None
+    """持久化记录的 uuid，未启用对话持久化时为 None"""
+
+    round_count: int = 0
+    """已持久化的对话轮数"""
+
+    summary: typing.Optional[str] = None
+    """已从 messages 中移除的早期回合的摘要，仅 summary 截断器使用"""
+
     class Config:
         arbitrary_types_allowed = True
 
@@ -169,8 +325,33 @@ class Session(pydantic.BaseModel):
 
     update_time: typing.Optional[datetime.datetime] = pydantic.Field(default_factory=datetime.datetime.now)
 
-    semaphore: typing.Optional[asyncio.Semaphore] = None
-    """当前会话的信号量，用于限制并发"""
+    conversation_loaded: typing.Optional[bool] = False
+    """是否已尝试从数据库加载当前对话，仅在会话首次取对话时加载"""
 
     class Config:
         arbitrary_types_allowed = True
+
+
+query_field_types: list[tuple[str, tuple[type, ...], bool]] = [
+    ('query_id', (int,), False),
+    ('launcher_type', (LauncherTypes,), False),
+    ('launcher_id', (int, str), False),
+    ('sender_id', (int, str), False),
+    ('message_event', (platform_events.MessageEvent,), False),
+    ('message_chain', (platform_message.MessageChain,), False),
+    ('adapter', (msadapter.MessagePlatformAdapter,), False),
+    ('bot_uuid', (str,), True),
+    ('pipeline_uuid', (str,), True),
+    ('pipeline_config', (dict,), True),
+    ('session', (Session,), True),
+    ('messages', (list, llm_entities.MessageHistory), True),
+    ('prompt', (llm_entities.Prompt,), True),
+    ('user_message', (llm_entities.Message,), True),
+    ('variables', (dict,), True),
+    ('use_llm_model', (requester.RuntimeLLMModel,), True),
+    ('use_funcs', (list,), True),
+    ('resp_messages', (list,), True),
+    ('resp_message_chain', (list,), True),
+    ('resp_stream', (msadapter.StreamReply,), True),
+]
+"""Query.validate 检查的字段: (名称, 允许的类型, 是否可为 None)"""
@@ -2,7 +2,7 @@ from __future__ import annotations
 
 
 from .. import stage, app
-from ...utils import version, proxy, announce
+from ...utils import version, proxy, announce, httpclient
 from ...pipeline import pool, controller, pipelinemgr
 from ...plugin import manager as plugin_mgr
 from ...command import cmdmgr
@@ -38,6 +38,9 @@ class BuildAppStage(stage.BootingStage):
         await proxy_mgr.initialize()
         ap.proxy_mgr = proxy_mgr
 
+        # 共享的 HTTP 客户端在代理设置到环境变量后才创建
+        httpclient.configure(ap.instance_config.data.get('http-client', {}))
+
         ver_mgr = version.VersionManager(ap)
         await ver_mgr.initialize()
         ap.ver_mgr = ver_mgr
@@ -46,7 +49,7 @@ class BuildAppStage(stage.BootingStage):
         ann_mgr = announce.AnnouncementManager(ap)
         ap.ann_mgr = ann_mgr
 
-        ap.query_pool = pool.QueryPool()
+        ap.query_pool = pool.QueryPool(ap)
 
         log_cache = logcache.LogCache()
         ap.log_cache = log_cache
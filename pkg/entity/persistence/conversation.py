@@ -0,0 +1,46 @@
+import sqlalchemy
+
+from .base import Base
+
+
+class Conversation(Base):
+    """对话"""
+
+    __tablename__ = 'conversations'
+
+    uuid = sqlalchemy.Column(sqlalchemy.String(255), primary_key=True, unique=True)
+    launcher_type = sqlalchemy.Column(sqlalchemy.String(255), nullable=False)
+    launcher_id = sqlalchemy.Column(sqlalchemy.String(255), nullable=False)
+    pipeline_uuid = sqlalchemy.Column(sqlalchemy.String(255), nullable=False)
+    bot_uuid = sqlalchemy.Column(sqlalchemy.String(255), nullable=False)
+    external_uuid = sqlalchemy.Column(sqlalchemy.String(255), nullable=True)
+    """Runner 绑定的外部会话 id（如 Dify 的 conversation_id）"""
+    round_count = sqlalchemy.Column(sqlalchemy.Integer, nullable=False, default=0)
+    summary = sqlalchemy.Column(sqlalchemy.Text, nullable=True)
+    """早期回合的摘要"""
+    archived = sqlalchemy.Column(sqlalchemy.Boolean, nullable=False, default=False)
+    """已被重置的对话，不再被加载为当前对话"""
+    created_at = sqlalchemy.Column(sqlalchemy.DateTime, nullable=False, server_default=sqlalchemy.func.now())
+    updated_at = sqlalchemy.Column(
+        sqlalchemy.DateTime,
+        nullable=False,
+        server_default=sqlalchemy.func.now(),
+        onupdate=sqlalchemy.func.now(),
+    )
+
+    __table_args__ = (sqlalchemy.Index('ix_conversations_session', 'launcher_type', 'launcher_id', 'pipeline_uuid'),)
+
+
+class Message(Base):
+    """对话中的消息"""
+
+    __tablename__ = 'messages'
+
+    id = sqlalchemy.Column(sqlalchemy.Integer, primary_key=True, autoincrement=True)
+    conversation_uuid = sqlalchemy.Column(sqlalchemy.String(255), nullable=False, index=True)
+    round_index = sqlalchemy.Column(sqlalchemy.Integer, nullable=False)
+    """所属轮次，从 1 开始"""
+    role = sqlalchemy.Column(sqlalchemy.String(255), nullable=False)
+    content = sqlalchemy.Column(sqlalchemy.JSON, nullable=False)
+    """provider Message 序列化后的内容"""
+    created_at = sqlalchemy.Column(sqlalchemy.DateTime, nullable=False, server_default=sqlalchemy.func.now())
@@ -0,0 +1,46 @@
+from .. import migration
+
+import sqlalchemy
+
+from ...entity.persistence import pipeline as persistence_pipeline
+
+
+@migration.migration_class(7)
+class DBMigrateFallbackModelConfig(migration.DBMigration):
+    """备用模型与对冲请求配置"""
+
+    async def upgrade(self):
+        """升级"""
+        # read all pipelines
+        pipelines = await self.ap.persistence_mgr.execute_async(sqlalchemy.select(persistence_pipeline.LegacyPipeline))
+
+        for pipeline in pipelines:
+            serialized_pipeline = self.ap.persistence_mgr.serialize_model(persistence_pipeline.LegacyPipeline, pipeline)
+
+            config = serialized_pipeline['config']
+
+            local_agent_cfg = config['ai']['local-agent']
+
+            if 'fallback-models' not in local_agent_cfg:
+                local_agent_cfg['fallback-models'] = []
+
+            if 'attempt-timeout' not in local_agent_cfg:
+                local_agent_cfg['attempt-timeout'] = 0
+
+            if 'hedge-requests' not in local_agent_cfg:
+                local_agent_cfg['hedge-requests'] = False
+
+            await self.ap.persistence_mgr.execute_async(
+                sqlalchemy.update(persistence_pipeline.LegacyPipeline)
+                .where(persistence_pipeline.LegacyPipeline.uuid == serialized_pipeline['uuid'])
+                .values(
+                    {
+                        'config': config,
+                        'for_version': self.ap.ver_mgr.get_current_version(),
+                    }
+                )
+            )
+
+    async def downgrade(self):
+        """降级"""
+        pass
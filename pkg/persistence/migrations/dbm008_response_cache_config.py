@@ -0,0 +1,46 @@
+from .. import migration
+
+import sqlalchemy
+
+from ...entity.persistence import pipeline as persistence_pipeline
+
+
+@migration.migration_class(8)
+class DBMigrateResponseCacheConfig(migration.DBMigration):
+    """回复缓存配置"""
+
+    async def upgrade(self):
+        """升级"""
+        # read all pipelines
+        pipelines = await self.ap.persistence_mgr.execute_async(sqlalchemy.select(persistence_pipeline.LegacyPipeline))
+
+        for pipeline in pipelines:
+            serialized_pipeline = self.ap.persistence_mgr.serialize_model(persistence_pipeline.LegacyPipeline, pipeline)
+
+            config = serialized_pipeline['config']
+
+            local_agent_cfg = config['ai']['local-agent']
+
+            if 'response-cache' not in local_agent_cfg:
+                local_agent_cfg['response-cache'] = False
+
+            if 'response-cache-ttl' not in local_agent_cfg:
+                local_agent_cfg['response-cache-ttl'] = 3600
+
+            if 'response-cache-similarity' not in local_agent_cfg:
+                local_agent_cfg['response-cache-similarity'] = 1.0
+
+            await self.ap.persistence_mgr.execute_async(
+                sqlalchemy.update(persistence_pipeline.LegacyPipeline)
+                .where(persistence_pipeline.LegacyPipeline.uuid == serialized_pipeline['uuid'])
+                .values(
+                    {
+                        'config': config,
+                        'for_version': self.ap.ver_mgr.get_current_version(),
+                    }
+                )
+            )
+
+    async def downgrade(self):
+        """降级"""
+        pass
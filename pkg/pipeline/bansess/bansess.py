@@ -11,9 +11,28 @@ class BanSessionCheckStage(stage.PipelineStage):
     仅检查query中群号或个人号是否在访问控制列表中。
     """
 
+    initialize_config_paths = []
+
     async def initialize(self, pipeline_config: dict):
         pass
 
+    def is_noop(
+        self,
+        stage_inst_name: str,
+        pipeline_config: dict,
+        launcher_type: core_entities.LauncherTypes,
+    ) -> bool:
+        mode = pipeline_config['trigger']['access-control']['mode']
+
+        sess_list = pipeline_config['trigger']['access-control'][mode]
+
+        if mode == 'whitelist':
+            # 该类型全部放行
+            return f'{launcher_type.value}_*' in sess_list
+        else:
+            # 黑名单中没有该类型的会话
+            return not any(sess.startswith(f'{launcher_type.value}_') for sess in sess_list)
+
     async def process(self, query: core_entities.Query, stage_inst_name: str) -> entities.StageProcessResult:
         found = False
 
@@ -30,6 +30,8 @@ class ContentFilterStage(stage.PipelineStage):
             query.resp_messages
     """
 
+    initialize_config_paths = ['safety.content-filter.check-sensitive-words']
+
     filter_chain: list[filter_model.ContentFilter]
 
     def __init__(self, ap: app.Application):
@@ -55,6 +57,37 @@ class ContentFilterStage(stage.PipelineStage):
         for filter in self.filter_chain:
             await filter.initialize()
 
+    def is_noop(
+        self,
+        stage_inst_name: str,
+        pipeline_config: dict,
+        launcher_type: core_entities.LauncherTypes,
+    ) -> bool:
+        scope = pipeline_config['safety']['content-filter']['scope']
+
+        if stage_inst_name == 'PreContentFilterStage':
+            if scope == 'output-msg':
+                return True
+            enable_stage = filter_entities.EnableStage.PRE
+        elif stage_inst_name == 'PostContentFilterStage':
+            if scope == 'income-msg':
+                return True
+            enable_stage = filter_entities.EnableStage.POST
+        else:
+            return False
+
+        ignore_rules = pipeline_config['trigger'].get('ignore-rules', {})
+
+        for filter in self.filter_chain:
+            if enable_stage not in filter.enable_stages:
+                continue
+            # 未配置忽略规则时 content-ignore 必定放行
+            if filter.name == 'content-ignore' and not ignore_rules.get('prefix') and not ignore_rules.get('regexp'):
+                continue
+            return False
+
+        return True
+
     async def _pre_process(
         self,
         message: str,
@@ -1,9 +1,12 @@
 from __future__ import annotations
 
 import asyncio
+import time
 import traceback
 
 from ..core import app, entities
+from ..provider.modelmgr import limiter
+from ..utils import metrics
 
 
 class Controller:
@@ -14,57 +17,64 @@ class Controller:
     semaphore: asyncio.Semaphore = None
     """请求并发控制信号量"""
 
+    dispatch_batch_size: int = 1
+    """单次持有请求池锁时最多取出的请求数，大于 1 时为批量调度模式"""
+
+    dispatch_latency: metrics.Histogram
+    """调度延迟：从加入请求池到流水线开始处理的耗时（秒）"""
+
     def __init__(self, ap: app.Application):
         self.ap = ap
         self.semaphore = asyncio.Semaphore(self.ap.instance_config.data['concurrency']['pipeline'])
+        self.dispatch_batch_size = max(1, self.ap.instance_config.data['concurrency'].get('dispatch-batch-size', 1))
+        self.dispatch_latency = metrics.Histogram()
+
+    async def _process_query(self, selected_query: entities.Query):
+        try:
+            # 总并发上限，请求在模型的限流队列中等待时会暂时归还
+            async with limiter.PipelineSlot(self.semaphore) as slot:
+                limiter.current_pipeline_slot.set(slot)
+
+                if selected_query.enqueue_time is not None:
+                    self.dispatch_latency.observe(time.monotonic() - selected_query.enqueue_time)
+
+                # 等待过久的请求直接丢弃，不再进入流水线
+                if self.ap.query_pool.is_expired(selected_query):
+                    self.ap.query_pool.mark_expired(selected_query)
+                    return
+
+                # find pipeline
+                # Here firstly find the bot, then find the pipeline, in case the bot adapter's config is not the latest one.
+                # Like aiocqhttp, once a client is connected, even the adapter was updated and restarted, the existing client connection will not be affected.
+                pipeline_uuid = selected_query.pipeline_uuid
+
+                if pipeline_uuid:
+                    pipeline = await self.ap.pipeline_mgr.get_pipeline_by_uuid(pipeline_uuid)
+                    if pipeline:
+                        await pipeline.run(selected_query)
+        finally:
+            async with self.ap.query_pool:
+                # 释放会话并发名额，若该会话还有排队请求会唤醒调度器
+                self.ap.query_pool.release_query(selected_query)
 
     async def consumer(self):
         """事件处理循环"""
         try:
             while True:
-                selected_query: entities.Query = None
+                selected_queries: list[entities.Query] = []
 
                 # 取请求
                 async with self.ap.query_pool:
-                    queries: list[entities.Query] = self.ap.query_pool.queries
-
-                    for query in queries:
-                        session = await self.ap.sess_mgr.get_session(query)
-                        self.ap.logger.debug(f'Checking query {query} session {session}')
-
-                        if not session.semaphore.locked():
-                            selected_query = query
-                            await session.semaphore.acquire()
+                    # 请求池只返回会话并发未满的请求，已占用对应会话的并发名额
+                    selected_queries = self.ap.query_pool.get_ready_queries(self.dispatch_batch_size)
 
-                            break
-
-                    if selected_query:  # 找到了
-                        queries.remove(selected_query)
-                    else:  # 没找到 说明：没有请求 或者 所有query对应的session都已达到并发上限
+                    if not selected_queries:  # 没有请求 或者 所有query对应的session都已达到并发上限
                         await self.ap.query_pool.condition.wait()
                         continue
 
-                if selected_query:
-
-                    async def _process_query(selected_query: entities.Query):
-                        async with self.semaphore:  # 总并发上限
-                            # find pipeline
-                            # Here firstly find the bot, then find the pipeline, in case the bot adapter's config is not the latest one.
-                            # Like aiocqhttp, once a client is connected, even the adapter was updated and restarted, the existing client connection will not be affected.
-                            pipeline_uuid = selected_query.pipeline_uuid
-
-                            if pipeline_uuid:
-                                pipeline = await self.ap.pipeline_mgr.get_pipeline_by_uuid(pipeline_uuid)
-                                if pipeline:
-                                    await pipeline.run(selected_query)
-
-                        async with self.ap.query_pool:
-                            (await self.ap.sess_mgr.get_session(selected_query)).semaphore.release()
-                            # 通知其他协程，有新的请求可以处理了
-                            self.ap.query_pool.condition.notify_all()
-
+                for selected_query in selected_queries:
                     self.ap.task_mgr.create_task(
-                        _process_query(selected_query),
+                        self._process_query(selected_query),
                         kind='query',
                         name=f'query-{selected_query.query_id}',
                         scopes=[
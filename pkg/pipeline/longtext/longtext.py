@@ -7,6 +7,7 @@ from . import strategy
 from .. import stage, entities
 from ...core import entities as core_entities
 from ...platform.types import message as platform_message
+from ...provider import entities as llm_entities
 from ...utils import importutil
 
 from . import strategies
@@ -22,6 +23,8 @@ class LongTextProcessStage(stage.PipelineStage):
         - resp_message_chain
     """
 
+    initialize_config_paths = ['output.long-text-processing']
+
     strategy_impl: strategy.LongTextStrategy
 
     async def initialize(self, pipeline_config: dict):
@@ -68,6 +71,11 @@ class LongTextProcessStage(stage.PipelineStage):
         await self.strategy_impl.initialize()
 
     async def process(self, query: core_entities.Query, stage_inst_name: str) -> entities.StageProcessResult:
+        # 流式输出的回复是在已发出的消息上编辑文字，不转换为图片或转发消息
+        # 超出平台单条消息长度上限的部分由适配器分条发送
+        if query.resp_stream is not None or isinstance(query.resp_messages[-1], llm_entities.MessageChunk):
+            return entities.StageProcessResult(result_type=entities.ResultType.CONTINUE, new_query=query)
+
         # 检查是否包含非 Plain 组件
         contains_non_plain = False
 
@@ -17,10 +17,12 @@ class ConversationMessageTruncator(stage.PipelineStage):
     用于截断会话消息链，以适应平台消息长度限制。
     """
 
+    initialize_config_paths = ['ai.local-agent.truncate-method']
+
     trun: truncator.Truncator
 
     async def initialize(self, pipeline_config: dict):
-        use_method = 'round'
+        use_method = pipeline_config['ai']['local-agent'].get('truncate-method', 'round')
 
         for trun in truncator.preregistered_truncators:
             if trun.name == use_method:
@@ -29,6 +31,8 @@ class ConversationMessageTruncator(stage.PipelineStage):
         else:
             raise ValueError(f'未知的截断器: {use_method}')
 
+        await self.trun.initialize()
+
     async def process(self, query: core_entities.Query, stage_inst_name: str) -> entities.StageProcessResult:
         """处理"""
         query = await self.trun.truncate(query)
@@ -12,19 +12,20 @@ class RoundTruncator(truncator.Truncator):
         """截断"""
         max_round = query.pipeline_config['ai']['local-agent']['max-round']
 
-        temp_messages = []
+        kept_from = len(query.messages)
 
         current_round = 0
 
         # 从后往前遍历
-        for msg in query.messages[::-1]:
+        for i in range(len(query.messages) - 1, -1, -1):
             if current_round < max_round:
-                temp_messages.append(msg)
-                if msg.role == 'user':
+                kept_from = i
+                if query.messages[i].role == 'user':
                     current_round += 1
             else:
                 break
 
-        query.messages = temp_messages[::-1]
+        # 切片不复制前文
+        query.messages = query.messages[kept_from:]
 
         return query
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import traceback
+
+from .. import truncator
+from ....core import entities as core_entities
+from ....provider import entities as llm_entities
+from ....provider.modelmgr import requester
+
+
+SUMMARY_INSTRUCTION = (
+    'You maintain a running summary of a chat so that it can continue without the full history. '
+    'Merge the previous summary (if any) and the new messages into one concise summary. '
+    'Keep facts, names, preferences, decisions and open questions; drop greetings and small talk. '
+    'Write in the language of the conversation and output only the summary.'
+)
+
+SUMMARY_PREFIX = 'Summary of the earlier conversation:\n'
+
+
+@truncator.truncator_class('summary')
+class SummaryTruncator(truncator.Truncator):
+    """前文摘要截断器
+
+    只保留最近 max-round 个回合，更早的回合在后台压缩进对话的滚动摘要，摘要附加在 prompt 的第一条 system 消息末尾传给模型。
+    每次只把上次摘要之后移出窗口的回合（增量）和旧摘要一起交给摘要模型，流水线不等待摘要请求。
+    """
+
+    summarizing: set[int]
+    """正在生成摘要的对话（id）"""
+
+    def __init__(self, ap):
+        super().__init__(ap)
+        self.summarizing = set()
+
+    async def truncate(self, query: core_entities.Query) -> core_entities.Query:
+        """截断"""
+        local_agent_config = query.pipeline_config['ai']['local-agent']
+        max_round = local_agent_config['max-round']
+
+        conversation = query.session.using_conversation
+
+        # 窗口外的回合交给后台摘要
+        out_of_window = conversation.messages[: self._window_start(conversation.messages, max_round)]
+
+        if out_of_window and id(conversation) not in self.summarizing:
+            self.summarizing.add(id(conversation))
+
+            self.ap.task_mgr.create_task(
+                self._summarize(query, conversation, out_of_window),
+                kind='conversation-summary',
+                name=f'summary-{query.query_id}',
+                scopes=[core_entities.LifecycleControlScope.APPLICATION],
+            )
+
+        query.messages = query.messages[self._window_start(query.messages, max_round) :]
+
+        if conversation.summary:
+            query.prompt = query.prompt.copy(
+                update={'messages': self._with_summary(query.prompt.messages, conversation.summary)}
+            )
+
+        return query
+
+    def _with_summary(self, messages: list[llm_entities.Message], summary: str) -> list[llm_entities.Message]:
+        """把摘要附加到第一条 system 消息末尾，没有时新建一条
+
+        部分接口（如 Anthropic）只接受一条 system 消息，不能另加一条。
+        """
+        summary_text = SUMMARY_PREFIX + summary
+
+        for i, message in enumerate(messages):
+            if message.role != 'system':
+                continue
+
+            if isinstance(message.content, list):
+                content = message.content + [llm_entities.ContentElement.from_text('\n\n' + summary_text)]
+            elif message.content:
+                content = message.content + '\n\n' + summary_text
+            else:
+                content = summary_text
+
+            return messages[:i] + [llm_entities.Message(role='system', content=content)] + messages[i + 1 :]
+
+        return [llm_entities.Message(role='system', content=summary_text)] + messages
+
+    def _window_start(self, messages: list[llm_entities.Message], max_round: int) -> int:
+        """最近 max_round 个回合的起始下标"""
+        if max_round <= 0:
+            return len(messages)
+
+        current_round = 0
+
+        for i in range(len(messages) - 1, -1, -1):
+            if messages[i].role == 'user':
+                current_round += 1
+                if current_round == max_round:
+                    return i
+
+        return 0
+
+    async def _get_summary_model(self, query: core_entities.Query) -> requester.RuntimeLLMModel:
+        model_uuid = query.pipeline_config['ai']['local-agent'].get('summary-model', '')
+
+        if model_uuid:
+            try:
+                return await self.ap.model_mgr.get_model_by_uuid(model_uuid)
+            except ValueError:
+                self.ap.logger.warning(f'摘要模型 {model_uuid} 不存在，使用对话模型')
+
+        return query.use_llm_model
+
+    async def _summarize(
+        self,
+        query: core_entities.Query,
+        conversation: core_entities.Conversation,
+        messages: list[llm_entities.Message],
+    ):
+        try:
+            model = await self._get_summary_model(query)
+
+            lines = []
+            for msg in messages:
+                if msg.role in ('user', 'assistant') and msg.content:
+                    lines.append(msg.readable_str())
+
+            if not lines:
+                return
+
+            content = ''
+            if conversation.summary:
+                content += f'Previous summary:\n{conversation.summary}\n\n'
+            content += 'New messages:\n' + '\n'.join(lines)
+
+            resp = await model.requester.invoke_llm(
+                query,
+                model,
+                [
+                    llm_entities.Message(role='system', content=SUMMARY_INSTRUCTION),
+                    llm_entities.Message(role='user', content=content),
+                ],
+                None,
+                extra_args=model.model_entity.extra_args,
+            )
+
+            summary = resp.content if isinstance(resp.content, str) else str(resp.get_content_platform_message_chain())
+            summary = summary.strip() if summary else ''
+
+            if not summary:
+                # 没有得到摘要时保留这些回合，下次再试
+                self.ap.logger.warning(f'对话({query.query_id})摘要模型返回为空，保留早期回合')
+                return
+
+            conversation.summary = summary
+
+            # 已摘要的回合移出对话；期间新增的消息都在末尾，不受影响
+            head = conversation.messages[: len(messages)]
+
+            if len(head) == len(messages) and all(a is b for a, b in zip(head, messages)):
+                conversation.messages = conversation.messages[len(messages) :]
+
+            self.ap.sess_mgr.conversation_store.update_conversation(query.session, conversation)
+        except Exception as e:
+            self.ap.logger.error(f'对话({query.query_id})生成摘要失败: {type(e).__name__} {str(e)}')
+            self.ap.logger.debug(f'Traceback: {traceback.format_exc()}')
+        finally:
+            self.summarizing.discard(id(conversation))
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from .. import truncator
+from ....core import entities as core_entities
+from ....provider import tokenizer as llm_tokenizer
+
+
+@truncator.truncator_class('token')
+class TokenTruncator(truncator.Truncator):
+    """前文 token 数截断器
+
+    把 prompt、工具定义、本次用户消息和前文放进 token 预算，从最早的回合开始丢弃前文。
+    """
+
+    estimate_warned: bool = False
+
+    async def truncate(self, query: core_entities.Query) -> core_entities.Query:
+        """截断"""
+        local_agent_config = query.pipeline_config['ai']['local-agent']
+
+        budget = local_agent_config.get('max-context-tokens', 8192)
+        max_round = local_agent_config['max-round']
+
+        model_name = query.use_llm_model.model_entity.name if query.use_llm_model is not None else ''
+        tokenizer = await llm_tokenizer.get_tokenizer(model_name)
+
+        if tokenizer.estimated and not self.estimate_warned:
+            self.estimate_warned = True
+            self.ap.logger.warning(f'无法加载 tiktoken 编码 {tokenizer.name}，将按字符数估算 token 数')
+
+        used = tokenizer.count_messages(query.prompt.messages)
+
+        if query.user_message is not None:
+            used += tokenizer.count_message(query.user_message)
+
+        if query.use_funcs:
+            used += tokenizer.count_functions(query.use_funcs)
+
+        # 从后往前按完整回合放入预算
+        kept_from = len(query.messages)
+        current_round = 0
+        round_tokens = 0
+
+        for i in range(len(query.messages) - 1, -1, -1):
+            msg = query.messages[i]
+            round_tokens += tokenizer.count_message(msg)
+
+            if msg.role == 'user':
+                if current_round >= max_round or used + round_tokens > budget:
+                    break
+
+                used += round_tokens
+                round_tokens = 0
+                current_round += 1
+                kept_from = i
+
+        query.messages = query.messages[kept_from:]
+
+        return query
@@ -1,5 +1,9 @@
 from __future__ import annotations
 
+import enum
+import inspect
+import logging
+import time
 import typing
 import traceback
 
@@ -8,7 +12,7 @@ import sqlalchemy
 from ..core import app, entities
 from . import entities as pipeline_entities
 from ..entity.persistence import pipeline as persistence_pipeline
-from . import stage
+from . import stage, profiler as pipeline_profiler
 from ..platform.types import message as platform_message, events as platform_events
 from ..plugin import events
 from ..utils import importutil
@@ -42,6 +46,29 @@ importutil.import_modules_in_pkgs(
 )
 
 
+class StageExecKind(enum.Enum):
+    """阶段 process 方法的执行方式，在加载流水线时确定"""
+
+    SYNC_RESULT = 'sync-result'
+    """同步返回 StageProcessResult"""
+
+    ASYNC_RESULT = 'async-result'
+    """协程，await 后得到 StageProcessResult（也兼容返回生成器）"""
+
+    GENERATOR = 'generator'
+    """异步生成器，逐个产生 StageProcessResult"""
+
+
+def get_stage_exec_kind(inst: stage.PipelineStage) -> StageExecKind:
+    """判断阶段实例 process 方法的执行方式"""
+    if inspect.isasyncgenfunction(inst.process):
+        return StageExecKind.GENERATOR
+    elif inspect.iscoroutinefunction(inst.process):
+        return StageExecKind.ASYNC_RESULT
+    else:
+        return StageExecKind.SYNC_RESULT
+
+
 class StageInstContainer:
     """阶段实例容器"""
 
@@ -49,9 +76,13 @@ class StageInstContainer:
 
     inst: stage.PipelineStage
 
+    exec_kind: StageExecKind
+    """process 方法的执行方式"""
+
     def __init__(self, inst_name: str, inst: stage.PipelineStage):
         self.inst_name = inst_name
         self.inst = inst
+        self.exec_kind = get_stage_exec_kind(inst)
 
 
 class RuntimePipeline:
@@ -65,15 +96,33 @@ class RuntimePipeline:
     stage_containers: list[StageInstContainer]
     """阶段实例容器"""
 
+    stage_plans: dict[entities.LauncherTypes, list[StageInstContainer]]
+    """各请求者类型实际执行的阶段，已去除对该类型必定无操作的阶段"""
+
+    profiler: pipeline_profiler.PipelineProfiler | None
+    """耗时统计，为 None 时不统计"""
+
+    version: int
+    """版本号，同一 uuid 的流水线每次热重载加一
+
+    已开始执行的请求会在取得的版本上执行完毕，新请求使用最新版本。
+    """
+
     def __init__(
         self,
         ap: app.Application,
         pipeline_entity: persistence_pipeline.LegacyPipeline,
         stage_containers: list[StageInstContainer],
+        stage_plans: dict[entities.LauncherTypes, list[StageInstContainer]] | None = None,
+        profiler: pipeline_profiler.PipelineProfiler | None = None,
+        version: int = 1,
     ):
         self.ap = ap
         self.pipeline_entity = pipeline_entity
         self.stage_containers = stage_containers
+        self.stage_plans = stage_plans or {}
+        self.profiler = profiler
+        self.version = version
 
     async def run(self, query: entities.Query):
         query.pipeline_config = self.pipeline_entity.config
@@ -106,68 +155,123 @@ class RuntimePipeline:
         if result.error_notice:
             self.ap.logger.error(result.error_notice)
 
+    def _observe_stage(
+        self,
+        stage_container: StageInstContainer,
+        result: pipeline_entities.StageProcessResult,
+        elapsed: float,
+        trace: pipeline_profiler.QueryTrace | None,
+    ):
+        result_type = result.result_type.value
+        self.profiler.observe_stage(self.pipeline_entity.uuid, stage_container.inst_name, result_type, elapsed)
+        if trace is not None:
+            trace.add_stage(stage_container.inst_name, result_type, elapsed)
+
     async def _execute_from_stage(
         self,
         stage_index: int,
         query: entities.Query,
+        trace: pipeline_profiler.QueryTrace | None = None,
     ):
         """从指定阶段开始执行，实现了责任链模式和基于生成器的阶段分叉功能。
 
-        如何看懂这里为什么这么写？
-        去问 GPT-4:
-            Q1: 现在有一个责任链，其中有多个stage，query对象在其中传递，stage.process可能返回Result也有可能返回typing.AsyncGenerator[Result, None]，
-                如果返回的是生成器，需要挨个生成result，检查是否result中是否要求继续，如果要求继续就进行下一个stage。如果此次生成器产生的result处理完了，就继续生成下一个result，
-                调用后续的stage，直到该生成器全部生成完。责任链中可能有多个stage会返回生成器
-            Q2: 不是这样的，你可能理解有误。如果我们责任链上有这些Stage：
-
-                A B C D E F G
+        如果所有的 stage 都返回 Result，且所有 Result 都要求继续，那么执行顺序是：
 
-                如果所有的stage都返回Result，且所有Result都要求继续，那么执行顺序是：
+            A B C D E F G
 
-                A B C D E F G
+        若 C 返回的是 AsyncGenerator，则 C 每产生一个要求继续的 Result，都会以该 Result 执行一遍后续阶段：
 
-                现在假设C返回的是AsyncGenerator，那么执行顺序是：
+            A B C D E F G C D E F G C D E F G ...
 
-                A B C D E F G C D E F G C D E F G ...
-            Q3: 但是如果不止一个stage会返回生成器呢？
+        多个阶段返回生成器时以此类推。这里用一个生成器栈迭代实现，不做递归：
+        每次向后执行到流水线末尾或被中断后，就回到栈顶的生成器取下一个 Result。
         """
+        debug_enabled = self.ap.logger.isEnabledFor(logging.DEBUG)
+        profiling = self.profiler is not None
+
+        stage_containers = self.stage_plans.get(query.launcher_type, self.stage_containers)
+        stage_count = len(stage_containers)
+
+        # 未消费完的生成器栈: (产生该生成器的阶段下标, 生成器)
+        generator_stack: list[tuple[int, typing.AsyncGenerator[pipeline_entities.StageProcessResult, None]]] = []
+
         i = stage_index
 
-        while i < len(self.stage_containers):
-            stage_container = self.stage_containers[i]
+        while True:
+            # ======== 向后执行，直到末尾、被中断或遇到生成器 ========
+            while i < stage_count:
+                stage_container = stage_containers[i]
+
+                query.current_stage = stage_container  # 标记到 Query 对象里
 
-            query.current_stage = stage_container  # 标记到 Query 对象里
+                if profiling:
+                    stage_start = time.perf_counter()
 
-            result = stage_container.inst.process(query, stage_container.inst_name)
+                result = stage_container.inst.process(query, stage_container.inst_name)
+
+                if stage_container.exec_kind == StageExecKind.ASYNC_RESULT:
+                    result = await result
+
+                if stage_container.exec_kind == StageExecKind.GENERATOR or not isinstance(
+                    result, pipeline_entities.StageProcessResult
+                ):  # 生成器
+                    if debug_enabled:
+                        self.ap.logger.debug(f'Stage {stage_container.inst_name} processed query {query} gen')
+
+                    generator_stack.append((i, result))
+                    break
 
-            if isinstance(result, typing.Coroutine):
-                result = await result
+                if profiling:
+                    self._observe_stage(stage_container, result, time.perf_counter() - stage_start, trace)
+
+                if debug_enabled:
+                    self.ap.logger.debug(f'Stage {stage_container.inst_name} processed query {query} res {result}')
 
-            if isinstance(result, pipeline_entities.StageProcessResult):  # 直接返回结果
-                self.ap.logger.debug(f'Stage {stage_container.inst_name} processed query {query} res {result}')
                 await self._check_output(query, result)
 
                 if result.result_type == pipeline_entities.ResultType.INTERRUPT:
-                    self.ap.logger.debug(f'Stage {stage_container.inst_name} interrupted query {query}')
+                    if debug_enabled:
+                        self.ap.logger.debug(f'Stage {stage_container.inst_name} interrupted query {query}')
                     break
                 elif result.result_type == pipeline_entities.ResultType.CONTINUE:
                     query = result.new_query
-            elif isinstance(result, typing.AsyncGenerator):  # 生成器
-                self.ap.logger.debug(f'Stage {stage_container.inst_name} processed query {query} gen')
 
-                async for sub_result in result:
+                i += 1
+
+            # ======== 从栈顶生成器取下一个结果 ========
+            while generator_stack:
+                generator_index, generator = generator_stack[-1]
+                stage_container = stage_containers[generator_index]
+
+                if profiling:
+                    stage_start = time.perf_counter()
+
+                try:
+                    sub_result = await generator.__anext__()
+                except StopAsyncIteration:
+                    generator_stack.pop()
+                    continue
+
+                if profiling:
+                    self._observe_stage(stage_container, sub_result, time.perf_counter() - stage_start, trace)
+
+                if debug_enabled:
                     self.ap.logger.debug(f'Stage {stage_container.inst_name} processed query {query} res {sub_result}')
-                    await self._check_output(query, sub_result)
 
-                    if sub_result.result_type == pipeline_entities.ResultType.INTERRUPT:
-                        self.ap.logger.debug(f'Stage {stage_container.inst_name} interrupted query {query}')
-                        break
-                    elif sub_result.result_type == pipeline_entities.ResultType.CONTINUE:
-                        query = sub_result.new_query
-                        await self._execute_from_stage(i + 1, query)
-                break
+                await self._check_output(query, sub_result)
 
-            i += 1
+                if sub_result.result_type == pipeline_entities.ResultType.INTERRUPT:
+                    if debug_enabled:
+                        self.ap.logger.debug(f'Stage {stage_container.inst_name} interrupted query {query}')
+                    generator_stack.pop()
+                    await generator.aclose()
+                    continue
+                elif sub_result.result_type == pipeline_entities.ResultType.CONTINUE:
+                    query = sub_result.new_query
+                    i = generator_index + 1
+                    break
+            else:
+                return
 
     async def process_query(self, query: entities.Query):
         """处理请求"""
@@ -192,15 +296,24 @@ class RuntimePipeline:
             if event_ctx.is_prevented_default():
                 return
 
-            self.ap.logger.debug(f'Processing query {query}')
-
-            await self._execute_from_stage(0, query)
+            if self.ap.logger.isEnabledFor(logging.DEBUG):
+                self.ap.logger.debug(f'Processing query {query}')
+
+            if self.profiler is None:
+                await self._execute_from_stage(0, query)
+            else:
+                start_time, trace = self.profiler.start_query(self.pipeline_entity.uuid, query)
+                try:
+                    await self._execute_from_stage(0, query, trace)
+                finally:
+                    self.profiler.finish_query(self.pipeline_entity.uuid, query, start_time, trace)
         except Exception as e:
             inst_name = query.current_stage.inst_name if query.current_stage else 'unknown'
             self.ap.logger.error(f'处理请求时出错 query_id={query.query_id} stage={inst_name} : {e}')
             self.ap.logger.error(f'Traceback: {traceback.format_exc()}')
         finally:
-            self.ap.logger.debug(f'Query {query} processed')
+            if self.ap.logger.isEnabledFor(logging.DEBUG):
+                self.ap.logger.debug(f'Query {query} processed')
 
 
 class PipelineManager:
@@ -210,13 +323,26 @@ class PipelineManager:
 
     ap: app.Application
 
-    pipelines: list[RuntimePipeline]
+    pipelines_by_uuid: dict[str, RuntimePipeline]
+    """uuid -> 运行时流水线
+
+    只整体替换、不原地修改，读者取到的总是某一时刻完整的快照。
+    """
 
     stage_dict: dict[str, type[stage.PipelineStage]]
 
+    profiler: pipeline_profiler.PipelineProfiler
+    """各流水线共用的耗时统计"""
+
     def __init__(self, ap: app.Application):
         self.ap = ap
-        self.pipelines = []
+        self.pipelines_by_uuid = {}
+        self.profiler = pipeline_profiler.PipelineProfiler(ap)
+
+    @property
+    def pipelines(self) -> list[RuntimePipeline]:
+        """所有运行时流水线（只读快照）"""
+        return list(self.pipelines_by_uuid.values())
 
     async def initialize(self):
         self.stage_dict = {name: cls for name, cls in stage.preregistered_stages.items()}
@@ -239,31 +365,113 @@ class PipelineManager:
         pipeline_entity: persistence_pipeline.LegacyPipeline
         | sqlalchemy.Row[persistence_pipeline.LegacyPipeline]
         | dict,
-    ):
+    ) -> RuntimePipeline:
+        """加载流水线
+
+        若已加载同 uuid 的流水线，则构建新版本后原地替换（热重载）：
+        新版本完全初始化好之前，新请求仍使用旧版本；已取得旧版本的请求在旧版本上执行完毕。
+        initialize 所用配置未改变的阶段实例会被新版本复用。
+        """
         if isinstance(pipeline_entity, sqlalchemy.Row):
             pipeline_entity = persistence_pipeline.LegacyPipeline(**pipeline_entity._mapping)
         elif isinstance(pipeline_entity, dict):
             pipeline_entity = persistence_pipeline.LegacyPipeline(**pipeline_entity)
 
+        old_pipeline = await self.get_pipeline_by_uuid(pipeline_entity.uuid)
+
+        old_containers: dict[str, StageInstContainer] = {}
+        if old_pipeline is not None:
+            old_containers = {
+                stage_container.inst_name: stage_container for stage_container in old_pipeline.stage_containers
+            }
+
         # initialize stage containers according to pipeline_entity.stages
         stage_containers: list[StageInstContainer] = []
+        new_containers: list[StageInstContainer] = []
         for stage_name in pipeline_entity.stages:
-            stage_containers.append(StageInstContainer(inst_name=stage_name, inst=self.stage_dict[stage_name](self.ap)))
+            old_container = old_containers.get(stage_name)
+
+            if old_container is not None and old_container.inst.can_reuse(
+                old_pipeline.pipeline_entity.config, pipeline_entity.config
+            ):
+                stage_containers.append(old_container)
+            else:
+                stage_container = StageInstContainer(inst_name=stage_name, inst=self.stage_dict[stage_name](self.ap))
+                stage_containers.append(stage_container)
+                new_containers.append(stage_container)
 
-        for stage_container in stage_containers:
+        for stage_container in new_containers:
             await stage_container.inst.initialize(pipeline_entity.config)
 
-        runtime_pipeline = RuntimePipeline(self.ap, pipeline_entity, stage_containers)
-        self.pipelines.append(runtime_pipeline)
+        stage_plans = self.plan_stages(pipeline_entity, stage_containers)
+
+        runtime_pipeline = RuntimePipeline(
+            self.ap,
+            pipeline_entity,
+            stage_containers,
+            stage_plans,
+            self.profiler,
+            version=old_pipeline.version + 1 if old_pipeline is not None else 1,
+        )
+
+        if old_pipeline is not None and pipeline_entity.uuid not in self.pipelines_by_uuid:  # 重载期间被删除
+            return runtime_pipeline
+
+        self.pipelines_by_uuid = {**self.pipelines_by_uuid, pipeline_entity.uuid: runtime_pipeline}
+
+        if old_pipeline is not None:
+            self.ap.logger.info(
+                f'Pipeline {pipeline_entity.uuid} reloaded as version {runtime_pipeline.version}, '
+                f'{len(stage_containers) - len(new_containers)}/{len(stage_containers)} stages reused'
+            )
+
+        return runtime_pipeline
+
+    def plan_stages(
+        self,
+        pipeline_entity: persistence_pipeline.LegacyPipeline,
+        stage_containers: list[StageInstContainer],
+    ) -> dict[entities.LauncherTypes, list[StageInstContainer]]:
+        """按请求者类型生成执行计划，去除根据配置必定无操作的阶段"""
+        stage_plans: dict[entities.LauncherTypes, list[StageInstContainer]] = {}
+
+        for launcher_type in entities.LauncherTypes:
+            plan = []
+            skipped = []
+
+            for stage_container in stage_containers:
+                try:
+                    noop = stage_container.inst.is_noop(
+                        stage_container.inst_name, pipeline_entity.config, launcher_type
+                    )
+                except Exception as e:
+                    # 配置不完整等情况下保守处理，照常执行
+                    self.ap.logger.warning(
+                        f'Failed to analyze stage {stage_container.inst_name} of pipeline {pipeline_entity.uuid}: {e}'
+                    )
+                    noop = False
+
+                if noop:
+                    skipped.append(stage_container.inst_name)
+                else:
+                    plan.append(stage_container)
+
+            if skipped:
+                self.ap.logger.debug(
+                    f'Pipeline {pipeline_entity.uuid} skips stages for {launcher_type.value}: {", ".join(skipped)}'
+                )
+
+            stage_plans[launcher_type] = plan
+
+        return stage_plans
 
     async def get_pipeline_by_uuid(self, uuid: str) -> RuntimePipeline | None:
-        for pipeline in self.pipelines:
-            if pipeline.pipeline_entity.uuid == uuid:
-                return pipeline
-        return None
+        return self.pipelines_by_uuid.get(uuid)
 
     async def remove_pipeline(self, uuid: str):
-        for pipeline in self.pipelines:
-            if pipeline.pipeline_entity.uuid == uuid:
-                self.pipelines.remove(pipeline)
-                return
+        if uuid not in self.pipelines_by_uuid:
+            return
+
+        pipelines_by_uuid = dict(self.pipelines_by_uuid)
+        del pipelines_by_uuid[uuid]
+        self.pipelines_by_uuid = pipelines_by_uuid
@@ -1,31 +1,439 @@
 from __future__ import annotations
 
 import asyncio
+import collections
+import enum
+import time
 import typing
 
-from ..core import entities
+from ..core import app, entities
 from ..platform import adapter as msadapter
 from ..platform.types import message as platform_message
 from ..platform.types import events as platform_events
 
 
+SessionKey = typing.Tuple[entities.LauncherTypes, typing.Union[int, str]]
+"""会话索引键 (launcher_type, launcher_id)"""
+
+
+def get_session_key(query: entities.Query) -> SessionKey:
+    """获取请求所属会话的索引键"""
+    return (query.launcher_type, query.launcher_id)
+
+
+class QueryLane(enum.Enum):
+    """请求优先级通道"""
+
+    ADMIN = 'admin'
+    """管理员会话发出的命令"""
+
+    PRIVATE = 'private'
+    """私聊"""
+
+    GROUP = 'group'
+    """群聊"""
+
+    WEBCHAT_DEBUG = 'webchat-debug'
+    """WebUI 流水线调试"""
+
+
+unsheddable_lanes = (QueryLane.ADMIN, QueryLane.WEBCHAT_DEBUG)
+"""不会被过载策略丢弃的通道"""
+
+
+class OverflowPolicy(enum.Enum):
+    """请求池满载时的处理策略"""
+
+    DROP_OLDEST = 'drop-oldest'
+    """丢弃最低优先级通道中最早的请求，接收新请求"""
+
+    DROP_NEWEST = 'drop-newest'
+    """丢弃新请求"""
+
+    REJECT_WITH_NOTICE = 'reject-with-notice'
+    """拒绝新请求，并通过适配器回复提示"""
+
+
+default_lane_weights: dict[QueryLane, int] = {
+    QueryLane.ADMIN: 8,
+    QueryLane.PRIVATE: 4,
+    QueryLane.GROUP: 2,
+    QueryLane.WEBCHAT_DEBUG: 8,
+}
+
+
 class QueryPool:
-    """请求池，请求获得调度进入pipeline之前，保存在这里"""
+    """请求池，请求获得调度进入pipeline之前，保存在这里
+
+    请求先按优先级通道、再按会话分别排队，每个通道维护一个「就绪会话」集合：
+    只有既有排队请求、又未达到会话并发上限的会话才会出现在就绪集合中，
+    因此调度器取请求是 O(1) 的，不需要遍历整个请求池。
+
+    通道之间按权重进行平滑加权轮询，排队超过 starvation_timeout 的通道会被优先调度，
+    避免低权重通道饿死。
+    """
+
+    ap: app.Application
 
     query_id_counter: int = 0
 
     pool_lock: asyncio.Lock
 
-    queries: list[entities.Query]
+    lane_queues: dict[QueryLane, dict[SessionKey, collections.deque[entities.Query]]]
+    """各通道中各会话的待处理请求队列"""
+
+    ready_sessions: dict[QueryLane, collections.OrderedDict[SessionKey, None]]
+    """各通道中有排队请求且尚有并发余量的会话，按就绪先后排列"""
+
+    lane_depths: dict[QueryLane, int]
+    """各通道排队中的请求数"""
+
+    lane_weights: dict[QueryLane, int]
+    """各通道调度权重"""
+
+    lane_current_weights: dict[QueryLane, int]
+    """平滑加权轮询的当前权重"""
+
+    starvation_timeout: float
+    """通道队首请求等待超过此秒数时优先调度该通道"""
+
+    session_running: dict[SessionKey, int]
+    """各会话正在处理中的请求数"""
+
+    session_depths: dict[SessionKey, int]
+    """各会话排队中的请求数"""
+
+    max_size: int
+    """请求池最多容纳的排队请求数，0 表示不限制"""
+
+    max_session_depth: int
+    """单个会话最多排队的请求数，0 表示不限制"""
+
+    overflow_policy: OverflowPolicy
+    """超出容量时的处理策略"""
+
+    overflow_notice: str
+    """拒绝请求时回复的提示"""
+
+    query_deadline: float
+    """请求从入池起的最长有效秒数，超时未处理的请求会被丢弃，0 表示不限制"""
+
+    shed_counts: dict[str, int]
+    """各原因丢弃的请求数"""
+
+    coalesce_window: float
+    """合并窗口秒数，同一会话同一发送者在窗口内连续发送的消息会合并为一个请求，0 表示不合并"""
+
+    coalesce_max_wait: float
+    """合并时最多等待的秒数，避免持续发送消息导致请求一直无法调度"""
+
+    coalesce_launcher_types: set[entities.LauncherTypes]
+    """启用合并的会话类型"""
+
+    coalesce_holding: dict[typing.Tuple[SessionKey, QueryLane], asyncio.Task]
+    """正处于合并窗口中、暂不调度的会话通道及其计时任务"""
+
+    coalesced_count: int
+    """被合并进其他请求的请求数"""
+
+    session_concurrency: int
+    """单会话并发上限"""
 
     condition: asyncio.Condition
 
-    def __init__(self):
+    def __init__(self, ap: app.Application):
+        self.ap = ap
         self.query_id_counter = 0
         self.pool_lock = asyncio.Lock()
-        self.queries = []
+        self.lane_queues = {lane: {} for lane in QueryLane}
+        self.ready_sessions = {lane: collections.OrderedDict() for lane in QueryLane}
+        self.lane_depths = {lane: 0 for lane in QueryLane}
+        self.lane_current_weights = {lane: 0 for lane in QueryLane}
+        self.session_running = {}
+        self.session_depths = {}
+        self.shed_counts = {
+            'dropped_oldest': 0,
+            'dropped_newest': 0,
+            'rejected': 0,
+            'expired': 0,
+        }
+        self.session_concurrency = self.ap.instance_config.data['concurrency']['session']
         self.condition = asyncio.Condition(self.pool_lock)
 
+        pool_cfg = self.ap.instance_config.data.get('query-pool', {})
+
+        lanes_cfg = pool_cfg.get('lane-weights', {})
+        self.lane_weights = {lane: max(1, lanes_cfg.get(lane.value, default_lane_weights[lane])) for lane in QueryLane}
+        self.starvation_timeout = pool_cfg.get('starvation-timeout', 30)
+
+        self.max_size = pool_cfg.get('max-size', 0)
+        self.max_session_depth = pool_cfg.get('max-session-depth', 0)
+        self.overflow_policy = OverflowPolicy(pool_cfg.get('overflow-policy', OverflowPolicy.DROP_NEWEST.value))
+        self.overflow_notice = pool_cfg.get('overflow-notice', '当前请求过多，请稍后再试。')
+        self.query_deadline = pool_cfg.get('query-deadline', 0)
+
+        self.coalesce_window = pool_cfg.get('coalesce-window', 0)
+        self.coalesce_max_wait = pool_cfg.get('coalesce-max-wait', 10)
+        self.coalesce_launcher_types = {
+            entities.LauncherTypes(launcher_type)
+            for launcher_type in pool_cfg.get('coalesce-launcher-types', ['person'])
+        }
+        self.coalesce_holding = {}
+        self.coalesced_count = 0
+
+    @property
+    def queries(self) -> list[entities.Query]:
+        """所有排队中的请求（只读快照，O(N)，请勿在热路径上使用）"""
+        return sorted(
+            (query for sessions in self.lane_queues.values() for queue in sessions.values() for query in queue),
+            key=lambda query: query.query_id,
+        )
+
+    def __len__(self) -> int:
+        return sum(self.lane_depths.values())
+
+    def get_lane_depths(self) -> dict[str, int]:
+        """各通道的排队深度"""
+        return {lane.value: depth for lane, depth in self.lane_depths.items()}
+
+    def classify_lane(
+        self,
+        bot_uuid: str,
+        launcher_type: entities.LauncherTypes,
+        launcher_id: typing.Union[int, str],
+        message_chain: platform_message.MessageChain,
+    ) -> QueryLane:
+        """根据来源判断请求所属的优先级通道"""
+        if bot_uuid == 'webchat-proxy-bot':
+            return QueryLane.WEBCHAT_DEBUG
+
+        if f'{launcher_type.value}_{launcher_id}' in self.ap.instance_config.data['admins']:
+            if self._is_command(message_chain):
+                return QueryLane.ADMIN
+
+        if launcher_type == entities.LauncherTypes.PERSON:
+            return QueryLane.PRIVATE
+
+        return QueryLane.GROUP
+
+    def _is_command(self, message_chain: platform_message.MessageChain) -> bool:
+        """消息是否为命令（以任一命令前缀开头）"""
+        message_text = str(message_chain).strip()
+        return any(message_text.startswith(prefix) for prefix in self.ap.instance_config.data['command']['prefix'])
+
+    def _has_capacity(self, key: SessionKey) -> bool:
+        return self.session_running.get(key, 0) < self.session_concurrency
+
+    def _mark_ready(self, key: SessionKey, lane: QueryLane) -> bool:
+        """若会话在该通道中可调度则加入就绪集合，返回是否新加入"""
+        ready_sessions = self.ready_sessions[lane]
+
+        if key in ready_sessions or (key, lane) in self.coalesce_holding:
+            return False
+
+        if self.lane_queues[lane].get(key) and self._has_capacity(key):
+            ready_sessions[key] = None
+            return True
+
+        return False
+
+    def _pop_queued(self, lane: QueryLane, key: SessionKey) -> entities.Query:
+        """移除并返回会话在该通道中最早排队的请求"""
+        queue = self.lane_queues[lane][key]
+        query = queue.popleft()
+        self.lane_depths[lane] -= 1
+        self._decrease_session_depth(key)
+
+        if not queue:
+            del self.lane_queues[lane][key]
+            self.ready_sessions[lane].pop(key, None)
+
+        return query
+
+    def _decrease_session_depth(self, key: SessionKey):
+        depth = self.session_depths[key] - 1
+        if depth > 0:
+            self.session_depths[key] = depth
+        else:
+            del self.session_depths[key]
+
+    def _find_oldest_sheddable(
+        self, key: typing.Optional[SessionKey] = None
+    ) -> typing.Optional[typing.Tuple[QueryLane, SessionKey, entities.Query]]:
+        """找到可被丢弃的最早请求，优先从权重最低的通道中找
+
+        指定 key 时只在该会话的排队请求中找。
+        """
+        for lane in sorted(QueryLane, key=lambda lane: self.lane_weights[lane]):
+            if lane in unsheddable_lanes or not self.lane_depths[lane]:
+                continue
+
+            if key is not None:
+                queue = self.lane_queues[lane].get(key)
+                if queue:
+                    return lane, key, queue[0]
+                continue
+
+            oldest: typing.Optional[typing.Tuple[QueryLane, SessionKey, entities.Query]] = None
+            for session_key, queue in self.lane_queues[lane].items():
+                if oldest is None or queue[0].query_id < oldest[2].query_id:
+                    oldest = (lane, session_key, queue[0])
+            return oldest
+
+        return None
+
+    def _shed_for(self, key: SessionKey, lane: QueryLane) -> typing.Optional[str]:
+        """新请求入池前检查容量，必要时执行过载策略
+
+        Returns:
+            str | None: 新请求应被拒绝时返回丢弃原因，否则返回 None
+        """
+        session_full = self.max_session_depth > 0 and self.session_depths.get(key, 0) >= self.max_session_depth
+        pool_full = self.max_size > 0 and len(self) >= self.max_size
+
+        if not session_full and not pool_full:
+            return None
+
+        if lane in unsheddable_lanes:
+            return None
+
+        if self.overflow_policy == OverflowPolicy.DROP_OLDEST:
+            victim = self._find_oldest_sheddable(key if session_full else None)
+
+            if victim is not None:
+                victim_lane, victim_key, _ = victim
+                victim_query = self._pop_queued(victim_lane, victim_key)
+                self.shed_counts['dropped_oldest'] += 1
+                self.ap.logger.warning(
+                    f'请求池已满，丢弃最早的请求 query_id={victim_query.query_id} '
+                    f'{victim_query.launcher_type.value}_{victim_query.launcher_id}'
+                )
+                return None
+
+            return 'dropped_newest'
+        elif self.overflow_policy == OverflowPolicy.REJECT_WITH_NOTICE:
+            return 'rejected'
+        else:
+            return 'dropped_newest'
+
+    def _can_coalesce(self, key: SessionKey, lane: QueryLane) -> bool:
+        return (
+            self.coalesce_window > 0
+            and lane in (QueryLane.PRIVATE, QueryLane.GROUP)
+            and key[0] in self.coalesce_launcher_types
+        )
+
+    def _hold_for_coalescing(self, key: SessionKey, lane: QueryLane, head: entities.Query) -> bool:
+        """新消息入队后，推迟该会话通道的调度直到合并窗口内没有新消息
+
+        Returns:
+            bool: 是否已推迟调度
+        """
+        holding_task = self.coalesce_holding.pop((key, lane), None)
+        if holding_task is not None:
+            holding_task.cancel()
+
+        remaining_wait = head.enqueue_time + self.coalesce_max_wait - time.monotonic()
+        if remaining_wait <= 0:
+            return False
+
+        self.coalesce_holding[(key, lane)] = asyncio.get_running_loop().create_task(
+            self._release_coalescing_hold(key, lane, min(self.coalesce_window, remaining_wait))
+        )
+        return True
+
+    async def _release_coalescing_hold(self, key: SessionKey, lane: QueryLane, delay: float):
+        await asyncio.sleep(delay)
+
+        async with self.condition:
+            self.coalesce_holding.pop((key, lane), None)
+
+            if self._mark_ready(key, lane):
+                self.condition.notify()
+
+    def _coalesce(self, query: entities.Query, queue: collections.deque[entities.Query]) -> int:
+        """把队列头部同一发送者的连续请求合并进 query，返回合并的请求数
+
+        命令是合并的边界：命令不合并其后的消息，也不被合并进之前的消息。
+        """
+        merged_chain: typing.Optional[platform_message.MessageChain] = None
+        merged_count = 0
+
+        if self._is_command(query.message_chain):
+            return 0
+
+        while queue and queue[0].sender_id == query.sender_id and not self._is_command(queue[0].message_chain):
+            following = queue.popleft()
+
+            if merged_chain is None:
+                merged_chain = platform_message.MessageChain([*query.message_chain])
+
+            merged_chain.append(platform_message.Plain('\n'))
+            merged_chain.extend(
+                component for component in following.message_chain if not isinstance(component, platform_message.Source)
+            )
+            merged_count += 1
+
+        if merged_chain is not None:
+            query.message_chain = merged_chain
+
+        return merged_count
+
+    def is_expired(self, query: entities.Query) -> bool:
+        """请求是否已超过有效期"""
+        return query.deadline is not None and time.monotonic() > query.deadline
+
+    def mark_expired(self, query: entities.Query):
+        """记录一个因超过有效期而被丢弃的请求"""
+        self.shed_counts['expired'] += 1
+        self.ap.logger.warning(
+            f'请求超过有效期，已丢弃 query_id={query.query_id} {query.launcher_type.value}_{query.launcher_id}'
+        )
+
+    def get_shed_counts(self) -> dict[str, int]:
+        """各原因丢弃的请求数"""
+        return dict(self.shed_counts)
+
+    def _select_lane(self) -> typing.Optional[QueryLane]:
+        """选出下一个调度的通道"""
+        candidates = [lane for lane in QueryLane if self.ready_sessions[lane]]
+
+        if not candidates:
+            return None
+
+        if len(candidates) == 1:
+            return candidates[0]
+
+        # 防饿死：队首等待过久的通道优先
+        now = time.monotonic()
+        starving_lane = None
+        starving_since = now - self.starvation_timeout
+
+        for lane in candidates:
+            key = next(iter(self.ready_sessions[lane]))
+            head = self.lane_queues[lane][key][0]
+            if head.enqueue_time is not None and head.enqueue_time < starving_since:
+                starving_lane = lane
+                starving_since = head.enqueue_time
+
+        if starving_lane is not None:
+            return starving_lane
+
+        # 平滑加权轮询
+        total_weight = 0
+        selected_lane = None
+
+        for lane in candidates:
+            self.lane_current_weights[lane] += self.lane_weights[lane]
+            total_weight += self.lane_weights[lane]
+
+            if selected_lane is None or self.lane_current_weights[lane] > self.lane_current_weights[selected_lane]:
+                selected_lane = lane
+
+        self.lane_current_weights[selected_lane] -= total_weight
+
+        return selected_lane
+
     async def add_query(
         self,
         bot_uuid: str,
@@ -36,24 +444,178 @@ class QueryPool:
         message_chain: platform_message.MessageChain,
         adapter: msadapter.MessagePlatformAdapter,
         pipeline_uuid: typing.Optional[str] = None,
-    ) -> entities.Query:
+    ) -> typing.Optional[entities.Query]:
+        """添加请求，请求被过载策略拒绝时返回 None"""
+        rejected_reason: typing.Optional[str] = None
+
         async with self.condition:
-            query = entities.Query(
-                bot_uuid=bot_uuid,
-                query_id=self.query_id_counter,
-                launcher_type=launcher_type,
-                launcher_id=launcher_id,
-                sender_id=sender_id,
-                message_event=message_event,
-                message_chain=message_chain,
-                resp_messages=[],
-                resp_message_chain=[],
-                adapter=adapter,
-                pipeline_uuid=pipeline_uuid,
-            )
-            self.queries.append(query)
-            self.query_id_counter += 1
-            self.condition.notify_all()
+            key = (launcher_type, launcher_id)
+            lane = self.classify_lane(bot_uuid, launcher_type, launcher_id, message_chain)
+
+            rejected_reason = self._shed_for(key, lane)
+
+            if rejected_reason is None:
+                return self._enqueue(
+                    key,
+                    lane,
+                    bot_uuid=bot_uuid,
+                    launcher_type=launcher_type,
+                    launcher_id=launcher_id,
+                    sender_id=sender_id,
+                    message_event=message_event,
+                    message_chain=message_chain,
+                    adapter=adapter,
+                    pipeline_uuid=pipeline_uuid,
+                )
+
+            self.shed_counts[rejected_reason] += 1
+
+        self.ap.logger.warning(f'请求池已满，拒绝来自 {launcher_type.value}_{launcher_id} 的请求')
+
+        if rejected_reason == 'rejected' and self.overflow_notice:
+            try:
+                await adapter.reply_message(
+                    message_source=message_event,
+                    message=platform_message.MessageChain([platform_message.Plain(self.overflow_notice)]),
+                    quote_origin=False,
+                )
+            except Exception as e:
+                self.ap.logger.error(f'发送请求拒绝提示失败: {e}')
+
+        return None
+
+    def _enqueue(
+        self,
+        key: SessionKey,
+        lane: QueryLane,
+        bot_uuid: str,
+        launcher_type: entities.LauncherTypes,
+        launcher_id: typing.Union[int, str],
+        sender_id: typing.Union[int, str],
+        message_event: platform_events.MessageEvent,
+        message_chain: platform_message.MessageChain,
+        adapter: msadapter.MessagePlatformAdapter,
+        pipeline_uuid: typing.Optional[str],
+    ) -> entities.Query:
+        """构造请求并放入队列，必须在持有请求池锁时调用"""
+        now = time.monotonic()
+
+        query = entities.Query(
+            bot_uuid=bot_uuid,
+            query_id=self.query_id_counter,
+            launcher_type=launcher_type,
+            launcher_id=launcher_id,
+            sender_id=sender_id,
+            message_event=message_event,
+            message_chain=message_chain,
+            resp_messages=[],
+            resp_message_chain=[],
+            adapter=adapter,
+            pipeline_uuid=pipeline_uuid,
+            enqueue_time=now,
+            deadline=now + self.query_deadline if self.query_deadline > 0 else None,
+        )
+
+        queue = self.lane_queues[lane].get(key)
+        if queue is None:
+            queue = collections.deque()
+            self.lane_queues[lane][key] = queue
+        queue.append(query)
+
+        self.lane_depths[lane] += 1
+        self.session_depths[key] = self.session_depths.get(key, 0) + 1
+        self.query_id_counter += 1
+
+        if self._can_coalesce(key, lane) and self._hold_for_coalescing(key, lane, queue[0]):
+            # 合并窗口内暂不调度，等窗口结束后统一唤醒
+            self.ready_sessions[lane].pop(key, None)
+            return query
+
+        # 仅当会话从不可调度变为可调度时才唤醒调度器
+        if self._mark_ready(key, lane):
+            self.condition.notify()
+
+        return query
+
+    def get_ready_query(self) -> typing.Optional[entities.Query]:
+        """取出一个可立即调度的请求，并占用其会话的一个并发名额
+
+        必须在持有请求池锁时调用。没有可调度的请求时返回 None。
+        """
+        lane = self._select_lane()
+
+        if lane is None:
+            return None
+
+        key, _ = self.ready_sessions[lane].popitem(last=False)
+
+        queue = self.lane_queues[lane][key]
+        query = queue.popleft()
+        self.lane_depths[lane] -= 1
+        self._decrease_session_depth(key)
+
+        if self._can_coalesce(key, lane):
+            merged_count = self._coalesce(query, queue)
+
+            if merged_count:
+                self.lane_depths[lane] -= merged_count
+                for _ in range(merged_count):
+                    self._decrease_session_depth(key)
+                self.coalesced_count += merged_count
+
+        if not queue:
+            del self.lane_queues[lane][key]
+
+        self.session_running[key] = self.session_running.get(key, 0) + 1
+
+        if self._has_capacity(key):
+            # 会话仍可调度时移到就绪集合末尾，各会话间轮转
+            self._mark_ready(key, lane)
+        else:
+            # 会话并发已满，从所有通道的就绪集合中移除
+            for ready_sessions in self.ready_sessions.values():
+                ready_sessions.pop(key, None)
+
+        return query
+
+    def get_ready_queries(self, max_count: int) -> list[entities.Query]:
+        """一次取出至多 max_count 个可立即调度的请求
+
+        必须在持有请求池锁时调用。各会话轮流取出，同一会话最多取到其并发余量。
+        """
+        selected_queries: list[entities.Query] = []
+
+        while len(selected_queries) < max_count:
+            query = self.get_ready_query()
+            if query is None:
+                break
+            selected_queries.append(query)
+
+        return selected_queries
+
+    def release_query(self, query: entities.Query):
+        """请求处理完毕，释放其会话的并发名额
+
+        必须在持有请求池锁时调用。
+        """
+        key = get_session_key(query)
+
+        running = self.session_running.get(key, 0) - 1
+        if running > 0:
+            self.session_running[key] = running
+        else:
+            self.session_running.pop(key, None)
+
+        became_ready = False
+        for lane in QueryLane:
+            became_ready = self._mark_ready(key, lane) or became_ready
+
+        if became_ready:
+            self.condition.notify()
+
+    def is_session_busy(self, key: SessionKey) -> bool:
+        """会话是否还有排队中或处理中的请求"""
+        return key in self.session_running or key in self.session_depths
 
     async def __aenter__(self):
         await self.pool_lock.acquire()
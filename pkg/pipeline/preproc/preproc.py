@@ -24,6 +24,8 @@ class PreProcessor(stage.PipelineStage):
         - use_funcs
     """
 
+    initialize_config_paths = []
+
     async def process(
         self,
         query: core_entities.Query,
@@ -54,7 +56,8 @@ class PreProcessor(stage.PipelineStage):
         # 设置query
         query.session = session
         query.prompt = conversation.prompt.copy()
-        query.messages = conversation.messages.copy()
+        # 与对话共享前文，被修改时才复制
+        query.messages = llm_entities.MessageHistory(conversation.messages)
 
         query.use_llm_model = llm_model
 
@@ -74,11 +77,12 @@ class PreProcessor(stage.PipelineStage):
         # Check if this model supports vision, if not, remove all images
         # TODO this checking should be performed in runner, and in this stage, the image should be reserved
         if selected_runner == 'local-agent' and not query.use_llm_model.model_entity.abilities.__contains__('vision'):
-            for msg in query.messages:
-                if isinstance(msg.content, list):
-                    for me in msg.content:
-                        if me.type == 'image_url':
-                            msg.content.remove(me)
+            for i, msg in enumerate(query.messages):
+                if isinstance(msg.content, list) and any(me.type == 'image_url' for me in msg.content):
+                    # 不修改对话中的消息
+                    query.messages[i] = msg.copy(
+                        update={'content': [me for me in msg.content if me.type != 'image_url']}
+                    )
 
         content_list = []
 
@@ -110,17 +114,19 @@ class PreProcessor(stage.PipelineStage):
 
         query.user_message = llm_entities.Message(role='user', content=content_list)
         # =========== 触发事件 PromptPreProcessing
-
-        event_ctx = await self.ap.plugin_mgr.emit_event(
-            event=events.PromptPreProcessing(
-                session_name=f'{query.session.launcher_type.value}_{query.session.launcher_id}',
-                default_prompt=query.prompt.messages,
-                prompt=query.messages,
-                query=query,
+        # 构造事件会复制 prompt 和前文，没有插件处理时跳过
+
+        if self.ap.plugin_mgr.has_event_handlers(events.PromptPreProcessing):
+            event_ctx = await self.ap.plugin_mgr.emit_event(
+                event=events.PromptPreProcessing(
+                    session_name=f'{query.session.launcher_type.value}_{query.session.launcher_id}',
+                    default_prompt=query.prompt.messages,
+                    prompt=list(query.messages),
+                    query=query,
+                )
             )
-        )
 
-        query.prompt.messages = event_ctx.event.default_prompt
-        query.messages = event_ctx.event.prompt
+            query.prompt.messages = event_ctx.event.default_prompt
+            query.messages = event_ctx.event.prompt
 
         return entities.StageProcessResult(result_type=entities.ResultType.CONTINUE, new_query=query)
@@ -8,6 +8,7 @@ from .. import handler
 from ... import entities
 from ....core import entities as core_entities
 from ....provider import runner as runner_module
+from ....provider import entities as llm_entities
 from ....plugin import events
 
 from ....platform.types import message as platform_message
@@ -68,10 +69,25 @@ class ChatMessageHandler(handler.MessageHandler):
                     raise ValueError(f'未找到请求运行器: {query.pipeline_config["ai"]["runner"]["runner"]}')
 
                 async for result in runner.run(query):
-                    query.resp_messages.append(result)
+                    # 流式输出的部分回复替换上一段，最终也被完整的回复替换，不进入对话历史
+                    if query.resp_messages and isinstance(query.resp_messages[-1], llm_entities.MessageChunk):
+                        query.resp_messages[-1] = result
+                    else:
+                        query.resp_messages.append(result)
+
+                    if isinstance(result, llm_entities.MessageChunk):
+                        yield entities.StageProcessResult(result_type=entities.ResultType.CONTINUE, new_query=query)
+                        continue
 
                     self.ap.logger.info(f'对话({query.query_id})响应: {self.cut_str(result.readable_str())}')
 
+                    if result.usage is not None:
+                        self.ap.logger.debug(
+                            f'对话({query.query_id})用量: 输入 {result.usage.prompt_tokens} '
+                            f'(缓存命中 {result.usage.cache_hit_tokens}, 未命中 {result.usage.cache_miss_tokens}), '
+                            f'输出 {result.usage.completion_tokens}'
+                        )
+
                     if result.content is not None:
                         text_length += len(result.content)
 
@@ -79,6 +95,12 @@ class ChatMessageHandler(handler.MessageHandler):
 
                 query.session.using_conversation.messages.append(query.user_message)
                 query.session.using_conversation.messages.extend(query.resp_messages)
+
+                self.ap.sess_mgr.conversation_store.append_round(
+                    query.session,
+                    query.session.using_conversation,
+                    [query.user_message, *query.resp_messages],
+                )
             except Exception as e:
                 self.ap.logger.error(f'对话({query.query_id})请求失败: {type(e).__name__} {str(e)}')
 
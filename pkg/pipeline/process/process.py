@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import typing
+
 from ...core import entities as core_entities
 from . import handler
 from .handlers import chat, command
@@ -17,6 +19,8 @@ class Processor(stage.PipelineStage):
         - resp_messages
     """
 
+    initialize_config_paths = []
+
     cmd_handler: handler.MessageHandler
 
     chat_handler: handler.MessageHandler
@@ -32,22 +36,25 @@ class Processor(stage.PipelineStage):
         self,
         query: core_entities.Query,
         stage_inst_name: str,
-    ) -> entities.StageProcessResult:
+    ) -> typing.AsyncGenerator[entities.StageProcessResult, None]:
         """处理"""
+        # 在流水线前序阶段（如限速等待）中超过有效期的请求不再调用模型
+        if self.ap.query_pool.is_expired(query):
+            self.ap.query_pool.mark_expired(query)
+            yield entities.StageProcessResult(result_type=entities.ResultType.INTERRUPT, new_query=query)
+            return
+
         message_text = str(query.message_chain).strip()
 
         self.ap.logger.info(
             f'处理 {query.launcher_type.value}_{query.launcher_id} 的请求({query.query_id}): {message_text}'
         )
 
-        async def generator():
-            cmd_prefix = self.ap.instance_config.data['command']['prefix']
-
-            if any(message_text.startswith(prefix) for prefix in cmd_prefix):
-                async for result in self.cmd_handler.handle(query):
-                    yield result
-            else:
-                async for result in self.chat_handler.handle(query):
-                    yield result
+        cmd_prefix = self.ap.instance_config.data['command']['prefix']
 
-        return generator()
+        if any(message_text.startswith(prefix) for prefix in cmd_prefix):
+            async for result in self.cmd_handler.handle(query):
+                yield result
+        else:
+            async for result in self.chat_handler.handle(query):
+                yield result
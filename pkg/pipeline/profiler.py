@@ -0,0 +1,195 @@
+from __future__ import annotations
+
+import collections
+import time
+import typing
+
+from ..core import app, entities as core_entities
+from ..utils import metrics
+
+
+StageLatencyKey = typing.Tuple[str, str, str]
+"""(流水线 uuid, 阶段名称, 结果类型)"""
+
+
+class QueryTrace:
+    """单个请求在流水线中的耗时记录，仅在开启采样时构建"""
+
+    pipeline_uuid: str
+
+    query: core_entities.Query
+
+    queue_wait: float
+
+    start_time: float
+
+    stages: list[dict]
+    """按执行顺序记录的各阶段耗时"""
+
+    def __init__(self, pipeline_uuid: str, query: core_entities.Query, queue_wait: float, start_time: float):
+        self.pipeline_uuid = pipeline_uuid
+        self.query = query
+        self.queue_wait = queue_wait
+        self.start_time = start_time
+        self.stages = []
+
+    def add_stage(self, stage_name: str, result_type: str, elapsed: float):
+        self.stages.append({'stage': stage_name, 'result_type': result_type, 'elapsed': elapsed})
+
+
+class PipelineProfiler:
+    """流水线耗时统计
+
+    按 (流水线, 阶段, 结果类型) 统计阶段耗时直方图，并按流水线统计排队时间和总耗时。
+    开启采样后，会记录总耗时超过阈值的慢请求及其各阶段耗时。
+    """
+
+    ap: app.Application
+
+    stage_latency: dict[StageLatencyKey, metrics.Histogram]
+
+    queue_wait: dict[str, metrics.Histogram]
+    """流水线 uuid -> 从进入请求池到开始执行流水线的时间"""
+
+    total_latency: dict[str, metrics.Histogram]
+    """流水线 uuid -> 从进入请求池到流水线执行完毕的时间"""
+
+    sampling_enabled: bool
+    """是否开启慢请求采样"""
+
+    slow_threshold: float
+    """慢请求阈值（秒）"""
+
+    slow_queries: collections.deque[dict]
+    """最近的慢请求记录"""
+
+    def __init__(self, ap: app.Application):
+        self.ap = ap
+        self.stage_latency = {}
+        self.queue_wait = {}
+        self.total_latency = {}
+
+        profiler_cfg = self.ap.instance_config.data.get('pipeline-profiler', {})
+
+        self.sampling_enabled = profiler_cfg.get('enabled', False)
+        self.slow_threshold = profiler_cfg.get('slow-threshold', 5)
+        self.slow_queries = collections.deque(maxlen=max(1, profiler_cfg.get('max-samples', 50)))
+
+    def observe_stage(self, pipeline_uuid: str, stage_name: str, result_type: str, elapsed: float):
+        key = (pipeline_uuid, stage_name, result_type)
+
+        histogram = self.stage_latency.get(key)
+        if histogram is None:
+            histogram = metrics.Histogram()
+            self.stage_latency[key] = histogram
+
+        histogram.observe(elapsed)
+
+    def start_query(self, pipeline_uuid: str, query: core_entities.Query) -> tuple[float, QueryTrace | None]:
+        """流水线开始执行请求时调用，返回开始时间和采样记录（未开启采样时为 None）"""
+        now = time.monotonic()
+
+        queue_wait = now - query.enqueue_time if query.enqueue_time is not None else 0.0
+
+        histogram = self.queue_wait.get(pipeline_uuid)
+        if histogram is None:
+            histogram = self.queue_wait[pipeline_uuid] = metrics.Histogram()
+        histogram.observe(queue_wait)
+
+        trace = QueryTrace(pipeline_uuid, query, queue_wait, now) if self.sampling_enabled else None
+
+        return now, trace
+
+    def finish_query(self, pipeline_uuid: str, query: core_entities.Query, start_time: float, trace: QueryTrace | None):
+        """流水线执行完请求时调用"""
+        now = time.monotonic()
+
+        total = now - (query.enqueue_time if query.enqueue_time is not None else start_time)
+
+        histogram = self.total_latency.get(pipeline_uuid)
+        if histogram is None:
+            histogram = self.total_latency[pipeline_uuid] = metrics.Histogram()
+        histogram.observe(total)
+
+        if trace is not None and total >= self.slow_threshold:
+            self.slow_queries.append(
+                {
+                    'pipeline_uuid': pipeline_uuid,
+                    'query_id': query.query_id,
+                    'launcher_type': query.launcher_type.value,
+                    'launcher_id': query.launcher_id,
+                    'finished_at': time.time(),
+                    'queue_wait': trace.queue_wait,
+                    'processing': now - trace.start_time,
+                    'total': total,
+                    'stages': trace.stages,
+                }
+            )
+
+    def set_sampling(
+        self,
+        enabled: bool,
+        slow_threshold: float | None = None,
+        max_samples: int | None = None,
+    ):
+        """开关慢请求采样"""
+        self.sampling_enabled = enabled
+
+        if slow_threshold is not None:
+            self.slow_threshold = slow_threshold
+
+        if max_samples is not None and max_samples != self.slow_queries.maxlen:
+            self.slow_queries = collections.deque(self.slow_queries, maxlen=max(1, max_samples))
+
+    def get_sampling_config(self) -> dict:
+        return {
+            'enabled': self.sampling_enabled,
+            'slow_threshold': self.slow_threshold,
+            'max_samples': self.slow_queries.maxlen,
+        }
+
+    def get_pipeline_stats(self, pipeline_uuid: str) -> dict:
+        stages: dict[str, dict[str, dict]] = {}
+
+        for (uuid, stage_name, result_type), histogram in self.stage_latency.items():
+            if uuid != pipeline_uuid:
+                continue
+            stages.setdefault(stage_name, {})[result_type] = histogram.to_dict()
+
+        queue_wait = self.queue_wait.get(pipeline_uuid)
+        total_latency = self.total_latency.get(pipeline_uuid)
+
+        return {
+            'pipeline_uuid': pipeline_uuid,
+            'queue_wait': queue_wait.to_dict() if queue_wait is not None else metrics.Histogram().to_dict(),
+            'total': total_latency.to_dict() if total_latency is not None else metrics.Histogram().to_dict(),
+            'stages': stages,
+        }
+
+    def get_pipeline_uuids(self) -> list[str]:
+        uuids = dict.fromkeys(self.queue_wait)
+        uuids.update(dict.fromkeys(uuid for uuid, _, _ in self.stage_latency))
+        return list(uuids)
+
+    def get_slow_queries(self, pipeline_uuid: str | None = None) -> list[dict]:
+        return [
+            record for record in self.slow_queries if pipeline_uuid is None or record['pipeline_uuid'] == pipeline_uuid
+        ]
+
+    def reset(self, pipeline_uuid: str | None = None):
+        """清空统计数据，指定 pipeline_uuid 时只清空该流水线的"""
+        if pipeline_uuid is None:
+            self.stage_latency.clear()
+            self.queue_wait.clear()
+            self.total_latency.clear()
+            self.slow_queries.clear()
+            return
+
+        for key in [key for key in self.stage_latency if key[0] == pipeline_uuid]:
+            del self.stage_latency[key]
+        self.queue_wait.pop(pipeline_uuid, None)
+        self.total_latency.pop(pipeline_uuid, None)
+        self.slow_queries = collections.deque(
+            (record for record in self.slow_queries if record['pipeline_uuid'] != pipeline_uuid),
+            maxlen=self.slow_queries.maxlen,
+        )
@@ -20,6 +20,8 @@ class RateLimit(stage.PipelineStage):
     不改写query，只检查是否需要限速。
     """
 
+    initialize_config_paths = []
+
     algo: algo.ReteLimitAlgo
 
     async def initialize(self, pipeline_config: dict):
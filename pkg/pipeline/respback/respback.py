@@ -2,10 +2,13 @@ from __future__ import annotations
 
 import random
 import asyncio
+import time
 
 
+from ...platform import adapter as msadapter
 from ...platform.types import events as platform_events
 from ...platform.types import message as platform_message
+from ...provider import entities as llm_entities
 
 from .. import stage, entities
 from ...core import entities as core_entities
@@ -15,19 +18,28 @@ from ...core import entities as core_entities
 class SendResponseBackStage(stage.PipelineStage):
     """发送响应消息"""
 
+    initialize_config_paths = []
+
     async def process(self, query: core_entities.Query, stage_inst_name: str) -> entities.StageProcessResult:
         """处理"""
 
-        random_range = (
-            query.pipeline_config['output']['force-delay']['min'],
-            query.pipeline_config['output']['force-delay']['max'],
-        )
+        is_chunk = isinstance(query.resp_messages[-1], llm_entities.MessageChunk)
+
+        if query.resp_stream is None:
+            # 流式输出只在第一段前延迟
+            random_range = (
+                query.pipeline_config['output']['force-delay']['min'],
+                query.pipeline_config['output']['force-delay']['max'],
+            )
 
-        random_delay = random.uniform(*random_range)
+            random_delay = random.uniform(*random_range)
 
-        self.ap.logger.debug('根据规则强制延迟回复: %s s', random_delay)
+            self.ap.logger.debug('根据规则强制延迟回复: %s s', random_delay)
 
-        await asyncio.sleep(random_delay)
+            await asyncio.sleep(random_delay)
+        elif is_chunk and time.monotonic() - query.resp_stream.last_update < query.adapter.stream_output_interval:
+            # 编辑过于频繁，跳过这一段，之后的段或完整回复会包含它的内容
+            return entities.StageProcessResult(result_type=entities.ResultType.CONTINUE, new_query=query)
 
         if query.pipeline_config['output']['misc']['at-sender'] and isinstance(
             query.message_event, platform_events.GroupMessage
@@ -36,10 +48,27 @@ class SendResponseBackStage(stage.PipelineStage):
 
         quote_origin = query.pipeline_config['output']['misc']['quote-origin']
 
-        await query.adapter.reply_message(
-            message_source=query.message_event,
-            message=query.resp_message_chain[-1],
-            quote_origin=quote_origin,
-        )
+        if is_chunk or query.resp_stream is not None:
+            if query.resp_stream is None:
+                query.resp_stream = msadapter.StreamReply()
+
+            await query.adapter.reply_message_chunk(
+                message_source=query.message_event,
+                stream=query.resp_stream,
+                message=query.resp_message_chain[-1],
+                quote_origin=quote_origin,
+                is_final=not is_chunk,
+            )
+
+            query.resp_stream.last_update = time.monotonic()
+
+            if not is_chunk:
+                query.resp_stream = None
+        else:
+            await query.adapter.reply_message(
+                message_source=query.message_event,
+                message=query.resp_message_chain[-1],
+                quote_origin=quote_origin,
+            )
 
         return entities.StageProcessResult(result_type=entities.ResultType.CONTINUE, new_query=query)
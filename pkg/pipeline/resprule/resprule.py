@@ -19,6 +19,8 @@ class GroupRespondRuleCheckStage(stage.PipelineStage):
     仅检查群消息是否符合规则。
     """
 
+    initialize_config_paths = []
+
     rule_matchers: list[rule.GroupRespondRule]
     """检查器实例"""
 
@@ -32,6 +34,14 @@ class GroupRespondRuleCheckStage(stage.PipelineStage):
             await rule_inst.initialize()
             self.rule_matchers.append(rule_inst)
 
+    def is_noop(
+        self,
+        stage_inst_name: str,
+        pipeline_config: dict,
+        launcher_type: core_entities.LauncherTypes,
+    ) -> bool:
+        return launcher_type != core_entities.LauncherTypes.GROUP
+
     async def process(self, query: core_entities.Query, stage_inst_name: str) -> entities.StageProcessResult:
         if query.launcher_type.value != 'group':  # 只处理群消息
             return entities.StageProcessResult(result_type=entities.ResultType.CONTINUE, new_query=query)
@@ -18,11 +18,28 @@ def stage_class(name: str) -> typing.Callable[[type[PipelineStage]], type[Pipeli
     return decorator
 
 
+def get_config_value(config: dict, path: str) -> typing.Any:
+    """按以 . 分隔的路径取配置项，不存在时返回 None"""
+    value = config
+    for key in path.split('.'):
+        if not isinstance(value, dict):
+            return None
+        value = value.get(key)
+    return value
+
+
 class PipelineStage(metaclass=abc.ABCMeta):
     """流水线阶段"""
 
     ap: app.Application
 
+    initialize_config_paths: typing.ClassVar[typing.Optional[list[str]]] = None
+    """initialize 中读取的流水线配置项路径，以 . 分隔
+
+    热重载流水线时，这些配置项都未改变的阶段实例会被新版本直接复用，不再重新初始化。
+    为 None 表示未声明，总是重新初始化。
+    """
+
     def __init__(self, ap: app.Application):
         self.ap = ap
 
@@ -30,6 +47,38 @@ class PipelineStage(metaclass=abc.ABCMeta):
         """初始化"""
         pass
 
+    def can_reuse(self, old_config: dict, new_config: dict) -> bool:
+        """热重载流水线时，判断此实例能否在新配置下继续使用"""
+        if self.initialize_config_paths is None:
+            return False
+
+        for path in self.initialize_config_paths:
+            if get_config_value(old_config, path) != get_config_value(new_config, path):
+                return False
+
+        return True
+
+    def is_noop(
+        self,
+        stage_inst_name: str,
+        pipeline_config: dict,
+        launcher_type: core_entities.LauncherTypes,
+    ) -> bool:
+        """根据流水线配置静态判断此阶段对某类请求是否必定不做任何处理
+
+        在加载流水线、各阶段初始化之后调用，返回 True 的阶段不会被编入该请求类型的执行计划。
+        只能依据配置判断，不能依赖请求内容。
+
+        Args:
+            stage_inst_name (str): 阶段实例名称
+            pipeline_config (dict): 流水线配置
+            launcher_type (core_entities.LauncherTypes): 请求者类型
+
+        Returns:
+            bool: 是否可跳过
+        """
+        return False
+
     @abc.abstractmethod
     async def process(
         self,
@@ -8,6 +8,7 @@ from .. import entities
 from .. import stage
 from ...plugin import events
 from ...platform.types import message as platform_message
+from ...provider import entities as llm_entities
 
 
 @stage.stage_class('ResponseWrapper')
@@ -20,6 +21,8 @@ class ResponseWrapper(stage.PipelineStage):
         - resp_message_chain
     """
 
+    initialize_config_paths = []
+
     async def initialize(self, pipeline_config: dict):
         pass
 
@@ -36,6 +39,17 @@ class ResponseWrapper(stage.PipelineStage):
 
             yield entities.StageProcessResult(result_type=entities.ResultType.CONTINUE, new_query=query)
 
+        elif isinstance(query.resp_messages[-1], llm_entities.MessageChunk):
+            # 流式输出的部分回复，只展示，不触发插件事件
+            chunk_chain = query.resp_messages[-1].get_content_platform_message_chain()
+
+            if query.resp_stream is not None and query.resp_message_chain:
+                query.resp_message_chain[-1] = chunk_chain
+            else:
+                query.resp_message_chain.append(chunk_chain)
+
+            yield entities.StageProcessResult(result_type=entities.ResultType.CONTINUE, new_query=query)
+
         else:
             if query.resp_messages[-1].role == 'command':
                 query.resp_message_chain.append(
@@ -74,6 +88,9 @@ class ResponseWrapper(stage.PipelineStage):
                             )
                         )
                         if event_ctx.is_prevented_default():
+                            # 已流式输出的部分保持原样，之后的回复另起一条
+                            query.resp_stream = None
+
                             yield entities.StageProcessResult(
                                 result_type=entities.ResultType.INTERRUPT,
                                 new_query=query,
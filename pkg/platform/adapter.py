@@ -11,6 +11,28 @@ from .types import events as platform_events
 from .logger import EventLogger
 
 
+class StreamReply:
+    """一条流式输出中的回复
+
+    由发送回复阶段在输出第一段时创建，之后的各段都编辑同一条消息。
+    文字超过平台单条消息的长度上限时，由适配器结束当前消息，其余文字在新消息中继续输出。
+    """
+
+    handle: typing.Any
+    """平台侧的消息（如已发出消息的对象或 ID），由适配器在第一次发送时设置"""
+
+    last_update: float
+    """上一次发送或编辑的时间（time.monotonic()）"""
+
+    sent_length: int
+    """已在之前的消息中发出的文字长度，当前消息从此处开始"""
+
+    def __init__(self):
+        self.handle = None
+        self.last_update = 0.0
+        self.sent_length = 0
+
+
 class MessagePlatformAdapter(metaclass=abc.ABCMeta):
     """消息平台适配器基类"""
 
@@ -25,6 +47,9 @@ class MessagePlatformAdapter(metaclass=abc.ABCMeta):
 
     logger: EventLogger
 
+    stream_output_interval: float = 1.0
+    """流式输出时两次编辑消息的最小间隔（秒），避免触发平台的频率限制"""
+
     def __init__(self, config: dict, ap: app.Application, logger: EventLogger):
         """初始化适配器
 
@@ -61,6 +86,32 @@ class MessagePlatformAdapter(metaclass=abc.ABCMeta):
         """
         raise NotImplementedError
 
+    def is_stream_output_supported(self) -> bool:
+        """是否支持流式输出，支持的适配器需实现 reply_message_chunk"""
+        return False
+
+    async def reply_message_chunk(
+        self,
+        message_source: platform_events.MessageEvent,
+        stream: StreamReply,
+        message: platform_message.MessageChain,
+        quote_origin: bool = False,
+        is_final: bool = False,
+    ):
+        """流式回复消息
+
+        第一次调用时（stream.handle 为 None）发送消息并在 stream.handle 中记录，之后将该消息编辑为 message。
+        每次传入的都是到目前为止的完整回复，而不是增量。
+
+        Args:
+            message_source (platform.types.MessageEvent): 消息源事件
+            stream (StreamReply): 本条流式回复
+            message (platform.types.MessageChain): 到目前为止的完整回复
+            quote_origin (bool, optional): 是否引用原消息. Defaults to False.
+            is_final (bool, optional): 是否为最终的完整回复. Defaults to False.
+        """
+        raise NotImplementedError
+
     async def is_muted(self, group_id: int) -> bool:
         """获取账号是否在指定群被禁言"""
         raise NotImplementedError
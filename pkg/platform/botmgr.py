@@ -145,7 +145,11 @@ class PlatformManager:
     # ====== 4.0 ======
     ap: app.Application = None
 
-    bots: list[RuntimeBot]
+    bots_by_uuid: dict[str, RuntimeBot]
+    """uuid -> 运行时机器人
+
+    只整体替换、不原地修改，读者取到的总是某一时刻完整的快照。
+    """
 
     webchat_proxy_bot: RuntimeBot
 
@@ -155,10 +159,15 @@ class PlatformManager:
 
     def __init__(self, ap: app.Application = None):
         self.ap = ap
-        self.bots = []
+        self.bots_by_uuid = {}
         self.adapter_components = []
         self.adapter_dict = {}
 
+    @property
+    def bots(self) -> list[RuntimeBot]:
+        """所有运行时机器人（只读快照）"""
+        return list(self.bots_by_uuid.values())
+
     async def initialize(self):
         self.adapter_components = self.ap.discover.get_components_by_kind('MessagePlatformAdapter')
         adapter_dict: dict[str, type[msadapter.MessagePlatformAdapter]] = {}
@@ -199,7 +208,7 @@ class PlatformManager:
     async def load_bots_from_db(self):
         self.ap.logger.info('Loading bots from db...')
 
-        self.bots = []
+        self.bots_by_uuid = {}
 
         result = await self.ap.persistence_mgr.execute_async(sqlalchemy.select(persistence_bot.Bot))
 
@@ -239,23 +248,24 @@ class PlatformManager:
 
         await runtime_bot.initialize()
 
-        self.bots.append(runtime_bot)
+        self.bots_by_uuid = {**self.bots_by_uuid, bot_entity.uuid: runtime_bot}
 
         return runtime_bot
 
     async def get_bot_by_uuid(self, bot_uuid: str) -> RuntimeBot | None:
-        for bot in self.bots:
-            if bot.bot_entity.uuid == bot_uuid:
-                return bot
-        return None
+        return self.bots_by_uuid.get(bot_uuid)
 
     async def remove_bot(self, bot_uuid: str):
-        for bot in self.bots:
-            if bot.bot_entity.uuid == bot_uuid:
-                if bot.enable:
-                    await bot.shutdown()
-                self.bots.remove(bot)
-                return
+        bot = self.bots_by_uuid.get(bot_uuid)
+        if bot is None:
+            return
+
+        bots_by_uuid = dict(self.bots_by_uuid)
+        del bots_by_uuid[bot_uuid]
+        self.bots_by_uuid = bots_by_uuid
+
+        if bot.enable:
+            await bot.shutdown()
 
     def get_available_adapters_info(self) -> list[dict]:
         return [
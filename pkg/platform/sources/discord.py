@@ -21,6 +21,10 @@ from ..types import message as platform_message
 from ..types import events as platform_events
 from ..types import entities as platform_entities
 
+
+MESSAGE_MAX_LENGTH = 2000
+"""单条消息的最大字符数"""
+
 # 语音功能相关异常定义
 class VoiceConnectionError(Exception):
     """语音连接基础异常"""
@@ -1048,6 +1052,51 @@ class DiscordAdapter(adapter.MessagePlatformAdapter):
 
         await message_source.source_platform_object.channel.send(**args)
 
+    def is_stream_output_supported(self) -> bool:
+        return True
+
+    async def reply_message_chunk(
+        self,
+        message_source: platform_events.MessageEvent,
+        stream: adapter.StreamReply,
+        message: platform_message.MessageChain,
+        quote_origin: bool = False,
+        is_final: bool = False,
+    ):
+        msg_to_send, image_files = await self.message_converter.yiri2target(message)
+        assert isinstance(message_source.source_platform_object, discord.Message)
+
+        async def send_or_edit(content: str):
+            if stream.handle is None:
+                args = {
+                    'content': content,
+                }
+
+                if quote_origin and stream.sent_length == 0:
+                    args['reference'] = message_source.source_platform_object
+
+                if message.has(platform_message.At):
+                    args['mention_author'] = True
+
+                stream.handle = await message_source.source_platform_object.channel.send(**args)
+            elif content and content != stream.handle.content:
+                stream.handle = await stream.handle.edit(content=content)
+
+        text = msg_to_send[stream.sent_length :]
+
+        # 超过单条消息的长度上限时结束当前消息，其余文字在新消息中继续
+        while len(text) > MESSAGE_MAX_LENGTH:
+            await send_or_edit(text[:MESSAGE_MAX_LENGTH])
+            stream.handle = None
+            stream.sent_length += MESSAGE_MAX_LENGTH
+            text = text[MESSAGE_MAX_LENGTH:]
+
+        await send_or_edit(text)
+
+        # 编辑只更新文字，图片在最终回复时另外发送
+        if is_final and len(image_files) > 0:
+            await message_source.source_platform_object.channel.send(files=image_files)
+
     async def is_muted(self, group_id: int) -> bool:
         return False
 
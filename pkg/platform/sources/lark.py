@@ -339,6 +339,9 @@ class LarkAdapter(adapter.MessagePlatformAdapter):
     quart_app: quart.Quart
     ap: app.Application
 
+    stream_output_interval: float = 3.0
+    """飞书对单条消息的编辑次数有限制，流式输出时放宽编辑间隔"""
+
     def __init__(self, config: dict, ap: app.Application, logger: EventLogger):
         self.config = config
         self.ap = ap
@@ -447,6 +450,67 @@ class LarkAdapter(adapter.MessagePlatformAdapter):
                 f'client.im.v1.message.reply failed, code: {response.code}, msg: {response.msg}, log_id: {response.get_log_id()}, resp: \n{json.dumps(json.loads(response.raw.content), indent=4, ensure_ascii=False)}'
             )
 
+    def is_stream_output_supported(self) -> bool:
+        return True
+
+    async def reply_message_chunk(
+        self,
+        message_source: platform_events.MessageEvent,
+        stream: adapter.StreamReply,
+        message: platform_message.MessageChain,
+        quote_origin: bool = False,
+        is_final: bool = False,
+    ):
+        lark_message = await self.message_converter.yiri2target(message, self.api_client)
+
+        final_content = {
+            'zh_Hans': {
+                'title': '',
+                'content': lark_message,
+            },
+        }
+
+        if stream.handle is None:
+            request: ReplyMessageRequest = (
+                ReplyMessageRequest.builder()
+                .message_id(message_source.message_chain.message_id)
+                .request_body(
+                    ReplyMessageRequestBody.builder()
+                    .content(json.dumps(final_content))
+                    .msg_type('post')
+                    .reply_in_thread(False)
+                    .uuid(str(uuid.uuid4()))
+                    .build()
+                )
+                .build()
+            )
+
+            response: ReplyMessageResponse = await self.api_client.im.v1.message.areply(request)
+
+            if not response.success():
+                raise Exception(
+                    f'client.im.v1.message.reply failed, code: {response.code}, msg: {response.msg}, log_id: {response.get_log_id()}'
+                )
+
+            stream.handle = response.data.message_id
+            return
+
+        request: UpdateMessageRequest = (
+            UpdateMessageRequest.builder()
+            .message_id(stream.handle)
+            .request_body(
+                UpdateMessageRequestBody.builder().content(json.dumps(final_content)).msg_type('post').build()
+            )
+            .build()
+        )
+
+        response: UpdateMessageResponse = await self.api_client.im.v1.message.aupdate(request)
+
+        if not response.success():
+            raise Exception(
+                f'client.im.v1.message.update failed, code: {response.code}, msg: {response.msg}, log_id: {response.get_log_id()}'
+            )
+
     async def is_muted(self, group_id: int) -> bool:
         return False
 
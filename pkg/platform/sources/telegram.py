@@ -20,6 +20,10 @@ from ..types import entities as platform_entities
 from ..logger import EventLogger
 
 
+MESSAGE_MAX_LENGTH = 4096
+"""单条消息的最大字符数"""
+
+
 class TelegramMessageConverter(adapter.MessageConverter):
     @staticmethod
     async def yiri2target(message_chain: platform_message.MessageChain, bot: telegram.Bot) -> list[dict]:
@@ -200,6 +204,69 @@ class TelegramAdapter(adapter.MessagePlatformAdapter):
 
         await self.bot.send_message(**args)
 
+    def is_stream_output_supported(self) -> bool:
+        return True
+
+    async def reply_message_chunk(
+        self,
+        message_source: platform_events.MessageEvent,
+        stream: adapter.StreamReply,
+        message: platform_message.MessageChain,
+        quote_origin: bool = False,
+        is_final: bool = False,
+    ):
+        assert isinstance(message_source.source_platform_object, Update)
+        components = await TelegramMessageConverter.yiri2target(message, self.bot)
+
+        text = ''.join(component['text'] for component in components if component['type'] == 'text')
+        text = text[stream.sent_length :]
+        chat_id = message_source.source_platform_object.effective_chat.id
+
+        async def send_or_edit(content: str, is_last: bool):
+            args = {
+                'chat_id': chat_id,
+                'text': content,
+            }
+
+            # 未完成的 markdown 可能无法解析，只在最终回复时转换
+            # 转换后超出长度上限的仍按纯文本发送
+            if is_last and self.config['markdown_card'] is True:
+                markdown = telegramify_markdown.markdownify(content=content)
+
+                if len(markdown) <= MESSAGE_MAX_LENGTH:
+                    args['text'] = markdown
+                    args['parse_mode'] = 'MarkdownV2'
+
+            if stream.handle is None:
+                if quote_origin and stream.sent_length == 0:
+                    args['reply_to_message_id'] = message_source.source_platform_object.message.id
+
+                stream.handle = await self.bot.send_message(**args)
+                return
+
+            try:
+                await self.bot.edit_message_text(message_id=stream.handle.message_id, **args)
+            except telegram.error.BadRequest as e:
+                # 内容与上次相同
+                if 'not modified' not in str(e):
+                    raise
+
+        # 超过单条消息的长度上限时结束当前消息，其余文字在新消息中继续
+        while len(text) > MESSAGE_MAX_LENGTH:
+            await send_or_edit(text[:MESSAGE_MAX_LENGTH], is_last=False)
+            stream.handle = None
+            stream.sent_length += MESSAGE_MAX_LENGTH
+            text = text[MESSAGE_MAX_LENGTH:]
+
+        if text:
+            await send_or_edit(text, is_last=is_final)
+
+        # 编辑只更新文字，图片在最终回复时另外发送
+        if is_final:
+            for component in components:
+                if component['type'] == 'photo' and component['photo'] is not None:
+                    await self.bot.send_photo(chat_id=chat_id, photo=component['photo'])
+
     async def is_muted(self, group_id: int) -> bool:
         return False
 
@@ -19,17 +19,22 @@ class WebChatMessage(BaseModel):
     content: str
     message_chain: list[dict]
     timestamp: str
+    is_final: bool = True
+    """流式输出时，是否为最终的完整回复"""
 
 
 class WebChatSession:
     id: str
     message_lists: dict[str, list[WebChatMessage]] = {}
     resp_waiters: dict[int, asyncio.Future[WebChatMessage]]
+    resp_queues: dict[int, asyncio.Queue[WebChatMessage]]
+    """以流式请求的消息 ID -> 依次收到的回复"""
 
     def __init__(self, id: str):
         self.id = id
         self.message_lists = {}
         self.resp_waiters = {}
+        self.resp_queues = {}
 
     def get_message_list(self, pipeline_uuid: str) -> list[WebChatMessage]:
         if pipeline_uuid not in self.message_lists:
@@ -85,6 +90,23 @@ class WebChatAdapter(msadapter.MessagePlatformAdapter):
 
         return message_data
 
+    def _get_session(self, message_source: platform_events.MessageEvent) -> WebChatSession:
+        if isinstance(message_source, platform_events.GroupMessage):
+            return self.webchat_group_session
+        return self.webchat_person_session
+
+    def _notify(self, message_source: platform_events.MessageEvent, message_data: WebChatMessage):
+        """把回复交给等待中的请求"""
+        use_session = self._get_session(message_source)
+        message_id = message_source.message_chain.message_id
+
+        if message_id in use_session.resp_queues:
+            use_session.resp_queues[message_id].put_nowait(message_data)
+        elif message_data.is_final and message_id in use_session.resp_waiters:
+            waiter = use_session.resp_waiters[message_id]
+            if not waiter.done():
+                waiter.set_result(message_data)
+
     async def reply_message(
         self,
         message_source: platform_events.MessageEvent,
@@ -101,13 +123,35 @@ class WebChatAdapter(msadapter.MessagePlatformAdapter):
         )
 
         # notify waiter
-        if isinstance(message_source, platform_events.FriendMessage):
-            self.webchat_person_session.resp_waiters[message_source.message_chain.message_id].set_result(message_data)
-        elif isinstance(message_source, platform_events.GroupMessage):
-            self.webchat_group_session.resp_waiters[message_source.message_chain.message_id].set_result(message_data)
+        self._notify(message_source, message_data)
 
         return message_data.model_dump()
 
+    def is_stream_output_supported(self) -> bool:
+        return True
+
+    async def reply_message_chunk(
+        self,
+        message_source: platform_events.MessageEvent,
+        stream: msadapter.StreamReply,
+        message: platform_message.MessageChain,
+        quote_origin: bool = False,
+        is_final: bool = False,
+    ):
+        """流式回复消息，非流式的请求只会收到最终的回复"""
+        message_data = WebChatMessage(
+            id=-1,
+            role='assistant',
+            content=str(message),
+            message_chain=[component.__dict__ for component in message],
+            timestamp=datetime.now().isoformat(),
+            is_final=is_final,
+        )
+
+        stream.handle = message_source.message_chain.message_id
+
+        self._notify(message_source, message_data)
+
     def register_listener(
         self,
         event_type: typing.Type[platform_events.Event],
@@ -139,15 +183,14 @@ class WebChatAdapter(msadapter.MessagePlatformAdapter):
         """停止适配器"""
         await self.logger.info('WebChat调试适配器正在停止')
 
-    async def send_webchat_message(
-        self, pipeline_uuid: str, session_type: str, message_chain_obj: typing.List[dict]
-    ) -> dict:
-        """发送调试消息到流水线"""
-        if session_type == 'person':
-            use_session = self.webchat_person_session
-        else:
-            use_session = self.webchat_group_session
-
+    async def _dispatch_webchat_message(
+        self,
+        use_session: WebChatSession,
+        pipeline_uuid: str,
+        session_type: str,
+        message_chain_obj: typing.List[dict],
+    ) -> int:
+        """记录调试消息并交给流水线，返回消息 ID"""
         message_chain = platform_message.MessageChain.parse_obj(message_chain_obj)
 
         message_id = len(use_session.get_message_list(pipeline_uuid)) + 1
@@ -188,6 +231,19 @@ class WebChatAdapter(msadapter.MessagePlatformAdapter):
         if event.__class__ in self.listeners:
             await self.listeners[event.__class__](event, self)
 
+        return message_id
+
+    async def send_webchat_message(
+        self, pipeline_uuid: str, session_type: str, message_chain_obj: typing.List[dict]
+    ) -> dict:
+        """发送调试消息到流水线"""
+        if session_type == 'person':
+            use_session = self.webchat_person_session
+        else:
+            use_session = self.webchat_group_session
+
+        message_id = await self._dispatch_webchat_message(use_session, pipeline_uuid, session_type, message_chain_obj)
+
         # set waiter
         waiter = asyncio.Future[WebChatMessage]()
         use_session.resp_waiters[message_id] = waiter
@@ -201,6 +257,40 @@ class WebChatAdapter(msadapter.MessagePlatformAdapter):
 
         return resp_message.model_dump()
 
+    async def send_webchat_message_stream(
+        self, pipeline_uuid: str, session_type: str, message_chain_obj: typing.List[dict]
+    ) -> typing.AsyncGenerator[dict, None]:
+        """发送调试消息到流水线，依次产生流式输出的回复，直到最终的完整回复"""
+        if session_type == 'person':
+            use_session = self.webchat_person_session
+        else:
+            use_session = self.webchat_group_session
+
+        message_id = len(use_session.get_message_list(pipeline_uuid)) + 1
+
+        # 在交给流水线前注册，避免漏掉第一段输出
+        queue = asyncio.Queue[WebChatMessage]()
+        use_session.resp_queues[message_id] = queue
+
+        try:
+            await self._dispatch_webchat_message(use_session, pipeline_uuid, session_type, message_chain_obj)
+
+            resp_id = len(use_session.get_message_list(pipeline_uuid)) + 1
+
+            while True:
+                resp_message = await queue.get()
+                resp_message.id = resp_id
+
+                if resp_message.is_final:
+                    use_session.get_message_list(pipeline_uuid).append(resp_message)
+
+                yield resp_message.model_dump()
+
+                if resp_message.is_final:
+                    break
+        finally:
+            use_session.resp_queues.pop(message_id, None)
+
     def get_webchat_messages(self, pipeline_uuid: str, session_type: str) -> list[dict]:
         """获取调试消息历史"""
         if session_type == 'person':
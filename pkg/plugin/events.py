@@ -18,6 +18,13 @@ class BaseEventModel(pydantic.BaseModel):
     class Config:
         arbitrary_types_allowed = True
 
+    @pydantic.validator('query')
+    def _validate_query(cls, query: typing.Optional[core_entities.Query]) -> typing.Optional[core_entities.Query]:
+        # 流水线内部不校验 Query，交给插件前在这里校验
+        if query is not None:
+            query.validate()
+        return query
+
 
 class PersonMessageReceived(BaseEventModel):
     """收到任何私聊消息时"""
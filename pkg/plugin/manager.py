@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import traceback
+import typing
 
 import sqlalchemy
 
@@ -222,6 +223,13 @@ class PluginManager:
                 return plugin
         return None
 
+    def has_event_handlers(self, event_cls: typing.Type[events.BaseEventModel]) -> bool:
+        """是否有已启用的插件处理此事件"""
+        for plugin in self.plugins(enabled=True, status=context.RuntimeContainerStatus.INITIALIZED):
+            if event_cls in plugin.event_handlers:
+                return True
+        return False
+
     async def emit_event(self, event: events.BaseEventModel) -> context.EventContext:
         """触发事件"""
 
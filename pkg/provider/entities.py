@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import collections.abc
 import typing
 import pydantic.v1 as pydantic
 
@@ -61,6 +62,61 @@ class ContentElement(pydantic.BaseModel):
         return cls(type='image_base64', image_base64=image_base64)
 
 
+class Usage(pydantic.BaseModel):
+    """一次请求的 token 用量"""
+
+    prompt_tokens: int = 0
+    """输入 token 数，包括命中和写入提示词缓存的部分"""
+
+    completion_tokens: int = 0
+    """输出 token 数"""
+
+    cache_hit_tokens: int = 0
+    """命中提示词缓存的输入 token 数"""
+
+    cache_write_tokens: int = 0
+    """写入提示词缓存的输入 token 数，仅 Anthropic 等需要显式设置缓存的服务商返回"""
+
+    @property
+    def cache_miss_tokens(self) -> int:
+        """未命中提示词缓存的输入 token 数"""
+        return self.prompt_tokens - self.cache_hit_tokens
+
+    @classmethod
+    def from_openai(cls, usage: typing.Any) -> Usage | None:
+        """从 OpenAI 兼容接口返回的 usage 转换"""
+        if usage is None:
+            return None
+
+        usage_dict = usage if isinstance(usage, dict) else usage.model_dump()
+
+        # OpenAI: prompt_tokens_details.cached_tokens；DeepSeek: prompt_cache_hit_tokens
+        details = usage_dict.get('prompt_tokens_details') or {}
+        cache_hit_tokens = details.get('cached_tokens') or usage_dict.get('prompt_cache_hit_tokens') or 0
+
+        return cls(
+            prompt_tokens=usage_dict.get('prompt_tokens') or 0,
+            completion_tokens=usage_dict.get('completion_tokens') or 0,
+            cache_hit_tokens=cache_hit_tokens,
+        )
+
+    @classmethod
+    def from_anthropic(cls, usage: typing.Any) -> Usage | None:
+        """从 Anthropic 返回的 usage 转换，其 input_tokens 不包含缓存读写的部分"""
+        if usage is None:
+            return None
+
+        cache_hit_tokens = getattr(usage, 'cache_read_input_tokens', None) or 0
+        cache_write_tokens = getattr(usage, 'cache_creation_input_tokens', None) or 0
+
+        return cls(
+            prompt_tokens=(usage.input_tokens or 0) + cache_hit_tokens + cache_write_tokens,
+            completion_tokens=usage.output_tokens or 0,
+            cache_hit_tokens=cache_hit_tokens,
+            cache_write_tokens=cache_write_tokens,
+        )
+
+
 class Message(pydantic.BaseModel):
     """消息"""
 
@@ -78,6 +134,37 @@ class Message(pydantic.BaseModel):
 
     tool_call_id: typing.Optional[str] = None
 
+    usage: typing.Optional[Usage] = pydantic.Field(default=None, exclude=True)
+    """模型返回此消息时的 token 用量，仅模型回复的消息有，不参与序列化"""
+
+    model_uuid: typing.Optional[str] = pydantic.Field(default=None, exclude=True)
+    """回复此消息的模型，使用备用模型时与流水线配置的模型不同，不参与序列化"""
+
+    _token_counts: dict[str, int] = pydantic.PrivateAttr(default_factory=dict)
+    """各编码下的 token 数缓存，不参与序列化"""
+
+    _serialized: dict[typing.Any, dict] = pydantic.PrivateAttr(default_factory=dict)
+    """各请求格式下转换后的消息缓存，不参与序列化"""
+
+    def __setattr__(self, name, value):
+        super().__setattr__(name, value)
+
+        # 字段被重新赋值后缓存失效；原地修改 content 列表等不会被检测到，消息应视为不可变
+        if name in self.__fields__:
+            self._reset_caches()
+
+    def _reset_caches(self):
+        self._token_counts = {}
+        self._serialized = {}
+
+    def copy(self, **kwargs) -> Message:
+        message = super().copy(**kwargs)
+
+        if kwargs.get('update'):
+            message._reset_caches()
+
+        return message
+
     def readable_str(self) -> str:
         if self.content is not None:
             return str(self.role) + ': ' + str(self.get_content_platform_message_chain())
@@ -125,6 +212,101 @@ class Message(pydantic.BaseModel):
             return platform_message.MessageChain(mc)
 
 
+class MessageChunk(Message):
+    """流式输出中尚未完成的回复
+
+    content 为到目前为止累积的完整文本（不是增量），平台适配器可直接用它编辑已发出的消息。
+    只用于展示，不写入对话历史、不触发插件事件；流结束时请求器会再给出完整的 Message。
+    """
+
+    role: str = 'assistant'
+
+
+class MessageHistory(collections.abc.MutableSequence):
+    """对话历史的写时复制视图
+
+    引用对话的消息列表中 [start, end) 的部分，切片得到的仍是共享同一列表的视图，
+    流水线各阶段之间传递历史不再复制。第一次被修改（如插件 append、替换某条消息）时才复制出自己的列表，
+    不影响对话本身。
+
+    被引用的列表只允许在末尾追加（对话的新回合），视图在创建时固定了 end，不会看到之后追加的消息。
+    """
+
+    __slots__ = ('_items', '_start', '_end', '_shared')
+
+    def __init__(self, items: list[Message], start: int = 0, end: int | None = None):
+        self._items = items
+        self._start = start
+        self._end = len(items) if end is None else end
+        self._shared = True
+
+    def _materialize(self):
+        if self._shared:
+            self._items = self._items[self._start : self._end]
+            self._start = 0
+            self._end = len(self._items)
+            self._shared = False
+
+    def _index(self, index: int) -> int:
+        length = self._end - self._start
+        if index < 0:
+            index += length
+        if index < 0 or index >= length:
+            raise IndexError('history index out of range')
+        return self._start + index
+
+    def __len__(self) -> int:
+        return self._end - self._start
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self._end - self._start)
+            if step == 1:
+                # 切片与自己共享列表，之后任一方被修改时都要先复制
+                self._shared = True
+                return MessageHistory(self._items, self._start + start, self._start + max(start, stop))
+            return list(self)[index]
+
+        return self._items[self._index(index)]
+
+    def __iter__(self):
+        items = self._items
+        for i in range(self._start, self._end):
+            yield items[i]
+
+    def __setitem__(self, index, value):
+        self._materialize()
+        self._items[index] = value
+        self._end = len(self._items)
+
+    def __delitem__(self, index):
+        self._materialize()
+        del self._items[index]
+        self._end = len(self._items)
+
+    def insert(self, index: int, value: Message):
+        self._materialize()
+        self._items.insert(index, value)
+        self._end = len(self._items)
+
+    def copy(self) -> list[Message]:
+        return self._items[self._start : self._end]
+
+    def __add__(self, other) -> list[Message]:
+        return self.copy() + list(other)
+
+    def __radd__(self, other) -> list[Message]:
+        return list(other) + self.copy()
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, collections.abc.Sequence) or len(self) != len(other):
+            return False
+        return all(a == b for a, b in zip(self, other))
+
+    def __repr__(self) -> str:
+        return f'MessageHistory({self.copy()!r})'
+
+
 class Prompt(pydantic.BaseModel):
     """供AI使用的Prompt"""
 
@@ -0,0 +1,259 @@
+"""模型的并发与速率限制
+
+每个运行时模型有一个 ModelLimiter，请求器在发送每次请求前取得名额，超出限制时排队等待而不是直接失败。
+并发上限按 AIMD 自适应：被限流（429）时减半，之后每次成功缓慢恢复。
+
+请求在模型的队列中等待时，会暂时归还占用的流水线并发名额（Controller.semaphore），
+避免一个慢或受限的模型占满全局并发，影响使用其他模型的流水线。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import contextvars
+import time
+import typing
+
+
+RATE_WINDOW = 60
+"""RPM/TPM 的统计窗口（秒）"""
+
+MAX_QUEUE_TIME = 60
+"""所有 key 都被限流时，单次调用最多排队等待的时间（秒），超过则直接失败"""
+
+
+class PipelineSlot:
+    """请求占用的流水线并发名额"""
+
+    semaphore: asyncio.Semaphore
+
+    held: bool
+    """当前是否持有名额"""
+
+    def __init__(self, semaphore: asyncio.Semaphore):
+        self.semaphore = semaphore
+        self.held = False
+
+    async def acquire(self):
+        await self.semaphore.acquire()
+        self.held = True
+
+    def release(self):
+        if self.held:
+            self.held = False
+            self.semaphore.release()
+
+    async def __aenter__(self) -> PipelineSlot:
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+
+current_pipeline_slot: contextvars.ContextVar[typing.Optional[PipelineSlot]] = contextvars.ContextVar(
+    'current_pipeline_slot', default=None
+)
+"""当前请求占用的流水线并发名额，由 Controller 设置"""
+
+
+class ModelLimiter:
+    """单个模型的并发与速率限制器"""
+
+    max_concurrency: int
+    """配置的最大并发数，0 为不限制"""
+
+    rpm_limit: int
+    """每分钟最大请求数，0 为不限制"""
+
+    tpm_limit: int
+    """每分钟最大 token 数，0 为不限制"""
+
+    concurrency_limit: typing.Optional[float]
+    """当前生效的并发上限，被限流后自适应调整，None 为不限制"""
+
+    active: int
+    """正在进行的请求数"""
+
+    waiting: int
+    """排队等待的请求数"""
+
+    paused_until: float
+    """在此时间（time.monotonic()）之前不发出新请求"""
+
+    throttled_count: int
+    """被限流的次数"""
+
+    _throttled_at: int
+    """上次被限流时的并发数，未配置最大并发时，恢复到其两倍后取消限制"""
+
+    _request_times: collections.deque[float]
+
+    _token_usages: collections.deque[tuple[float, int]]
+
+    _condition: asyncio.Condition
+
+    def __init__(self, max_concurrency: int = 0, rpm_limit: int = 0, tpm_limit: int = 0):
+        self.max_concurrency = max(int(max_concurrency or 0), 0)
+        self.rpm_limit = max(int(rpm_limit or 0), 0)
+        self.tpm_limit = max(int(tpm_limit or 0), 0)
+        self.concurrency_limit = self.max_concurrency or None
+        self.active = 0
+        self.waiting = 0
+        self.paused_until = 0.0
+        self.throttled_count = 0
+        self._throttled_at = 0
+        self._request_times = collections.deque()
+        self._token_usages = collections.deque()
+        self._condition = asyncio.Condition()
+
+    def _expire(self, now: float):
+        while self._request_times and self._request_times[0] <= now - RATE_WINDOW:
+            self._request_times.popleft()
+
+        while self._token_usages and self._token_usages[0][0] <= now - RATE_WINDOW:
+            self._token_usages.popleft()
+
+    def _tokens_in_window(self) -> int:
+        return sum(tokens for _, tokens in self._token_usages)
+
+    def _get_delay(self, now: float) -> typing.Optional[float]:
+        """距离可以发出下一个请求的时间，0 为立即可以，None 为需等待其他请求结束"""
+        self._expire(now)
+
+        delay = max(self.paused_until - now, 0.0)
+
+        if self.rpm_limit and len(self._request_times) >= self.rpm_limit:
+            delay = max(delay, self._request_times[0] + RATE_WINDOW - now)
+
+        if self.tpm_limit and self._token_usages and self._tokens_in_window() >= self.tpm_limit:
+            # 等到足够多的用量移出窗口
+            excess = self._tokens_in_window() - self.tpm_limit
+            for used_at, tokens in self._token_usages:
+                excess -= tokens
+                if excess < 0:
+                    delay = max(delay, used_at + RATE_WINDOW - now)
+                    break
+
+        if delay > 0:
+            return delay
+
+        if self.concurrency_limit is not None and self.active >= max(int(self.concurrency_limit), 1):
+            return None
+
+        return 0.0
+
+    def is_idle(self) -> bool:
+        """是否可以立即发出请求"""
+        return self._get_delay(time.monotonic()) == 0.0
+
+    async def _wait(self):
+        async with self._condition:
+            self.waiting += 1
+
+            try:
+                while True:
+                    delay = self._get_delay(time.monotonic())
+
+                    if delay == 0.0:
+                        break
+
+                    try:
+                        await asyncio.wait_for(self._condition.wait(), delay)
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self.waiting -= 1
+
+            self.active += 1
+            self._request_times.append(time.monotonic())
+
+    async def acquire(self):
+        """取得发出一次请求的名额，超出限制时排队"""
+        if self.is_idle():
+            await self._wait()
+            return
+
+        # 排队期间归还流水线并发名额
+        slot = current_pipeline_slot.get()
+        released = slot is not None and slot.held
+
+        if released:
+            slot.release()
+
+        try:
+            await self._wait()
+        except BaseException:
+            if released:
+                await slot.acquire()
+            raise
+
+        if released:
+            try:
+                await slot.acquire()
+            except BaseException:
+                # 请求已计入 active，取回名额时被取消要撤销，否则该模型会一直被占用
+                await self.release()
+                raise
+
+    async def release(self):
+        async with self._condition:
+            self.active -= 1
+            self._condition.notify_all()
+
+    async def __aenter__(self) -> ModelLimiter:
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+    def record_tokens(self, tokens: int):
+        """记录一次请求的 token 用量，计入 TPM"""
+        if self.tpm_limit and tokens > 0:
+            self._token_usages.append((time.monotonic(), tokens))
+
+    def on_success(self):
+        """请求成功，逐步恢复并发上限"""
+        if self.concurrency_limit is None:
+            return
+
+        self.concurrency_limit += 1 / max(self.concurrency_limit, 1)
+
+        if self.max_concurrency:
+            self.concurrency_limit = min(self.concurrency_limit, self.max_concurrency)
+        elif self.concurrency_limit >= self._throttled_at * 2:
+            self.concurrency_limit = None
+
+    def on_rate_limited(self, pause: typing.Optional[float] = None):
+        """被限流，并发上限减半
+
+        Args:
+            pause: 所有 key 都不可用时，在此时间（秒）内暂停发出新请求
+        """
+        self.throttled_count += 1
+        self._throttled_at = max(self.active, 1)
+
+        current = self.concurrency_limit if self.concurrency_limit is not None else self.active
+        self.concurrency_limit = max(min(current, self.active) / 2, 1)
+
+        if pause:
+            self.paused_until = max(self.paused_until, time.monotonic() + pause)
+
+    def to_dict(self) -> dict:
+        now = time.monotonic()
+        self._expire(now)
+
+        return {
+            'max_concurrency': self.max_concurrency,
+            'rpm_limit': self.rpm_limit,
+            'tpm_limit': self.tpm_limit,
+            'concurrency_limit': int(self.concurrency_limit) if self.concurrency_limit is not None else None,
+            'active': self.active,
+            'waiting': self.waiting,
+            'paused_remaining': max(self.paused_until - now, 0.0),
+            'requests_in_window': len(self._request_times),
+            'tokens_in_window': self._tokens_in_window(),
+            'throttled_count': self.throttled_count,
+        }
@@ -1,10 +1,17 @@
 from __future__ import annotations
 
+import asyncio
+import time
+import typing
+
 import sqlalchemy
 import traceback
 
-from . import entities, requester
+from . import entities, errors, limiter, requester, respcache, retry
 from ...core import app
+from ...core import entities as core_entities
+from .. import entities as llm_entities
+from ..tools import entities as tools_entities
 from ...discover import engine
 from . import token
 from ...entity.persistence import model as persistence_model
@@ -12,6 +19,9 @@ from ...entity.errors import provider as provider_errors
 
 FETCH_MODEL_LIST_URL = 'https://api.qchatgpt.rockchin.top/api/v2/fetch/model_list'
 
+HEDGE_MIN_SAMPLES = 20
+"""模型成功请求数不少于此值时才按其 p95 耗时发起对冲请求"""
+
 
 class ModelManager:
     """模型管理器"""
@@ -26,20 +36,39 @@ class ModelManager:
 
     ap: app.Application
 
-    llm_models: list[requester.RuntimeLLMModel]
+    llm_models_by_uuid: dict[str, requester.RuntimeLLMModel]
+    """uuid -> 运行时模型
+
+    只整体替换、不原地修改，读者取到的总是某一时刻完整的快照。
+    """
 
     requester_components: list[engine.Component]
 
     requester_dict: dict[str, type[requester.LLMAPIRequester]]  # cache
 
+    retry_policy: retry.RetryPolicy
+    """所有请求器共用的重试策略"""
+
+    response_cache: respcache.ResponseCache
+    """模型回复缓存，由开启了回复缓存的流水线使用"""
+
     def __init__(self, ap: app.Application):
         self.ap = ap
         self.model_list = []
         self.requesters = {}
         self.token_mgrs = {}
-        self.llm_models = []
+        self.llm_models_by_uuid = {}
         self.requester_components = []
         self.requester_dict = {}
+        self.retry_policy = retry.RetryPolicy.from_config(self.ap.instance_config.data.get('model-retry', {}))
+        self.response_cache = respcache.ResponseCache(
+            max_entries=self.ap.instance_config.data.get('response-cache', {}).get('max-entries', 1000)
+        )
+
+    @property
+    def llm_models(self) -> list[requester.RuntimeLLMModel]:
+        """所有运行时模型（只读快照）"""
+        return list(self.llm_models_by_uuid.values())
 
     async def initialize(self):
         self.requester_components = self.ap.discover.get_components_by_kind('LLMAPIRequester')
@@ -57,7 +86,7 @@ class ModelManager:
         """从数据库加载模型"""
         self.ap.logger.info('Loading models from db...')
 
-        self.llm_models = []
+        llm_models_by_uuid: dict[str, requester.RuntimeLLMModel] = {}
 
         # llm models
         result = await self.ap.persistence_mgr.execute_async(sqlalchemy.select(persistence_model.LLMModel))
@@ -67,12 +96,16 @@ class ModelManager:
         # load models
         for llm_model in llm_models:
             try:
-                await self.load_llm_model(llm_model)
+                runtime_llm_model = await self.init_runtime_llm_model(llm_model)
+                llm_models_by_uuid[runtime_llm_model.model_entity.uuid] = runtime_llm_model
             except provider_errors.RequesterNotFoundError as e:
                 self.ap.logger.warning(f'Requester {e.requester_name} not found, skipping model {llm_model.uuid}')
             except Exception as e:
                 self.ap.logger.error(f'Failed to load model {llm_model.uuid}: {e}\n{traceback.format_exc()}')
 
+        # 全部加载完再替换，加载期间读者仍能取到旧的模型
+        self.llm_models_by_uuid = llm_models_by_uuid
+
     async def init_runtime_llm_model(
         self,
         model_info: persistence_model.LLMModel | sqlalchemy.Row[persistence_model.LLMModel] | dict,
@@ -97,6 +130,11 @@ class ModelManager:
                 tokens=model_info.api_keys,
             ),
             requester=requester_inst,
+            limiter=limiter.ModelLimiter(
+                max_concurrency=requester_inst.requester_cfg.get('max_concurrency', 0),
+                rpm_limit=requester_inst.requester_cfg.get('rpm_limit', 0),
+                tpm_limit=requester_inst.requester_cfg.get('tpm_limit', 0),
+            ),
         )
 
         return runtime_llm_model
@@ -105,9 +143,9 @@ class ModelManager:
         self,
         model_info: persistence_model.LLMModel | sqlalchemy.Row[persistence_model.LLMModel] | dict,
     ):
-        """加载模型"""
+        """加载模型，已加载同 uuid 的模型时替换之"""
         runtime_llm_model = await self.init_runtime_llm_model(model_info)
-        self.llm_models.append(runtime_llm_model)
+        self.llm_models_by_uuid = {**self.llm_models_by_uuid, runtime_llm_model.model_entity.uuid: runtime_llm_model}
 
     async def get_model_by_name(self, name: str) -> entities.LLMModelInfo:  # deprecated
         """通过名称获取模型"""
@@ -118,17 +156,203 @@ class ModelManager:
 
     async def get_model_by_uuid(self, uuid: str) -> entities.LLMModelInfo:
         """通过uuid获取模型"""
-        for model in self.llm_models:
-            if model.model_entity.uuid == uuid:
-                return model
-        raise ValueError(f'model {uuid} not found')
+        model = self.llm_models_by_uuid.get(uuid)
+        if model is None:
+            raise ValueError(f'model {uuid} not found')
+        return model
 
     async def remove_llm_model(self, model_uuid: str):
         """移除模型"""
-        for model in self.llm_models:
-            if model.model_entity.uuid == model_uuid:
-                self.llm_models.remove(model)
-                return
+        if model_uuid not in self.llm_models_by_uuid:
+            return
+
+        llm_models_by_uuid = dict(self.llm_models_by_uuid)
+        del llm_models_by_uuid[model_uuid]
+        self.llm_models_by_uuid = llm_models_by_uuid
+
+    def get_fallback_chain(
+        self,
+        primary: requester.RuntimeLLMModel,
+        local_agent_cfg: dict[str, typing.Any],
+    ) -> list[tuple[requester.RuntimeLLMModel, float | None]]:
+        """按流水线的 local-agent 配置获取模型链：主模型和各备用模型及其单次请求超时
+
+        fallback-models 中的每一项可以是模型 uuid，也可以是 {"model": uuid, "timeout": 秒}，
+        未单独设置超时的使用 attempt-timeout，为 0 时不限制（仍受请求器自身的超时限制）。
+        """
+        default_timeout = local_agent_cfg.get('attempt-timeout', 0) or None
+
+        chain = [(primary, default_timeout)]
+        used = {primary.model_entity.uuid}
+
+        for item in local_agent_cfg.get('fallback-models', []):
+            if isinstance(item, dict):
+                model_uuid = item.get('model', '')
+                timeout = item.get('timeout', default_timeout) or None
+            else:
+                model_uuid = item
+                timeout = default_timeout
+
+            if not model_uuid or model_uuid in used:
+                continue
+
+            model = self.llm_models_by_uuid.get(model_uuid)
+
+            if model is None:
+                self.ap.logger.warning(f'Fallback model {model_uuid} not found, skipping')
+                continue
+
+            used.add(model_uuid)
+            chain.append((model, timeout))
+
+        return chain
+
+    async def _invoke_model(
+        self,
+        query: core_entities.Query,
+        model: requester.RuntimeLLMModel,
+        timeout: float | None,
+        messages: list[llm_entities.Message],
+        funcs: list[tools_entities.LLMFunction] | None,
+    ) -> llm_entities.Message:
+        start = time.monotonic()
+
+        message = await asyncio.wait_for(
+            model.requester.invoke_llm(
+                query,
+                model,
+                messages,
+                # 不支持工具调用的备用模型不传入工具
+                funcs if 'func_call' in model.model_entity.abilities else None,
+                extra_args=model.model_entity.extra_args,
+            ),
+            timeout,
+        )
+
+        model.latency.observe(time.monotonic() - start)
+        message.model_uuid = model.model_entity.uuid
+
+        return message
+
+    async def invoke_llm(
+        self,
+        query: core_entities.Query,
+        chain: list[tuple[requester.RuntimeLLMModel, float | None]],
+        messages: list[llm_entities.Message],
+        funcs: list[tools_entities.LLMFunction] | None = None,
+        hedge: bool = False,
+    ) -> llm_entities.Message:
+        """按模型链请求，某个模型失败或超时后请求下一个
+
+        Args:
+            chain: get_fallback_chain 返回的模型链
+            hedge: 是否对冲请求。当前模型超过其 p95 耗时仍未返回时，同时请求下一个模型，采用先返回的结果
+        """
+        if len(chain) == 1 and chain[0][1] is None:
+            return await self._invoke_model(query, chain[0][0], None, messages, funcs)
+
+        pending: dict[asyncio.Task, requester.RuntimeLLMModel] = {}
+        next_index = 0
+        last_error: Exception | None = None
+
+        def launch():
+            nonlocal next_index
+
+            model, timeout = chain[next_index]
+            next_index += 1
+
+            task = asyncio.create_task(self._invoke_model(query, model, timeout, messages, funcs))
+            pending[task] = model
+
+        launch()
+
+        try:
+            while pending:
+                hedge_delay = None
+
+                if hedge and len(pending) == 1 and next_index < len(chain):
+                    current = next(iter(pending.values()))
+
+                    if current.latency.count >= HEDGE_MIN_SAMPLES:
+                        hedge_delay = current.latency.quantile(0.95)
+
+                done, _ = await asyncio.wait(pending, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    self.ap.logger.info(
+                        f'Model {current.model_entity.name} has not responded in {hedge_delay}s, '
+                        f'hedging with {chain[next_index][0].model_entity.name}'
+                    )
+                    launch()
+                    continue
+
+                for task in done:
+                    model = pending.pop(task)
+
+                    try:
+                        return task.result()
+                    except Exception as e:
+                        last_error = e if not isinstance(e, asyncio.TimeoutError) else errors.RequesterError('请求超时')
+                        self.ap.logger.warning(f'Model {model.model_entity.name} failed: {last_error}')
+
+                if not pending and next_index < len(chain):
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+
+        raise last_error
+
+    async def invoke_llm_stream(
+        self,
+        query: core_entities.Query,
+        chain: list[tuple[requester.RuntimeLLMModel, float | None]],
+        messages: list[llm_entities.Message],
+        funcs: list[tools_entities.LLMFunction] | None = None,
+    ) -> typing.AsyncGenerator[llm_entities.MessageChunk | llm_entities.Message, None]:
+        """同 invoke_llm，以流式请求
+
+        单次请求超时只限制等待第一段输出的时间，开始输出后不再切换模型，也不进行对冲请求。
+        """
+        last_error: Exception | None = None
+
+        for model, timeout in chain:
+            start = time.monotonic()
+
+            stream = model.requester.invoke_llm_stream(
+                query,
+                model,
+                messages,
+                funcs if 'func_call' in model.model_entity.abilities else None,
+                extra_args=model.model_entity.extra_args,
+            )
+
+            try:
+                first = await asyncio.wait_for(anext(stream), timeout)
+            except Exception as e:
+                await stream.aclose()
+
+                last_error = e if not isinstance(e, asyncio.TimeoutError) else errors.RequesterError('请求超时')
+                self.ap.logger.warning(f'Model {model.model_entity.name} failed: {last_error}')
+                continue
+
+            # 在完整的回复（最后一个）上记录回复的模型
+            if not isinstance(first, llm_entities.MessageChunk):
+                first.model_uuid = model.model_entity.uuid
+
+            yield first
+
+            async for msg in stream:
+                if not isinstance(msg, llm_entities.MessageChunk):
+                    msg.model_uuid = model.model_entity.uuid
+
+                yield msg
+
+            model.latency.observe(time.monotonic() - start)
+
+            return
+
+        raise last_error
 
     def get_available_requesters_info(self) -> list[dict]:
         """获取所有可用的请求器"""
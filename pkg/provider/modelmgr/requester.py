@@ -1,6 +1,8 @@
 from __future__ import annotations
 
 import abc
+import asyncio
+import time
 import typing
 
 from ...core import app
@@ -8,9 +10,57 @@ from ...core import entities as core_entities
 from .. import entities as llm_entities
 from ..tools import entities as tools_entities
 from ...entity.persistence import model as persistence_model
+from ...utils import metrics
+from . import limiter as model_limiter
+from . import retry
 from . import token
 
 
+class UsageStats:
+    """模型的 token 用量统计"""
+
+    request_count: int
+
+    prompt_tokens: int
+
+    completion_tokens: int
+
+    cache_hit_tokens: int
+
+    cache_write_tokens: int
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.request_count = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cache_hit_tokens = 0
+        self.cache_write_tokens = 0
+
+    def record(self, usage: llm_entities.Usage | None):
+        if usage is None:
+            return
+
+        self.request_count += 1
+        self.prompt_tokens += usage.prompt_tokens
+        self.completion_tokens += usage.completion_tokens
+        self.cache_hit_tokens += usage.cache_hit_tokens
+        self.cache_write_tokens += usage.cache_write_tokens
+
+    def to_dict(self) -> dict:
+        return {
+            'request_count': self.request_count,
+            'prompt_tokens': self.prompt_tokens,
+            'completion_tokens': self.completion_tokens,
+            'cache_hit_tokens': self.cache_hit_tokens,
+            'cache_miss_tokens': self.prompt_tokens - self.cache_hit_tokens,
+            'cache_write_tokens': self.cache_write_tokens,
+            'cache_hit_rate': self.cache_hit_tokens / self.prompt_tokens if self.prompt_tokens else 0.0,
+        }
+
+
 class RuntimeLLMModel:
     """运行时模型"""
 
@@ -23,15 +73,39 @@ class RuntimeLLMModel:
     requester: LLMAPIRequester
     """请求器实例"""
 
+    usage_stats: UsageStats
+    """token 用量统计，含提示词缓存命中情况"""
+
+    latency: metrics.Histogram
+    """成功请求的耗时分布（秒），对冲请求据此决定何时请求备用模型"""
+
+    limiter: model_limiter.ModelLimiter
+    """并发与速率限制器"""
+
+    retry_stats: retry.RetryStats
+    """暂时性错误的重试统计"""
+
     def __init__(
         self,
         model_entity: persistence_model.LLMModel,
         token_mgr: token.TokenManager,
         requester: LLMAPIRequester,
+        limiter: model_limiter.ModelLimiter = None,
     ):
         self.model_entity = model_entity
         self.token_mgr = token_mgr
         self.requester = requester
+        self.usage_stats = UsageStats()
+        self.latency = metrics.Histogram()
+        self.limiter = limiter if limiter is not None else model_limiter.ModelLimiter()
+        self.retry_stats = retry.RetryStats()
+
+    def record_usage(self, usage: llm_entities.Usage | None):
+        """记录一次请求的 token 用量"""
+        self.usage_stats.record(usage)
+
+        if usage is not None:
+            self.limiter.record_tokens(usage.prompt_tokens + usage.completion_tokens)
 
 
 class LLMAPIRequester(metaclass=abc.ABCMeta):
@@ -53,6 +127,210 @@ class LLMAPIRequester(metaclass=abc.ABCMeta):
     async def initialize(self):
         pass
 
+    @property
+    def prompt_cache_enabled(self) -> bool:
+        """是否启用提示词缓存支持"""
+        return bool(self.requester_cfg.get('prompt_cache', False))
+
+    def _should_switch_token(
+        self,
+        model: RuntimeLLMModel,
+        api_key: str,
+        e: Exception,
+        tried: set[str],
+        deadline: float,
+    ) -> bool:
+        """记录请求失败，判断是否应重试
+
+        key 被限流或无效时换一个 key 重试；所有 key 都被限流时，在 deadline 前排队等待最早恢复的 key。
+        """
+        status_code = getattr(e, 'status_code', None)
+        response = getattr(e, 'response', None)
+        headers = getattr(response, 'headers', None)
+
+        if not model.token_mgr.report_error(api_key, status_code, headers):
+            return False
+
+        tried.add(api_key)
+
+        if model.token_mgr.has_available(exclude=tried):
+            self.ap.logger.warning(
+                f'模型 {model.model_entity.name} 的 key {token.mask_token(api_key)} 请求失败（{status_code}），换一个 key 重试'
+            )
+            return True
+
+        if status_code != 429:
+            return False
+
+        delay = model.token_mgr.get_available_delay()
+
+        if time.monotonic() + delay > deadline:
+            return False
+
+        self.ap.logger.warning(f'模型 {model.model_entity.name} 的 key 均被限流，排队 {delay:.1f} 秒后重试')
+
+        model.limiter.on_rate_limited(pause=delay)
+        tried.clear()
+
+        return True
+
+    def _get_retry_delay(
+        self,
+        query: core_entities.Query | None,
+        e: Exception,
+        attempt: int,
+    ) -> float | None:
+        """第 attempt 次请求失败后，若应重试则返回退避时间，否则返回 None"""
+        policy: retry.RetryPolicy = self.ap.model_mgr.retry_policy
+
+        if attempt >= policy.max_attempts or not policy.is_retryable(e):
+            return None
+
+        delay = policy.get_delay(attempt)
+
+        # 不超过请求的有效期
+        if query is not None and query.deadline is not None and time.monotonic() + delay >= query.deadline:
+            return None
+
+        return delay
+
+    async def _invoke_with_token(
+        self,
+        model: RuntimeLLMModel,
+        call: typing.Callable[[str], typing.Awaitable[typing.Any]],
+        query: core_entities.Query | None = None,
+    ) -> typing.Any:
+        """在模型的并发与速率限制内选择 key 并发送请求
+
+        key 被限流或无效时换一个 key 重试，遇到暂时性错误时按重试策略退避后重试。
+
+        Args:
+            model (RuntimeLLMModel): 使用的模型
+            call (typing.Callable[[str], typing.Awaitable[typing.Any]]): 以 key 发送请求的函数
+            query (core_entities.Query, optional): 所属请求，重试不超过其有效期. Defaults to None.
+        """
+        tried: set[str] = set()
+        deadline = time.monotonic() + model_limiter.MAX_QUEUE_TIME
+        retries = 0
+
+        while True:
+            async with model.limiter:
+                api_key = model.token_mgr.acquire(exclude=tried)
+
+                try:
+                    result = await call(api_key)
+
+                    model.limiter.on_success()
+
+                    if retries:
+                        model.retry_stats.recovered_count += 1
+
+                    return result
+                except Exception as e:
+                    if self._should_switch_token(model, api_key, e, tried, deadline):
+                        continue
+
+                    delay = self._get_retry_delay(query, e, retries + 1)
+
+                    if delay is None:
+                        if retries:
+                            model.retry_stats.exhausted_count += 1
+                        raise
+
+                    retries += 1
+                    model.retry_stats.record_retry(e)
+
+                    self.ap.logger.warning(
+                        f'模型 {model.model_entity.name} 请求失败（{retry.get_error_reason(e)}），'
+                        f'{delay:.2f} 秒后第 {retries} 次重试'
+                    )
+                finally:
+                    model.token_mgr.release(api_key)
+
+            # 退避期间不占用模型的并发名额
+            await asyncio.sleep(delay)
+
+    async def _invoke_stream_with_token(
+        self,
+        model: RuntimeLLMModel,
+        call: typing.Callable[[str], typing.AsyncIterator[typing.Any]],
+        query: core_entities.Query | None = None,
+    ) -> typing.AsyncGenerator[typing.Any, None]:
+        """同 _invoke_with_token，用于流式请求；已经产生内容后失败则不再重试"""
+        tried: set[str] = set()
+        deadline = time.monotonic() + model_limiter.MAX_QUEUE_TIME
+        retries = 0
+
+        while True:
+            async with model.limiter:
+                api_key = model.token_mgr.acquire(exclude=tried)
+                yielded = False
+
+                try:
+                    async for item in call(api_key):
+                        yielded = True
+                        yield item
+
+                    model.limiter.on_success()
+
+                    if retries:
+                        model.retry_stats.recovered_count += 1
+
+                    return
+                except Exception as e:
+                    if yielded:
+                        raise
+
+                    if self._should_switch_token(model, api_key, e, tried, deadline):
+                        continue
+
+                    delay = self._get_retry_delay(query, e, retries + 1)
+
+                    if delay is None:
+                        if retries:
+                            model.retry_stats.exhausted_count += 1
+                        raise
+
+                    retries += 1
+                    model.retry_stats.record_retry(e)
+
+                    self.ap.logger.warning(
+                        f'模型 {model.model_entity.name} 请求失败（{retry.get_error_reason(e)}），'
+                        f'{delay:.2f} 秒后第 {retries} 次重试'
+                    )
+                finally:
+                    model.token_mgr.release(api_key)
+
+            await asyncio.sleep(delay)
+
+    async def _serialize_message(self, message: llm_entities.Message) -> dict[str, typing.Any]:
+        """把消息转换为请求中的格式
+
+        返回值会缓存在消息上，之后的请求直接复用，调用方不能原地修改。
+        """
+        return message.dict(exclude_none=True)
+
+    async def serialize_messages(self, messages: typing.Iterable[llm_entities.Message]) -> list[dict[str, typing.Any]]:
+        """转换消息列表
+
+        每条消息只在第一次时转换，按转换方法（即请求格式）缓存，前文在之后的请求中不再重复转换。
+        """
+        key = type(self)._serialize_message
+
+        req_messages = []
+
+        for message in messages:
+            cache = message._serialized
+            msg_dict = cache.get(key)
+
+            if msg_dict is None:
+                msg_dict = await self._serialize_message(message)
+                cache[key] = msg_dict
+
+            req_messages.append(msg_dict)
+
+        return req_messages
+
     @abc.abstractmethod
     async def invoke_llm(
         self,
@@ -74,3 +352,21 @@ class LLMAPIRequester(metaclass=abc.ABCMeta):
             llm_entities.Message: 返回消息对象
         """
         pass
+
+    async def invoke_llm_stream(
+        self,
+        query: core_entities.Query,
+        model: RuntimeLLMModel,
+        messages: typing.List[llm_entities.Message],
+        funcs: typing.List[tools_entities.LLMFunction] = None,
+        extra_args: dict[str, typing.Any] = {},
+    ) -> typing.AsyncGenerator[llm_entities.MessageChunk | llm_entities.Message, None]:
+        """以流式调用API
+
+        参数同 invoke_llm。先产生若干 MessageChunk（到目前为止累积的回复），最后产生完整的 Message（含工具调用和用量）。
+        不支持流式的请求器直接产生 invoke_llm 的结果。
+
+        Yields:
+            llm_entities.MessageChunk | llm_entities.Message: 部分回复，最后一个为完整的消息对象
+        """
+        yield await self.invoke_llm(query, model, messages, funcs, extra_args=extra_args)
@@ -15,6 +15,10 @@ from ...tools import entities as tools_entities
 from ....utils import image
 
 
+CACHE_CONTROL_EPHEMERAL = {'type': 'ephemeral'}
+"""提示词缓存断点"""
+
+
 class AnthropicMessages(requester.LLMAPIRequester):
     """Anthropic Messages API 请求器"""
 
@@ -43,19 +47,77 @@ class AnthropicMessages(requester.LLMAPIRequester):
 
         self.client = anthropic.AsyncAnthropic(
             api_key='',
+            # 重试由 retry 模块统一处理
+            max_retries=0,
             http_client=httpx_client,
         )
 
-    async def invoke_llm(
+    def _with_cache_control(self, msg_dict: dict[str, typing.Any]) -> dict[str, typing.Any]:
+        """在消息的最后一个内容块上设置缓存断点，返回新的 dict，不修改缓存的消息"""
+        content = msg_dict.get('content')
+
+        if isinstance(content, str) and content.strip() != '':
+            content = [{'type': 'text', 'text': content}]
+
+        if not isinstance(content, list) or not content:
+            return msg_dict
+
+        return {**msg_dict, 'content': [*content[:-1], {**content[-1], 'cache_control': CACHE_CONTROL_EPHEMERAL}]}
+
+    async def _serialize_message(self, message: llm_entities.Message) -> dict[str, typing.Any]:
+        if message.role == 'tool':
+            return {
+                'role': 'user',
+                'content': [
+                    {
+                        'type': 'tool_result',
+                        'tool_use_id': message.tool_call_id,
+                        'content': message.content,
+                    }
+                ],
+            }
+
+        msg_dict = message.dict(exclude_none=True)
+
+        if isinstance(message.content, str) and message.content.strip() != '':
+            msg_dict['content'] = [{'type': 'text', 'text': message.content}]
+        elif isinstance(message.content, list):
+            for i, ce in enumerate(message.content):
+                if ce.type == 'image_base64':
+                    image_b64, image_format = await image.extract_b64_and_format(ce.image_base64)
+
+                    alter_image_ele = {
+                        'type': 'image',
+                        'source': {
+                            'type': 'base64',
+                            'media_type': f'image/{image_format}',
+                            'data': image_b64,
+                        },
+                    }
+                    msg_dict['content'][i] = alter_image_ele
+
+        if message.tool_calls:
+            for tool_call in message.tool_calls:
+                msg_dict['content'].append(
+                    {
+                        'type': 'tool_use',
+                        'id': tool_call.id,
+                        'name': tool_call.function.name,
+                        'input': json.loads(tool_call.function.arguments),
+                    }
+                )
+
+            del msg_dict['tool_calls']
+
+        return msg_dict
+
+    async def _make_args(
         self,
-        query: core_entities.Query,
         model: requester.RuntimeLLMModel,
         messages: typing.List[llm_entities.Message],
         funcs: typing.List[tools_entities.LLMFunction] = None,
         extra_args: dict[str, typing.Any] = {},
-    ) -> llm_entities.Message:
-        self.client.api_key = model.token_mgr.get_token()
-
+    ) -> dict[str, typing.Any]:
         args = extra_args.copy()
         args['model'] = model.model_entity.name
 
@@ -64,109 +126,144 @@ class AnthropicMessages(requester.LLMAPIRequester):
         # system
         system_role_message = None
 
-        for i, m in enumerate(messages):
+        for m in messages:
             if m.role == 'system':
                 system_role_message = m
 
                 break
 
-        if system_role_message:
-            messages.pop(i)
-
         if isinstance(system_role_message, llm_entities.Message) and isinstance(system_role_message.content, str):
-            args['system'] = system_role_message.content
+            if self.prompt_cache_enabled:
+                args['system'] = [
+                    {'type': 'text', 'text': system_role_message.content, 'cache_control': CACHE_CONTROL_EPHEMERAL}
+                ]
+            else:
+                args['system'] = system_role_message.content
 
-        req_messages = []
+        # 不修改传入的列表，后续的工具调用请求还会使用
+        req_messages = await self.serialize_messages(m for m in messages if m is not system_role_message)
 
-        for m in messages:
-            if m.role == 'tool':
-                tool_call_id = m.tool_call_id
-
-                req_messages.append(
-                    {
-                        'role': 'user',
-                        'content': [
-                            {
-                                'type': 'tool_result',
-                                'tool_use_id': tool_call_id,
-                                'content': m.content,
-                            }
-                        ],
-                    }
-                )
-
-                continue
-
-            msg_dict = m.dict(exclude_none=True)
-
-            if isinstance(m.content, str) and m.content.strip() != '':
-                msg_dict['content'] = [{'type': 'text', 'text': m.content}]
-            elif isinstance(m.content, list):
-                for i, ce in enumerate(m.content):
-                    if ce.type == 'image_base64':
-                        image_b64, image_format = await image.extract_b64_and_format(ce.image_base64)
-
-                        alter_image_ele = {
-                            'type': 'image',
-                            'source': {
-                                'type': 'base64',
-                                'media_type': f'image/{image_format}',
-                                'data': image_b64,
-                            },
-                        }
-                        msg_dict['content'][i] = alter_image_ele
-
-            if m.tool_calls:
-                for tool_call in m.tool_calls:
-                    msg_dict['content'].append(
-                        {
-                            'type': 'tool_use',
-                            'id': tool_call.id,
-                            'name': tool_call.function.name,
-                            'input': json.loads(tool_call.function.arguments),
-                        }
-                    )
-
-                del msg_dict['tool_calls']
-
-            req_messages.append(msg_dict)
+        if self.prompt_cache_enabled and req_messages:
+            # 断点设在最后一条消息上，下一次请求时到此为止的前文都能从缓存读取
+            req_messages[-1] = self._with_cache_control(req_messages[-1])
 
         args['messages'] = req_messages
 
         if funcs:
-            tools = await self.ap.tool_mgr.generate_tools_for_anthropic(funcs)
+            tools = await self.ap.tool_mgr.generate_tools_for_anthropic(funcs, stable=self.prompt_cache_enabled)
 
             if tools:
+                if self.prompt_cache_enabled:
+                    tools[-1] = {**tools[-1], 'cache_control': CACHE_CONTROL_EPHEMERAL}
+
                 args['tools'] = tools
 
+        return args
+
+    def _make_msg(self, resp: anthropic.types.message.Message) -> llm_entities.Message:
+        args = {
+            'content': '',
+            'role': resp.role,
+        }
+
+        assert isinstance(resp, anthropic.types.message.Message)
+
+        for block in resp.content:
+            if block.type == 'thinking':
+                args['content'] = '<think>' + block.thinking + '</think>\n' + args['content']
+            elif block.type == 'text':
+                args['content'] += block.text
+            elif block.type == 'tool_use':
+                assert isinstance(block, anthropic.types.tool_use_block.ToolUseBlock)
+                tool_call = llm_entities.ToolCall(
+                    id=block.id,
+                    type='function',
+                    function=llm_entities.FunctionCall(name=block.name, arguments=json.dumps(block.input)),
+                )
+                if 'tool_calls' not in args:
+                    args['tool_calls'] = []
+                args['tool_calls'].append(tool_call)
+
+        message = llm_entities.Message(**args)
+        message.usage = llm_entities.Usage.from_anthropic(resp.usage)
+
+        return message
+
+    async def invoke_llm(
+        self,
+        query: core_entities.Query,
+        model: requester.RuntimeLLMModel,
+        messages: typing.List[llm_entities.Message],
+        funcs: typing.List[tools_entities.LLMFunction] = None,
+        extra_args: dict[str, typing.Any] = {},
+    ) -> llm_entities.Message:
+        args = await self._make_args(model, messages, funcs, extra_args)
+
+        async def call(api_key: str) -> anthropic.types.message.Message:
+            # 客户端是共享的，key 只在本次请求中使用
+            raw = await self.client.with_options(api_key=api_key).messages.with_raw_response.create(**args)
+
+            model.token_mgr.observe(api_key, raw.headers)
+
+            return raw.parse()
+
         try:
-            # print(json.dumps(args, indent=4, ensure_ascii=False))
-            resp = await self.client.messages.create(**args)
+            resp = await self._invoke_with_token(model, call, query=query)
 
-            args = {
-                'content': '',
-                'role': resp.role,
-            }
+            message = self._make_msg(resp)
+
+            model.record_usage(message.usage)
+
+            return message
+        except anthropic.AuthenticationError as e:
+            raise errors.RequesterError(f'api-key 无效: {e.message}')
+        except anthropic.BadRequestError as e:
+            raise errors.RequesterError(str(e.message))
+        except anthropic.NotFoundError as e:
+            if 'model: ' in str(e):
+                raise errors.RequesterError(f'模型无效: {e.message}')
+            else:
+                raise errors.RequesterError(f'请求地址无效: {e.message}')
+
+    async def invoke_llm_stream(
+        self,
+        query: core_entities.Query,
+        model: requester.RuntimeLLMModel,
+        messages: typing.List[llm_entities.Message],
+        funcs: typing.List[tools_entities.LLMFunction] = None,
+        extra_args: dict[str, typing.Any] = {},
+    ) -> typing.AsyncGenerator[llm_entities.MessageChunk | llm_entities.Message, None]:
+        args = await self._make_args(model, messages, funcs, extra_args)
+
+        async def call(api_key: str) -> typing.AsyncGenerator[llm_entities.MessageChunk | llm_entities.Message, None]:
+            thinking = ''
+            text = ''
+
+            async with self.client.with_options(api_key=api_key).messages.stream(**args) as stream:
+                model.token_mgr.observe(api_key, stream.response.headers)
+
+                async for event in stream:
+                    if event.type == 'thinking':
+                        thinking += event.thinking
+                    elif event.type == 'text':
+                        text += event.text
+                    else:
+                        continue
+
+                    content = '<think>' + thinking + '</think>\n' + text if thinking else text
+
+                    yield llm_entities.MessageChunk(content=content)
+
+                resp = await stream.get_final_message()
+
+            yield self._make_msg(resp)
+
+        try:
+            async for message in self._invoke_stream_with_token(model, call, query=query):
+                if not isinstance(message, llm_entities.MessageChunk):
+                    model.record_usage(message.usage)
 
-            assert type(resp) is anthropic.types.message.Message
-
-            for block in resp.content:
-                if block.type == 'thinking':
-                    args['content'] = '<think>' + block.thinking + '</think>\n' + args['content']
-                elif block.type == 'text':
-                    args['content'] += block.text
-                elif block.type == 'tool_use':
-                    assert type(block) is anthropic.types.tool_use_block.ToolUseBlock
-                    tool_call = llm_entities.ToolCall(
-                        id=block.id,
-                        type='function',
-                        function=llm_entities.FunctionCall(name=block.name, arguments=json.dumps(block.input)),
-                    )
-                    if 'tool_calls' not in args:
-                        args['tool_calls'] = []
-                    args['tool_calls'].append(tool_call)
-
-            return llm_entities.Message(**args)
+                yield message
         except anthropic.AuthenticationError as e:
             raise errors.RequesterError(f'api-key 无效: {e.message}')
         except anthropic.BadRequestError as e:
@@ -5,19 +5,110 @@ import typing
 
 import openai
 import openai.types.chat.chat_completion as chat_completion
-import httpx
+import openai.types.chat.chat_completion_chunk as chat_completion_chunk
 
 from .. import errors, requester
 from ....core import entities as core_entities
+from ....utils import httpclient
 from ... import entities as llm_entities
 from ...tools import entities as tools_entities
 
 
+class ChatCompletionStream:
+    """累积 ChatCompletion 流式返回的增量"""
+
+    content_parts: list[str]
+
+    reasoning_parts: list[str]
+
+    tool_calls: dict[int, dict[str, str]]
+    """下标 -> 工具调用，参数分多个增量返回"""
+
+    usage: typing.Any
+
+    def __init__(self):
+        self.content_parts = []
+        self.reasoning_parts = []
+        self.tool_calls = {}
+        self.usage = None
+
+    def feed(self, chunk: chat_completion_chunk.ChatCompletionChunk) -> bool:
+        """处理一个增量，返回回复文本是否有变化"""
+        if getattr(chunk, 'usage', None) is not None:
+            self.usage = chunk.usage
+
+        if not chunk.choices or chunk.choices[0].delta is None:
+            return False
+
+        delta = chunk.choices[0].delta
+        changed = False
+
+        # deepseek的reasoner模型
+        reasoning_content = getattr(delta, 'reasoning_content', None)
+        if reasoning_content:
+            self.reasoning_parts.append(reasoning_content)
+            changed = True
+
+        if delta.content:
+            self.content_parts.append(delta.content)
+            changed = True
+
+        for tool_call in delta.tool_calls or []:
+            pending = self.tool_calls.setdefault(tool_call.index, {'id': '', 'name': '', 'arguments': ''})
+
+            if tool_call.id:
+                pending['id'] = tool_call.id
+
+            if tool_call.function is not None:
+                if tool_call.function.name:
+                    pending['name'] = tool_call.function.name
+                if tool_call.function.arguments:
+                    pending['arguments'] += tool_call.function.arguments
+
+        return changed
+
+    @property
+    def content(self) -> str:
+        content = ''.join(self.content_parts)
+
+        if self.reasoning_parts:
+            content = '<think>\n' + ''.join(self.reasoning_parts) + '\n</think>\n' + content
+
+        return content
+
+    def make_chunk(self) -> llm_entities.MessageChunk:
+        return llm_entities.MessageChunk(content=self.content)
+
+    def make_msg(self) -> llm_entities.Message:
+        tool_calls = [
+            llm_entities.ToolCall(
+                id=tc['id'],
+                type='function',
+                function=llm_entities.FunctionCall(name=tc['name'], arguments=tc['arguments']),
+            )
+            for _, tc in sorted(self.tool_calls.items())
+        ]
+
+        content = self.content
+
+        message = llm_entities.Message(
+            role='assistant',
+            content=content if content or not tool_calls else None,
+            tool_calls=tool_calls or None,
+        )
+        message.usage = llm_entities.Usage.from_openai(self.usage)
+
+        return message
+
+
 class OpenAIChatCompletions(requester.LLMAPIRequester):
     """OpenAI ChatCompletion API 请求器"""
 
     client: openai.AsyncClient
 
+    stream_usage_supported: bool = True
+    """接口是否接受 stream_options，不接受时流式回复不带用量"""
+
     default_config: dict[str, typing.Any] = {
         'base_url': 'https://api.openai.com/v1',
         'timeout': 120,
@@ -28,15 +119,56 @@ class OpenAIChatCompletions(requester.LLMAPIRequester):
             api_key='',
             base_url=self.requester_cfg['base_url'].replace(' ', ''),
             timeout=self.requester_cfg['timeout'],
-            http_client=httpx.AsyncClient(trust_env=True, timeout=self.requester_cfg['timeout']),
+            # 重试由 retry 模块统一处理
+            max_retries=0,
+            http_client=httpclient.get_httpx_client(),
         )
 
     async def _req(
         self,
         args: dict,
         extra_body: dict = {},
+        use_model: requester.RuntimeLLMModel = None,
+        api_key: str = '',
     ) -> chat_completion.ChatCompletion:
-        return await self.client.chat.completions.create(**args, extra_body=extra_body)
+        # 客户端是共享的，key 只在本次请求中使用
+        raw = await self.client.with_options(api_key=api_key).chat.completions.with_raw_response.create(
+            **args, extra_body=extra_body
+        )
+
+        if use_model is not None:
+            use_model.token_mgr.observe(api_key, raw.headers)
+
+        return raw.parse()
+
+    async def _req_stream(
+        self,
+        args: dict,
+        extra_body: dict = {},
+        use_model: requester.RuntimeLLMModel = None,
+        api_key: str = '',
+    ) -> openai.AsyncStream[chat_completion_chunk.ChatCompletionChunk]:
+        completions = self.client.with_options(api_key=api_key).chat.completions
+
+        if self.stream_usage_supported:
+            try:
+                raw = await completions.with_raw_response.create(
+                    **args,
+                    stream=True,
+                    stream_options={'include_usage': True},
+                    extra_body=extra_body,
+                )
+            except openai.BadRequestError:
+                # 部分兼容接口不接受 stream_options，去掉后重试一次，成功则之后不再发送
+                raw = await completions.with_raw_response.create(**args, stream=True, extra_body=extra_body)
+                self.stream_usage_supported = False
+        else:
+            raw = await completions.with_raw_response.create(**args, stream=True, extra_body=extra_body)
+
+        if use_model is not None:
+            use_model.token_mgr.observe(api_key, raw.headers)
+
+        return raw.parse()
 
     async def _make_msg(
         self,
@@ -55,9 +187,27 @@ class OpenAIChatCompletions(requester.LLMAPIRequester):
             chatcmpl_message['content'] = '<think>\n' + reasoning_content + '\n</think>\n' + chatcmpl_message['content']
 
         message = llm_entities.Message(**chatcmpl_message)
+        message.usage = llm_entities.Usage.from_openai(chat_completion.usage)
 
         return message
 
+    async def _serialize_message(self, message: llm_entities.Message) -> dict[str, typing.Any]:
+        msg_dict = message.dict(exclude_none=True)
+        content = msg_dict.get('content')
+        if isinstance(content, list):
+            # 检查 content 列表中是否每个部分都是文本
+            if all(isinstance(part, dict) and part.get('type') == 'text' for part in content):
+                # 将所有文本部分合并为一个字符串
+                msg_dict['content'] = '\n'.join(part['text'] for part in content)
+            else:
+                # 检查vision
+                for me in content:
+                    if me['type'] == 'image_base64':
+                        me['image_url'] = {'url': me['image_base64']}
+                        me['type'] = 'image_url'
+                        del me['image_base64']
+        return msg_dict
+
     async def _closure(
         self,
         query: core_entities.Query,
@@ -65,40 +215,59 @@ class OpenAIChatCompletions(requester.LLMAPIRequester):
         use_model: requester.RuntimeLLMModel,
         use_funcs: list[tools_entities.LLMFunction] = None,
         extra_args: dict[str, typing.Any] = {},
+        api_key: str = '',
     ) -> llm_entities.Message:
-        self.client.api_key = use_model.token_mgr.get_token()
 
         args = {}
         args['model'] = use_model.model_entity.name
 
         if use_funcs:
-            tools = await self.ap.tool_mgr.generate_tools_for_openai(use_funcs)
+            tools = await self.ap.tool_mgr.generate_tools_for_openai(use_funcs, stable=self.prompt_cache_enabled)
 
             if tools:
                 args['tools'] = tools
 
-        # 设置此次请求中的messages
-        messages = req_messages.copy()
-
-        # 检查vision
-        for msg in messages:
-            if 'content' in msg and isinstance(msg['content'], list):
-                for me in msg['content']:
-                    if me['type'] == 'image_base64':
-                        me['image_url'] = {'url': me['image_base64']}
-                        me['type'] = 'image_url'
-                        del me['image_base64']
-
-        args['messages'] = messages
+        # 设置此次请求中的messages，其中的消息是缓存的，不能原地修改
+        args['messages'] = req_messages
 
         # 发送请求
-        resp = await self._req(args, extra_body=extra_args)
+        resp = await self._req(args, extra_body=extra_args, use_model=use_model, api_key=api_key)
 
         # 处理请求结果
         message = await self._make_msg(resp)
 
         return message
 
+    async def _closure_stream(
+        self,
+        query: core_entities.Query,
+        req_messages: list[dict],
+        use_model: requester.RuntimeLLMModel,
+        use_funcs: list[tools_entities.LLMFunction] = None,
+        extra_args: dict[str, typing.Any] = {},
+        api_key: str = '',
+    ) -> typing.AsyncGenerator[llm_entities.MessageChunk | llm_entities.Message, None]:
+
+        args = {}
+        args['model'] = use_model.model_entity.name
+
+        if use_funcs:
+            tools = await self.ap.tool_mgr.generate_tools_for_openai(use_funcs, stable=self.prompt_cache_enabled)
+
+            if tools:
+                args['tools'] = tools
+
+        # 设置此次请求中的messages，其中的消息是缓存的，不能原地修改
+        args['messages'] = req_messages
+
+        stream = ChatCompletionStream()
+
+        async for chunk in await self._req_stream(args, extra_body=extra_args, use_model=use_model, api_key=api_key):
+            if stream.feed(chunk):
+                yield stream.make_chunk()
+
+        yield stream.make_msg()
+
     async def invoke_llm(
         self,
         query: core_entities.Query,
@@ -107,25 +276,69 @@ class OpenAIChatCompletions(requester.LLMAPIRequester):
         funcs: typing.List[tools_entities.LLMFunction] = None,
         extra_args: dict[str, typing.Any] = {},
     ) -> llm_entities.Message:
-        req_messages = []  # req_messages 仅用于类内，外部同步由 query.messages 进行
-        for m in messages:
-            msg_dict = m.dict(exclude_none=True)
-            content = msg_dict.get('content')
-            if isinstance(content, list):
-                # 检查 content 列表中是否每个部分都是文本
-                if all(isinstance(part, dict) and part.get('type') == 'text' for part in content):
-                    # 将所有文本部分合并为一个字符串
-                    msg_dict['content'] = '\n'.join(part['text'] for part in content)
-            req_messages.append(msg_dict)
+        # req_messages 仅用于类内，外部同步由 query.messages 进行
+        req_messages = await self.serialize_messages(messages)
 
         try:
-            return await self._closure(
+            message = await self._invoke_with_token(
+                model,
+                lambda api_key: self._closure(
+                    query=query,
+                    req_messages=req_messages,
+                    use_model=model,
+                    use_funcs=funcs,
+                    extra_args=extra_args,
+                    api_key=api_key,
+                ),
                 query=query,
-                req_messages=req_messages,
-                use_model=model,
-                use_funcs=funcs,
-                extra_args=extra_args,
             )
+
+            model.record_usage(message.usage)
+
+            return message
+        except asyncio.TimeoutError:
+            raise errors.RequesterError('请求超时')
+        except openai.BadRequestError as e:
+            if 'context_length_exceeded' in e.message:
+                raise errors.RequesterError(f'上文过长，请重置会话: {e.message}')
+            else:
+                raise errors.RequesterError(f'请求参数错误: {e.message}')
+        except openai.AuthenticationError as e:
+            raise errors.RequesterError(f'无效的 api-key: {e.message}')
+        except openai.NotFoundError as e:
+            raise errors.RequesterError(f'请求路径错误: {e.message}')
+        except openai.RateLimitError as e:
+            raise errors.RequesterError(f'请求过于频繁或余额不足: {e.message}')
+        except openai.APIError as e:
+            raise errors.RequesterError(f'请求错误: {e.message}')
+
+    async def invoke_llm_stream(
+        self,
+        query: core_entities.Query,
+        model: requester.RuntimeLLMModel,
+        messages: typing.List[llm_entities.Message],
+        funcs: typing.List[tools_entities.LLMFunction] = None,
+        extra_args: dict[str, typing.Any] = {},
+    ) -> typing.AsyncGenerator[llm_entities.MessageChunk | llm_entities.Message, None]:
+        req_messages = await self.serialize_messages(messages)
+
+        try:
+            async for message in self._invoke_stream_with_token(
+                model,
+                lambda api_key: self._closure_stream(
+                    query=query,
+                    req_messages=req_messages,
+                    use_model=model,
+                    use_funcs=funcs,
+                    extra_args=extra_args,
+                    api_key=api_key,
+                ),
+                query=query,
+            ):
+                if not isinstance(message, llm_entities.MessageChunk):
+                    model.record_usage(message.usage)
+
+                yield message
         except asyncio.TimeoutError:
             raise errors.RequesterError('请求超时')
         except openai.BadRequestError as e:
@@ -18,6 +18,15 @@ class GiteeAIChatCompletions(chatcmpl.OpenAIChatCompletions):
         'timeout': 120,
     }
 
+    async def _serialize_message(self, message: llm_entities.Message) -> dict[str, typing.Any]:
+        msg_dict = await super()._serialize_message(message)
+
+        # gitee 不支持多模态，把content都转换成纯文字
+        if 'content' in msg_dict and isinstance(msg_dict['content'], list):
+            msg_dict['content'] = ' '.join([c['text'] for c in msg_dict['content'] if c['type'] == 'text'])
+
+        return msg_dict
+
     async def _closure(
         self,
         query: core_entities.Query,
@@ -25,26 +34,21 @@ class GiteeAIChatCompletions(chatcmpl.OpenAIChatCompletions):
         use_model: requester.RuntimeLLMModel,
         use_funcs: list[tools_entities.LLMFunction] = None,
         extra_args: dict[str, typing.Any] = {},
+        api_key: str = '',
     ) -> llm_entities.Message:
-        self.client.api_key = use_model.token_mgr.get_token()
 
         args = {}
         args['model'] = use_model.model_entity.name
 
         if use_funcs:
-            tools = await self.ap.tool_mgr.generate_tools_for_openai(use_funcs)
+            tools = await self.ap.tool_mgr.generate_tools_for_openai(use_funcs, stable=self.prompt_cache_enabled)
 
             if tools:
                 args['tools'] = tools
 
-        # gitee 不支持多模态，把content都转换成纯文字
-        for m in req_messages:
-            if 'content' in m and isinstance(m['content'], list):
-                m['content'] = ' '.join([c['text'] for c in m['content']])
-
         args['messages'] = req_messages
 
-        resp = await self._req(args, extra_body=extra_args)
+        resp = await self._req(args, extra_body=extra_args, use_model=use_model, api_key=api_key)
 
         message = await self._make_msg(resp)
 
@@ -6,10 +6,10 @@ import typing
 import openai
 import openai.types.chat.chat_completion as chat_completion
 import openai.types.chat.chat_completion_message_tool_call as chat_completion_message_tool_call
-import httpx
 
 from .. import entities, errors, requester
 from ....core import entities as core_entities
+from ....utils import httpclient
 from ... import entities as llm_entities
 from ...tools import entities as tools_entities
 
@@ -29,13 +29,17 @@ class ModelScopeChatCompletions(requester.LLMAPIRequester):
             api_key='',
             base_url=self.requester_cfg['base_url'],
             timeout=self.requester_cfg['timeout'],
-            http_client=httpx.AsyncClient(trust_env=True, timeout=self.requester_cfg['timeout']),
+            # 重试由 retry 模块统一处理
+            max_retries=0,
+            http_client=httpclient.get_httpx_client(),
         )
 
     async def _req(
         self,
         args: dict,
         extra_body: dict = {},
+        use_model: requester.RuntimeLLMModel = None,
+        api_key: str = '',
     ) -> chat_completion.ChatCompletion:
         args['stream'] = True
 
@@ -45,7 +49,15 @@ class ModelScopeChatCompletions(requester.LLMAPIRequester):
 
         tool_calls = []
 
-        resp_gen: openai.AsyncStream = await self.client.chat.completions.create(**args, extra_body=extra_body)
+        # 客户端是共享的，key 只在本次请求中使用
+        raw = await self.client.with_options(api_key=api_key).chat.completions.with_raw_response.create(
+            **args, extra_body=extra_body
+        )
+
+        if use_model is not None:
+            use_model.token_mgr.observe(api_key, raw.headers)
+
+        resp_gen: openai.AsyncStream = raw.parse()
 
         async for chunk in resp_gen:
             # print(chunk)
@@ -120,9 +132,27 @@ class ModelScopeChatCompletions(requester.LLMAPIRequester):
             chatcmpl_message['role'] = 'assistant'
 
         message = llm_entities.Message(**chatcmpl_message)
+        message.usage = llm_entities.Usage.from_openai(chat_completion.usage)
 
         return message
 
+    async def _serialize_message(self, message: llm_entities.Message) -> dict[str, typing.Any]:
+        msg_dict = message.dict(exclude_none=True)
+        content = msg_dict.get('content')
+        if isinstance(content, list):
+            # 检查 content 列表中是否每个部分都是文本
+            if all(isinstance(part, dict) and part.get('type') == 'text' for part in content):
+                # 将所有文本部分合并为一个字符串
+                msg_dict['content'] = '\n'.join(part['text'] for part in content)
+            else:
+                # 检查vision
+                for me in content:
+                    if me['type'] == 'image_base64':
+                        me['image_url'] = {'url': me['image_base64']}
+                        me['type'] = 'image_url'
+                        del me['image_base64']
+        return msg_dict
+
     async def _closure(
         self,
         query: core_entities.Query,
@@ -130,34 +160,23 @@ class ModelScopeChatCompletions(requester.LLMAPIRequester):
         use_model: requester.RuntimeLLMModel,
         use_funcs: list[tools_entities.LLMFunction] = None,
         extra_args: dict[str, typing.Any] = {},
+        api_key: str = '',
     ) -> llm_entities.Message:
-        self.client.api_key = use_model.token_mgr.get_token()
 
         args = {}
         args['model'] = use_model.model_entity.name
 
         if use_funcs:
-            tools = await self.ap.tool_mgr.generate_tools_for_openai(use_funcs)
+            tools = await self.ap.tool_mgr.generate_tools_for_openai(use_funcs, stable=self.prompt_cache_enabled)
 
             if tools:
                 args['tools'] = tools
 
-        # 设置此次请求中的messages
-        messages = req_messages.copy()
-
-        # 检查vision
-        for msg in messages:
-            if 'content' in msg and isinstance(msg['content'], list):
-                for me in msg['content']:
-                    if me['type'] == 'image_base64':
-                        me['image_url'] = {'url': me['image_base64']}
-                        me['type'] = 'image_url'
-                        del me['image_base64']
-
-        args['messages'] = messages
+        # 设置此次请求中的messages，其中的消息是缓存的，不能原地修改
+        args['messages'] = req_messages
 
         # 发送请求
-        resp = await self._req(args, extra_body=extra_args)
+        resp = await self._req(args, extra_body=extra_args, use_model=use_model, api_key=api_key)
 
         # 处理请求结果
         message = await self._make_msg(resp)
@@ -172,21 +191,26 @@ class ModelScopeChatCompletions(requester.LLMAPIRequester):
         funcs: typing.List[tools_entities.LLMFunction] = None,
         extra_args: dict[str, typing.Any] = {},
     ) -> llm_entities.Message:
-        req_messages = []  # req_messages 仅用于类内，外部同步由 query.messages 进行
-        for m in messages:
-            msg_dict = m.dict(exclude_none=True)
-            content = msg_dict.get('content')
-            if isinstance(content, list):
-                # 检查 content 列表中是否每个部分都是文本
-                if all(isinstance(part, dict) and part.get('type') == 'text' for part in content):
-                    # 将所有文本部分合并为一个字符串
-                    msg_dict['content'] = '\n'.join(part['text'] for part in content)
-            req_messages.append(msg_dict)
+        # req_messages 仅用于类内，外部同步由 query.messages 进行
+        req_messages = await self.serialize_messages(messages)
 
         try:
-            return await self._closure(
-                query=query, req_messages=req_messages, use_model=model, use_funcs=funcs, extra_args=extra_args
+            message = await self._invoke_with_token(
+                model,
+                lambda api_key: self._closure(
+                    query=query,
+                    req_messages=req_messages,
+                    use_model=model,
+                    use_funcs=funcs,
+                    extra_args=extra_args,
+                    api_key=api_key,
+                ),
+                query=query,
             )
+
+            model.record_usage(message.usage)
+
+            return message
         except asyncio.TimeoutError:
             raise errors.RequesterError('请求超时')
         except openai.BadRequestError as e:
@@ -37,6 +37,31 @@ class OllamaChatCompletions(requester.LLMAPIRequester):
     ) -> Union[Mapping[str, Any], AsyncIterator[Mapping[str, Any]]]:
         return await self.client.chat(**args)
 
+    async def _req_stream(
+        self,
+        args: dict,
+    ) -> AsyncIterator[ollama.ChatResponse]:
+        return await self.client.chat(**args, stream=True)
+
+    async def _serialize_message(self, message: llm_entities.Message) -> dict[str, typing.Any]:
+        msg_dict: dict = message.dict(exclude_none=True)
+        content: Any = msg_dict.get('content')
+        if isinstance(content, list):
+            text_content: list = []
+            image_urls: list = []
+            for me in content:
+                if me['type'] == 'text':
+                    text_content.append(me['text'])
+                elif me['type'] == 'image_base64':
+                    image_urls.append(me['image_base64'])
+
+            msg_dict['content'] = '\n'.join(text_content)
+            msg_dict['images'] = [url.split(',')[1] for url in image_urls]
+        if 'tool_calls' in msg_dict:  # LangBot 内部以 str 存储 tool_calls 的参数，这里需要转换为 dict
+            for tool_call in msg_dict['tool_calls']:
+                tool_call['function']['arguments'] = json.loads(tool_call['function']['arguments'])
+        return msg_dict
+
     async def _closure(
         self,
         query: core_entities.Query,
@@ -48,23 +73,8 @@ class OllamaChatCompletions(requester.LLMAPIRequester):
         args = extra_args.copy()
         args['model'] = use_model.model_entity.name
 
-        messages: list[dict] = req_messages.copy()
-        for msg in messages:
-            if 'content' in msg and isinstance(msg['content'], list):
-                text_content: list = []
-                image_urls: list = []
-                for me in msg['content']:
-                    if me['type'] == 'text':
-                        text_content.append(me['text'])
-                    elif me['type'] == 'image_base64':
-                        image_urls.append(me['image_base64'])
-
-                msg['content'] = '\n'.join(text_content)
-                msg['images'] = [url.split(',')[1] for url in image_urls]
-            if 'tool_calls' in msg:  # LangBot 内部以 str 存储 tool_calls 的参数，这里需要转换为 dict
-                for tool_call in msg['tool_calls']:
-                    tool_call['function']['arguments'] = json.loads(tool_call['function']['arguments'])
-        args['messages'] = messages
+        # 其中的消息是缓存的，不能原地修改
+        args['messages'] = req_messages
 
         args['tools'] = []
         if use_funcs:
@@ -76,6 +86,52 @@ class OllamaChatCompletions(requester.LLMAPIRequester):
         message: llm_entities.Message = await self._make_msg(resp)
         return message
 
+    async def _closure_stream(
+        self,
+        query: core_entities.Query,
+        req_messages: list[dict],
+        use_model: requester.RuntimeLLMModel,
+        use_funcs: list[tools_entities.LLMFunction] = None,
+        extra_args: dict[str, typing.Any] = {},
+    ) -> typing.AsyncGenerator[llm_entities.MessageChunk | llm_entities.Message, None]:
+        args = extra_args.copy()
+        args['model'] = use_model.model_entity.name
+
+        # 其中的消息是缓存的，不能原地修改
+        args['messages'] = req_messages
+
+        args['tools'] = []
+        if use_funcs:
+            tools = await self.ap.tool_mgr.generate_tools_for_openai(use_funcs)
+            if tools:
+                args['tools'] = tools
+
+        content_parts: list[str] = []
+        tool_calls: list[ollama.Message.ToolCall] = []
+
+        async for chunk in await self._req_stream(args):
+            if chunk.message is None:
+                continue
+
+            if chunk.message.tool_calls:
+                tool_calls.extend(chunk.message.tool_calls)
+
+            if chunk.message.content:
+                content_parts.append(chunk.message.content)
+
+                yield llm_entities.MessageChunk(content=''.join(content_parts))
+
+        # 合并成一次完整的返回，与非流式请求的处理方式保持一致
+        resp = ollama.ChatResponse(
+            message=ollama.Message(
+                role='assistant',
+                content=''.join(content_parts),
+                tool_calls=tool_calls or None,
+            )
+        )
+
+        yield await self._make_msg(resp)
+
     async def _make_msg(self, chat_completions: ollama.ChatResponse) -> llm_entities.Message:
         message: ollama.Message = chat_completions.message
         if message is None:
@@ -111,21 +167,44 @@ class OllamaChatCompletions(requester.LLMAPIRequester):
         funcs: typing.List[tools_entities.LLMFunction] = None,
         extra_args: dict[str, typing.Any] = {},
     ) -> llm_entities.Message:
-        req_messages: list = []
-        for m in messages:
-            msg_dict: dict = m.dict(exclude_none=True)
-            content: Any = msg_dict.get('content')
-            if isinstance(content, list):
-                if all(isinstance(part, dict) and part.get('type') == 'text' for part in content):
-                    msg_dict['content'] = '\n'.join(part['text'] for part in content)
-            req_messages.append(msg_dict)
+        req_messages: list = await self.serialize_messages(messages)
         try:
-            return await self._closure(
+            # 不使用 key，仅用于并发与速率限制
+            return await self._invoke_with_token(
+                model,
+                lambda api_key: self._closure(
+                    query=query,
+                    req_messages=req_messages,
+                    use_model=model,
+                    use_funcs=funcs,
+                    extra_args=extra_args,
+                ),
                 query=query,
-                req_messages=req_messages,
-                use_model=model,
-                use_funcs=funcs,
-                extra_args=extra_args,
             )
         except asyncio.TimeoutError:
             raise errors.RequesterError('请求超时')
+
+    async def invoke_llm_stream(
+        self,
+        query: core_entities.Query,
+        model: requester.RuntimeLLMModel,
+        messages: typing.List[llm_entities.Message],
+        funcs: typing.List[tools_entities.LLMFunction] = None,
+        extra_args: dict[str, typing.Any] = {},
+    ) -> typing.AsyncGenerator[llm_entities.MessageChunk | llm_entities.Message, None]:
+        req_messages: list = await self.serialize_messages(messages)
+        try:
+            async for message in self._invoke_stream_with_token(
+                model,
+                lambda api_key: self._closure_stream(
+                    query=query,
+                    req_messages=req_messages,
+                    use_model=model,
+                    use_funcs=funcs,
+                    extra_args=extra_args,
+                ),
+                query=query,
+            ):
+                yield message
+        except asyncio.TimeoutError:
+            raise errors.RequesterError('请求超时')
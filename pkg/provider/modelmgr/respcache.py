@@ -0,0 +1,247 @@
+"""模型回复缓存
+
+按流水线开启。以模型、提示词、前文和本次消息计算缓存键，相同（或足够相似）的提问直接返回之前的回复，不再请求模型。
+用于群聊中反复被问到的常见问题。
+
+- 模型、提供的工具和前文（含提示词）须完全相同，本次消息先归一化（全半角、大小写、连续空白和末尾的标点）再比较
+- 相似度小于 1 时，前文相同且本次消息的字符二元组 Jaccard 相似度不低于该值的也视为命中
+- 前文或回复中含工具调用、消息中含图片时不使用缓存
+- 每条缓存有有效期，总数超过上限时淘汰最久未使用的
+"""
+
+from __future__ import annotations
+
+import collections
+import hashlib
+import json
+import time
+import typing
+import unicodedata
+
+from .. import entities as llm_entities
+from ..tools import entities as tools_entities
+
+
+def normalize_text(text: str) -> str:
+    """归一化文本：统一全半角与大小写，合并连续空白，去掉控制字符和末尾的标点
+
+    句中的标点可能改变含义（如 "1.5" 与 "15"），保留不动。
+    """
+    text = unicodedata.normalize('NFKC', text).casefold()
+    text = ''.join(c for c in text if c.isspace() or not unicodedata.category(c).startswith('C'))
+    text = ' '.join(text.split())
+
+    end = len(text)
+    while end and (text[end - 1] == ' ' or unicodedata.category(text[end - 1]).startswith('P')):
+        end -= 1
+
+    return text[:end]
+
+
+def get_shingles(text: str) -> frozenset[str]:
+    """字符二元组，用于计算相似度"""
+    if len(text) < 2:
+        return frozenset((text,))
+
+    return frozenset(text[i : i + 2] for i in range(len(text) - 1))
+
+
+def _get_text(message: llm_entities.Message) -> str | None:
+    """消息的纯文本内容，含图片等非文本内容时返回 None"""
+    if message.content is None or isinstance(message.content, str):
+        return message.content or ''
+
+    if any(ce.type != 'text' for ce in message.content):
+        return None
+
+    return '\n'.join(ce.text for ce in message.content)
+
+
+class CacheEntry:
+    """一条缓存的回复"""
+
+    message: llm_entities.Message
+
+    expires_at: float
+
+    shingles: frozenset[str]
+
+    def __init__(self, message: llm_entities.Message, expires_at: float, shingles: frozenset[str]):
+        self.message = message
+        self.expires_at = expires_at
+        self.shingles = shingles
+
+
+class ResponseCache:
+    """模型回复缓存"""
+
+    max_entries: int
+
+    entries: collections.OrderedDict[tuple[str, str], CacheEntry]
+    """(前文哈希, 归一化后的本次消息) -> 缓存，按最近使用排序"""
+
+    contexts: dict[str, set[str]]
+    """前文哈希 -> 该前文下缓存的各条消息，用于查找相似的提问"""
+
+    hit_count: int
+
+    similar_hit_count: int
+    """相似匹配命中的次数，包含在 hit_count 中"""
+
+    miss_count: int
+
+    bypass_count: int
+    """因含工具调用或图片而未使用缓存的次数"""
+
+    eviction_count: int
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max(int(max_entries), 1)
+        self.entries = collections.OrderedDict()
+        self.contexts = {}
+        self.hit_count = 0
+        self.similar_hit_count = 0
+        self.miss_count = 0
+        self.bypass_count = 0
+        self.eviction_count = 0
+
+    def make_key(
+        self,
+        model_uuid: str,
+        messages: list[llm_entities.Message],
+        funcs: list[tools_entities.LLMFunction] | None = None,
+    ) -> tuple[str, str] | None:
+        """计算缓存键，最后一条消息为本次提问；不能使用缓存时返回 None
+
+        Args:
+            model_uuid: 请求的模型
+            messages: 请求的消息
+            funcs: 提供给模型的工具，工具变化后之前缓存的回复不再命中
+        """
+        if not messages or messages[-1].role != 'user':
+            self.bypass_count += 1
+            return None
+
+        context = [model_uuid, sorted(func.name for func in funcs or [])]
+
+        for message in messages:
+            if message.tool_calls or message.role == 'tool':
+                self.bypass_count += 1
+                return None
+
+            text = _get_text(message)
+
+            if text is None:
+                self.bypass_count += 1
+                return None
+
+            context.append(message.role)
+            context.append(text)
+
+        question = normalize_text(context.pop())
+
+        if not question:
+            self.bypass_count += 1
+            return None
+
+        context_hash = hashlib.sha256(json.dumps(context, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+        return context_hash, question
+
+    def _remove(self, key: tuple[str, str]):
+        self.entries.pop(key, None)
+
+        questions = self.contexts.get(key[0])
+
+        if questions is not None:
+            questions.discard(key[1])
+            if not questions:
+                del self.contexts[key[0]]
+
+    def _find_similar(self, key: tuple[str, str], similarity: float, now: float) -> tuple[str, str] | None:
+        context_hash, question = key
+        shingles = get_shingles(question)
+
+        best_key = None
+        best_score = similarity
+
+        for cached_question in list(self.contexts.get(context_hash, ())):
+            cached_key = (context_hash, cached_question)
+            entry = self.entries[cached_key]
+
+            if entry.expires_at <= now:
+                self._remove(cached_key)
+                continue
+
+            score = len(shingles & entry.shingles) / len(shingles | entry.shingles)
+
+            if score >= best_score:
+                best_key = cached_key
+                best_score = score
+
+        return best_key
+
+    def get(self, key: tuple[str, str], similarity: float = 1.0) -> llm_entities.Message | None:
+        """查找缓存的回复
+
+        Args:
+            key: make_key 返回的缓存键
+            similarity: 相似匹配的最低相似度，为 1 时只精确匹配
+        """
+        now = time.monotonic()
+
+        entry = self.entries.get(key)
+
+        if entry is not None and entry.expires_at <= now:
+            self._remove(key)
+            entry = None
+
+        if entry is None and similarity < 1:
+            similar_key = self._find_similar(key, similarity, now)
+
+            if similar_key is not None:
+                key = similar_key
+                entry = self.entries[key]
+                self.similar_hit_count += 1
+
+        if entry is None:
+            self.miss_count += 1
+            return None
+
+        self.hit_count += 1
+        self.entries.move_to_end(key)
+
+        # 命中时没有请求模型，不带用量
+        return entry.message.copy(update={'usage': None})
+
+    def put(self, key: tuple[str, str], message: llm_entities.Message, ttl: float):
+        """缓存回复，含工具调用的回复不缓存"""
+        if message.tool_calls or ttl <= 0:
+            return
+
+        self._remove(key)
+
+        self.entries[key] = CacheEntry(message, time.monotonic() + ttl, get_shingles(key[1]))
+        self.contexts.setdefault(key[0], set()).add(key[1])
+
+        while len(self.entries) > self.max_entries:
+            self._remove(next(iter(self.entries)))
+            self.eviction_count += 1
+
+    def clear(self):
+        self.entries.clear()
+        self.contexts.clear()
+
+    def to_dict(self) -> dict[str, typing.Any]:
+        lookups = self.hit_count + self.miss_count
+
+        return {
+            'entries': len(self.entries),
+            'max_entries': self.max_entries,
+            'hit_count': self.hit_count,
+            'similar_hit_count': self.similar_hit_count,
+            'miss_count': self.miss_count,
+            'bypass_count': self.bypass_count,
+            'eviction_count': self.eviction_count,
+            'hit_rate': self.hit_count / lookups if lookups else 0.0,
+        }
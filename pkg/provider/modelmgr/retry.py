@@ -0,0 +1,112 @@
+"""模型请求的重试策略
+
+502、503、超时、连接中断等暂时性错误在稍后重试通常就能成功。所有请求器共用这里的策略：
+指数退避加随机抖动（full jitter），只重试暂时性错误，并且不超过请求的有效期（Query.deadline）。
+请求器自身 SDK 的重试已关闭，由这里统一处理。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import typing
+
+import anthropic
+import httpx
+import openai
+
+
+RETRYABLE_STATUS_CODES = frozenset({408, 409, 500, 502, 503, 504, 520, 522, 524, 529})
+"""可以重试的 HTTP 状态码，529 为 Anthropic 的服务过载"""
+
+RETRYABLE_EXCEPTIONS: tuple[type[BaseException], ...] = (
+    asyncio.TimeoutError,
+    httpx.TransportError,
+    openai.APIConnectionError,
+    anthropic.APIConnectionError,
+)
+"""可以重试的异常类型：超时与连接错误"""
+
+
+def get_error_reason(e: BaseException) -> str:
+    """用于统计的错误原因：状态码或异常类型名"""
+    status_code = getattr(e, 'status_code', None)
+
+    return str(status_code) if isinstance(status_code, int) else type(e).__name__
+
+
+class RetryPolicy:
+    """重试策略"""
+
+    max_attempts: int
+    """最多尝试次数（含首次），为 1 时不重试"""
+
+    base_delay: float
+    """首次重试的退避上限（秒），之后每次翻倍"""
+
+    max_delay: float
+    """单次退避的最大时间（秒）"""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8):
+        self.max_attempts = max(int(max_attempts), 1)
+        self.base_delay = max(float(base_delay), 0.0)
+        self.max_delay = max(float(max_delay), 0.0)
+
+    @classmethod
+    def from_config(cls, config: dict[str, typing.Any]) -> RetryPolicy:
+        """从实例配置的 model-retry 部分创建"""
+        return cls(
+            max_attempts=config.get('max-attempts', 3),
+            base_delay=config.get('base-delay', 0.5),
+            max_delay=config.get('max-delay', 8),
+        )
+
+    def is_retryable(self, e: BaseException) -> bool:
+        """是否为暂时性错误"""
+        if isinstance(e, RETRYABLE_EXCEPTIONS):
+            return True
+
+        return getattr(e, 'status_code', None) in RETRYABLE_STATUS_CODES
+
+    def get_delay(self, attempt: int) -> float:
+        """第 attempt 次失败后的退避时间，在 [0, min(max_delay, base_delay * 2^(attempt-1))] 中随机"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+
+
+class RetryStats:
+    """模型的重试统计"""
+
+    retry_count: int
+    """重试次数"""
+
+    recovered_count: int
+    """重试后成功的调用数"""
+
+    exhausted_count: int
+    """重试后仍失败的调用数"""
+
+    reasons: dict[str, int]
+    """各原因的重试次数"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.retry_count = 0
+        self.recovered_count = 0
+        self.exhausted_count = 0
+        self.reasons = {}
+
+    def record_retry(self, e: BaseException):
+        self.retry_count += 1
+
+        reason = get_error_reason(e)
+        self.reasons[reason] = self.reasons.get(reason, 0) + 1
+
+    def to_dict(self) -> dict:
+        return {
+            'retry_count': self.retry_count,
+            'recovered_count': self.recovered_count,
+            'exhausted_count': self.exhausted_count,
+            'reasons': dict(self.reasons),
+        }
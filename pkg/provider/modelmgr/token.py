@@ -1,24 +1,312 @@
 from __future__ import annotations
 
+import datetime
+import email.utils
+import re
+import time
 import typing
 
 
+AUTH_FAILURE_COOLDOWN = 300
+"""key 无效（401/403）后暂停使用的时间（秒）"""
+
+MAX_RATE_LIMIT_COOLDOWN = 60
+"""被限流且响应中没有给出恢复时间时，暂停使用的最长时间（秒）"""
+
+_DURATION_PATTERN = re.compile(r'(\d+(?:\.\d+)?)(ms|s|m|h)')
+
+
+def mask_token(token: str) -> str:
+    """用于展示和日志的 key，只保留末四位，不超过四位的 key 全部隐藏"""
+    if len(token) <= 4:
+        return '****'
+
+    return '...' + token[-4:]
+
+
+def parse_reset_seconds(value: typing.Optional[str]) -> typing.Optional[float]:
+    """解析限流响应头中的恢复时间，返回距现在的秒数
+
+    支持 retry-after 的秒数和 HTTP 日期、OpenAI 的 "6m0s"、"20ms" 等时长，以及 Anthropic 的 RFC 3339 时间。
+    """
+    if not value:
+        return None
+
+    value = value.strip()
+
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+
+    matches = _DURATION_PATTERN.findall(value)
+    if matches and ''.join(num + unit for num, unit in matches) == value:
+        units = {'ms': 0.001, 's': 1, 'm': 60, 'h': 3600}
+        return sum(float(num) * units[unit] for num, unit in matches)
+
+    try:
+        reset_at = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        try:
+            reset_at = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+
+    if reset_at.tzinfo is None:
+        reset_at = reset_at.replace(tzinfo=datetime.timezone.utc)
+
+    return max((reset_at - datetime.datetime.now(datetime.timezone.utc)).total_seconds(), 0.0)
+
+
+def _get_int_header(headers: typing.Mapping[str, str], *names: str) -> typing.Optional[int]:
+    for name in names:
+        value = headers.get(name)
+        if value is not None:
+            try:
+                return int(value)
+            except ValueError:
+                continue
+    return None
+
+
+def _get_reset_header(headers: typing.Mapping[str, str], *names: str) -> typing.Optional[float]:
+    for name in names:
+        seconds = parse_reset_seconds(headers.get(name))
+        if seconds is not None:
+            return seconds
+    return None
+
+
+class TokenState:
+    """单个 key 的使用情况"""
+
+    in_flight: int
+    """正在进行的请求数"""
+
+    cooldown_until: float
+    """在此时间（time.monotonic()）之前不使用该 key"""
+
+    consecutive_failures: int
+    """连续被限流或鉴权失败的次数，请求成功后清零"""
+
+    last_status_code: typing.Optional[int]
+    """最近一次失败的状态码"""
+
+    remaining_requests: typing.Optional[int]
+    """当前窗口剩余请求数（RPM），来自响应头"""
+
+    remaining_tokens: typing.Optional[int]
+    """当前窗口剩余 token 数（TPM），来自响应头"""
+
+    def __init__(self):
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.consecutive_failures = 0
+        self.last_status_code = None
+        self.remaining_requests = None
+        self.remaining_tokens = None
+
+    def is_available(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    def to_dict(self, now: float) -> dict:
+        return {
+            'in_flight': self.in_flight,
+            'available': self.is_available(now),
+            'cooldown_remaining': max(self.cooldown_until - now, 0.0),
+            'consecutive_failures': self.consecutive_failures,
+            'last_status_code': self.last_status_code,
+            'remaining_requests': self.remaining_requests,
+            'remaining_tokens': self.remaining_tokens,
+        }
+
+
 class TokenManager:
-    """鉴权 Token 管理器"""
+    """鉴权 Token 管理器
+
+    为每次请求选择一个 key：跳过被限流或无效而处于冷却期的 key，在其余 key 中选正在进行的请求最少、
+    剩余额度最多的一个，同等时轮流使用。请求方通过 acquire/release 记录并发数，
+    通过 observe 和 report_error 反馈响应头中的限额与失败情况。
+    """
 
     name: str
 
     tokens: list[str]
 
+    states: dict[str, TokenState]
+
     using_token_index: typing.Optional[int] = 0
+    """轮询起点，每次选择后后移"""
 
     def __init__(self, name: str, tokens: list[str]):
         self.name = name
         self.tokens = tokens
+        self.states = {token: TokenState() for token in tokens}
         self.using_token_index = 0
 
+    def _select(self, exclude: typing.Container[str] = ()) -> str:
+        if not self.tokens:
+            return ''
+
+        now = time.monotonic()
+        count = len(self.tokens)
+
+        best_token = None
+        best_key = None
+
+        for offset in range(count):
+            token = self.tokens[(self.using_token_index + offset) % count]
+
+            if token in exclude:
+                continue
+
+            state = self.states[token]
+
+            key = (
+                not state.is_available(now),
+                # 冷却中的 key 选最早恢复的
+                state.cooldown_until if not state.is_available(now) else 0.0,
+                state.in_flight,
+                state.remaining_requests == 0,
+                -(state.remaining_tokens if state.remaining_tokens is not None else float('inf')),
+            )
+
+            if best_key is None or key < best_key:
+                best_token = token
+                best_key = key
+
+        if best_token is None:
+            # 所有 key 都已排除
+            best_token = self.tokens[self.using_token_index % count]
+
+        self.using_token_index = (self.tokens.index(best_token) + 1) % count
+
+        return best_token
+
     def get_token(self) -> str:
-        return self.tokens[self.using_token_index]
+        """选择一个 key，不记录并发数"""
+        return self._select()
+
+    def acquire(self, exclude: typing.Container[str] = ()) -> str:
+        """为一次请求选择 key，请求结束后须调用 release
+
+        Args:
+            exclude: 本次请求已经失败过、不再尝试的 key
+        """
+        token = self._select(exclude)
+
+        if token in self.states:
+            self.states[token].in_flight += 1
+
+        return token
+
+    def release(self, token: str):
+        """请求结束"""
+        state = self.states.get(token)
+
+        if state is not None and state.in_flight > 0:
+            state.in_flight -= 1
+
+    def has_available(self, exclude: typing.Container[str] = ()) -> bool:
+        """除 exclude 外是否还有不在冷却期的 key"""
+        now = time.monotonic()
+
+        return any(token not in exclude and self.states[token].is_available(now) for token in self.tokens)
+
+    def get_available_delay(self) -> float:
+        """距离最早有 key 结束冷却的时间（秒）"""
+        if not self.tokens:
+            return 0.0
+
+        now = time.monotonic()
+
+        return max(min(state.cooldown_until for state in self.states.values()) - now, 0.0)
+
+    def observe(self, token: str, headers: typing.Optional[typing.Mapping[str, str]]):
+        """请求成功，记录响应头中的剩余限额"""
+        state = self.states.get(token)
+
+        if state is None:
+            return
+
+        state.consecutive_failures = 0
+
+        if headers is None:
+            return
+
+        # OpenAI 兼容接口与 Anthropic 的限额响应头
+        remaining_requests = _get_int_header(
+            headers, 'x-ratelimit-remaining-requests', 'anthropic-ratelimit-requests-remaining'
+        )
+        remaining_tokens = _get_int_header(
+            headers, 'x-ratelimit-remaining-tokens', 'anthropic-ratelimit-tokens-remaining'
+        )
+
+        if remaining_requests is not None:
+            state.remaining_requests = remaining_requests
+        if remaining_tokens is not None:
+            state.remaining_tokens = remaining_tokens
+
+        # 额度用完时在窗口重置前不再使用
+        if remaining_requests == 0 or remaining_tokens == 0:
+            reset = _get_reset_header(
+                headers,
+                'x-ratelimit-reset-requests' if remaining_requests == 0 else 'x-ratelimit-reset-tokens',
+                'anthropic-ratelimit-requests-reset' if remaining_requests == 0 else 'anthropic-ratelimit-tokens-reset',
+            )
+            if reset is not None:
+                state.cooldown_until = max(state.cooldown_until, time.monotonic() + reset)
+
+    def report_error(
+        self,
+        token: str,
+        status_code: typing.Optional[int],
+        headers: typing.Optional[typing.Mapping[str, str]] = None,
+    ) -> bool:
+        """请求失败
+
+        Returns:
+            bool: 是否为该 key 本身的问题（被限流或无效），换一个 key 重试可能成功
+        """
+        state = self.states.get(token)
+
+        if state is None or status_code not in (401, 403, 429):
+            return False
+
+        state.consecutive_failures += 1
+        state.last_status_code = status_code
+
+        now = time.monotonic()
+
+        if status_code == 429:
+            reset = None
+
+            if headers is not None:
+                reset = _get_reset_header(
+                    headers,
+                    'retry-after',
+                    'x-ratelimit-reset-requests',
+                    'x-ratelimit-reset-tokens',
+                    'anthropic-ratelimit-requests-reset',
+                    'anthropic-ratelimit-tokens-reset',
+                )
+
+            if reset is None:
+                reset = min(2**state.consecutive_failures, MAX_RATE_LIMIT_COOLDOWN)
+
+            state.cooldown_until = max(state.cooldown_until, now + reset)
+        else:
+            state.cooldown_until = max(state.cooldown_until, now + AUTH_FAILURE_COOLDOWN)
+
+        return True
 
     def next_token(self):
-        self.using_token_index = (self.using_token_index + 1) % len(self.tokens)
+        """轮询起点后移一个"""
+        if self.tokens:
+            self.using_token_index = (self.using_token_index + 1) % len(self.tokens)
+
+    def stats(self) -> list[dict]:
+        """各 key 的状态，key 经 mask_token 隐藏"""
+        now = time.monotonic()
+
+        return [{'token': mask_token(token), **self.states[token].to_dict(now)} for token in self.tokens]
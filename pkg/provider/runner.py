@@ -35,6 +35,11 @@ class RequestRunner(abc.ABC):
         self.pipeline_config = pipeline_config
 
     @abc.abstractmethod
-    async def run(self, query: core_entities.Query) -> typing.AsyncGenerator[llm_entities.Message, None]:
-        """运行请求"""
+    async def run(
+        self, query: core_entities.Query
+    ) -> typing.AsyncGenerator[llm_entities.MessageChunk | llm_entities.Message, None]:
+        """运行请求
+
+        流式输出时可以在每条完整的 Message 之前产生若干 MessageChunk，它们只用于展示，不写入对话历史。
+        """
         pass
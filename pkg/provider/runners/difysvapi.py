@@ -10,7 +10,7 @@ import base64
 from .. import runner
 from ...core import app, entities as core_entities
 from .. import entities as llm_entities
-from ...utils import image
+from ...utils import image, httpclient
 
 from libs.dify_service_api.v1 import client, errors
 
@@ -36,6 +36,9 @@ class DifyServiceAPIRunner(runner.RequestRunner):
         self.dify_client = client.AsyncDifyServiceClient(
             api_key=api_key,
             base_url=self.pipeline_config['ai']['dify-service-api']['base-url'],
+            http_client=httpclient.get_httpx_client(
+                base_url=self.pipeline_config['ai']['dify-service-api']['base-url'],
+            ),
         )
 
     def _try_convert_thinking(self, resp_text: str) -> str:
@@ -12,22 +12,67 @@ from .. import entities as llm_entities
 class LocalAgentRunner(runner.RequestRunner):
     """本地Agent请求运行器"""
 
-    async def run(self, query: core_entities.Query) -> typing.AsyncGenerator[llm_entities.Message, None]:
+    async def _invoke(
+        self,
+        query: core_entities.Query,
+        req_messages: list[llm_entities.Message],
+        stream: bool,
+    ) -> typing.AsyncGenerator[llm_entities.MessageChunk | llm_entities.Message, None]:
+        """请求模型，流式输出时先产生各段 MessageChunk，最后一个总是完整的 Message
+
+        主模型失败或超时时依次使用流水线配置的备用模型。开启回复缓存时，命中则直接返回缓存的回复。
+        """
+        local_agent_cfg = query.pipeline_config['ai']['local-agent']
+
+        response_cache = self.ap.model_mgr.response_cache
+        cache_key = None
+
+        if local_agent_cfg.get('response-cache', False):
+            cache_key = response_cache.make_key(query.use_llm_model.model_entity.uuid, req_messages, query.use_funcs)
+
+            if cache_key is not None:
+                cached = response_cache.get(cache_key, similarity=local_agent_cfg.get('response-cache-similarity', 1.0))
+
+                if cached is not None:
+                    yield cached
+                    return
+
+        chain = self.ap.model_mgr.get_fallback_chain(query.use_llm_model, local_agent_cfg)
+
+        if stream:
+            async for msg in self.ap.model_mgr.invoke_llm_stream(query, chain, req_messages, query.use_funcs):
+                yield msg
+        else:
+            msg = await self.ap.model_mgr.invoke_llm(
+                query,
+                chain,
+                req_messages,
+                query.use_funcs,
+                hedge=local_agent_cfg.get('hedge-requests', False),
+            )
+
+            yield msg
+
+        # 备用模型的回复不缓存，否则主模型恢复后仍会返回备用模型的回复
+        if cache_key is not None and msg.model_uuid == query.use_llm_model.model_entity.uuid:
+            response_cache.put(cache_key, msg, ttl=local_agent_cfg.get('response-cache-ttl', 3600))
+
+    async def run(
+        self, query: core_entities.Query
+    ) -> typing.AsyncGenerator[llm_entities.MessageChunk | llm_entities.Message, None]:
         """运行请求"""
         pending_tool_calls = []
 
-        req_messages = query.prompt.messages.copy() + query.messages.copy() + [query.user_message]
+        req_messages = [*query.prompt.messages, *query.messages, query.user_message]
 
-        # 首次请求
-        msg = await query.use_llm_model.requester.invoke_llm(
-            query,
-            query.use_llm_model,
-            req_messages,
-            query.use_funcs,
-            extra_args=query.use_llm_model.model_entity.extra_args,
+        stream = (
+            query.pipeline_config['output']['misc'].get('stream-output', False)
+            and query.adapter.is_stream_output_supported()
         )
 
-        yield msg
+        # 首次请求
+        async for msg in self._invoke(query, req_messages, stream):
+            yield msg
 
         pending_tool_calls = msg.tool_calls
 
@@ -61,15 +106,8 @@ class LocalAgentRunner(runner.RequestRunner):
                     req_messages.append(err_msg)
 
             # 处理完所有调用，再次请求
-            msg = await query.use_llm_model.requester.invoke_llm(
-                query,
-                query.use_llm_model,
-                req_messages,
-                query.use_funcs,
-                extra_args=query.use_llm_model.model_entity.extra_args,
-            )
-
-            yield msg
+            async for msg in self._invoke(query, req_messages, stream):
+                yield msg
 
             pending_tool_calls = msg.tool_calls
 
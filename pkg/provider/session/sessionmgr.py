@@ -1,9 +1,16 @@
 from __future__ import annotations
 
-import asyncio
+import collections
+import datetime
+import typing
 
 from ...core import app, entities as core_entities
 from ...provider import entities as provider_entities
+from . import store
+
+
+SessionKey = typing.Tuple[core_entities.LauncherTypes, typing.Union[int, str]]
+"""会话索引键 (launcher_type, launcher_id)"""
 
 
 class SessionManager:
@@ -11,31 +18,162 @@ class SessionManager:
 
     ap: app.Application
 
-    session_list: list[core_entities.Session]
+    sessions: collections.OrderedDict[SessionKey, core_entities.Session]
+    """会话索引，按最近访问先后排列（最久未访问的在最前）"""
+
+    idle_timeout: int
+    """会话闲置超时秒数，超时后被回收，0 表示不回收"""
+
+    max_sessions: int
+    """最多保留的会话数，超出时回收最久未访问的会话，0 表示不限制"""
+
+    sweep_interval: int
+    """闲置会话清理的最小间隔秒数"""
+
+    last_sweep_time: float
+
+    evicted_idle_count: int
+    """因闲置超时被回收的会话数"""
+
+    evicted_lru_count: int
+    """因超出会话数上限被回收的会话数"""
+
+    conversation_store: store.ConversationStore
+    """对话持久化存储"""
 
     def __init__(self, ap: app.Application):
         self.ap = ap
-        self.session_list = []
+        self.conversation_store = store.ConversationStore(ap)
+        self.sessions = collections.OrderedDict()
+        self.last_sweep_time = 0
+        self.evicted_idle_count = 0
+        self.evicted_lru_count = 0
 
     async def initialize(self):
-        pass
+        session_cfg = self.ap.instance_config.data.get('session', {})
+
+        self.idle_timeout = session_cfg.get('idle-timeout', 0)
+        self.max_sessions = session_cfg.get('max-sessions', 0)
+        self.sweep_interval = session_cfg.get('sweep-interval', 60)
+
+        await self.conversation_store.initialize()
+
+    @property
+    def session_list(self) -> list[core_entities.Session]:
+        """所有会话（只读快照）"""
+        return list(self.sessions.values())
+
+    def _is_session_busy(self, key: SessionKey) -> bool:
+        return self.ap.query_pool is not None and self.ap.query_pool.is_session_busy(key)
+
+    def _evict(self, key: SessionKey):
+        session = self.sessions.pop(key)
+        # 释放会话持有的对话
+        session.using_conversation = None
+        session.conversations = []
+
+    def _sweep_idle_sessions(self, now: datetime.datetime):
+        """回收闲置超时的会话，会话按访问先后排列，遇到未超时的即可停止"""
+        deadline = now - datetime.timedelta(seconds=self.idle_timeout)
+
+        for key in list(self.sessions.keys()):
+            session = self.sessions[key]
+
+            if session.update_time > deadline:
+                break
+
+            if self._is_session_busy(key):
+                continue
+
+            self._evict(key)
+            self.evicted_idle_count += 1
+
+    def _enforce_max_sessions(self):
+        """回收最久未访问的会话直到会话数不超过上限"""
+        for key in list(self.sessions.keys()):
+            if len(self.sessions) <= self.max_sessions:
+                break
+
+            if self._is_session_busy(key):
+                continue
+
+            self._evict(key)
+            self.evicted_lru_count += 1
+
+    def get_eviction_stats(self) -> dict:
+        """获取会话回收统计"""
+        return {
+            'evicted_idle_count': self.evicted_idle_count,
+            'evicted_lru_count': self.evicted_lru_count,
+        }
 
     async def get_session(self, query: core_entities.Query) -> core_entities.Session:
         """获取会话"""
-        for session in self.session_list:
-            if query.launcher_type == session.launcher_type and query.launcher_id == session.launcher_id:
-                return session
+        key = (query.launcher_type, query.launcher_id)
+
+        now = datetime.datetime.now()
 
-        session_concurrency = self.ap.instance_config.data['concurrency']['session']
+        session = self.sessions.get(key)
+
+        if session is not None:
+            session.update_time = now
+            self.sessions.move_to_end(key)
+            return session
+
+        if self.idle_timeout > 0 and now.timestamp() - self.last_sweep_time >= self.sweep_interval:
+            self.last_sweep_time = now.timestamp()
+            self._sweep_idle_sessions(now)
 
         session = core_entities.Session(
             launcher_type=query.launcher_type,
             launcher_id=query.launcher_id,
-            semaphore=asyncio.Semaphore(session_concurrency),
         )
-        self.session_list.append(session)
+        self.sessions[key] = session
+
+        if self.max_sessions > 0 and len(self.sessions) > self.max_sessions:
+            self._enforce_max_sessions()
+
         return session
 
+    def _build_prompt(self, prompt_config: list[dict]) -> provider_entities.Prompt:
+        prompt_messages = []
+
+        for prompt_message in prompt_config:
+            prompt_messages.append(provider_entities.Message(**prompt_message))
+
+        return provider_entities.Prompt(
+            name='default',
+            messages=prompt_messages,
+        )
+
+    def refresh_pipeline_conversations(
+        self,
+        pipeline_uuid: str,
+        prompt_config: typing.Optional[list[dict]] = None,
+        reset: bool = False,
+    ):
+        """流水线配置更新后，处理正在使用该流水线的对话
+
+        Args:
+            pipeline_uuid (str): 流水线 uuid
+            prompt_config (list[dict], optional): 新的 prompt 配置，不为 None 时替换对话的 prompt 并保留上文
+            reset (bool): 是否丢弃这些对话，下次请求时新建
+        """
+        if reset:
+            # 包括未在内存中的会话
+            self.conversation_store.archive_pipeline_conversations(pipeline_uuid)
+
+        for session in self.sessions.values():
+            conversation = session.using_conversation
+
+            if conversation is None or conversation.pipeline_uuid != pipeline_uuid:
+                continue
+
+            if reset:
+                session.using_conversation = None
+            elif prompt_config is not None:
+                conversation.prompt = self._build_prompt(prompt_config)
+
     async def get_conversation(
         self,
         query: core_entities.Query,
@@ -49,28 +187,67 @@ class SessionManager:
         if not session.conversations:
             session.conversations = []
 
-        # set prompt
-        prompt_messages = []
-
-        for prompt_message in prompt_config:
-            prompt_messages.append(provider_entities.Message(**prompt_message))
-
-        prompt = provider_entities.Prompt(
-            name='default',
-            messages=prompt_messages,
-        )
-
         if session.using_conversation is None or session.using_conversation.pipeline_uuid != pipeline_uuid:
-            conversation = core_entities.Conversation(
-                prompt=prompt,
-                messages=[],
-                use_funcs=await self.ap.tool_mgr.get_all_functions(
-                    plugin_enabled=True,
-                ),
-                pipeline_uuid=pipeline_uuid,
-                bot_uuid=bot_uuid,
-            )
+            conversation = None
+
+            # 会话首次取对话时（新会话、被回收后重建、重启后）从数据库加载上次的对话
+            if not session.conversation_loaded:
+                session.conversation_loaded = True
+                conversation = await self._load_conversation(query, session, prompt_config, pipeline_uuid, bot_uuid)
+
+            if conversation is None:
+                conversation = core_entities.Conversation(
+                    prompt=self._build_prompt(prompt_config),
+                    messages=[],
+                    use_funcs=await self.ap.tool_mgr.get_all_functions(
+                        plugin_enabled=True,
+                    ),
+                    pipeline_uuid=pipeline_uuid,
+                    bot_uuid=bot_uuid,
+                )
+                self.conversation_store.add_conversation(session, conversation)
+
             session.conversations.append(conversation)
             session.using_conversation = conversation
 
         return session.using_conversation
+
+    async def _load_conversation(
+        self,
+        query: core_entities.Query,
+        session: core_entities.Session,
+        prompt_config: list[dict],
+        pipeline_uuid: str,
+        bot_uuid: str,
+    ) -> typing.Optional[core_entities.Conversation]:
+        """从数据库加载最近的对话，只加载最后 max-round 轮"""
+        max_round = query.pipeline_config['ai']['local-agent'].get('max-round', 10) if query.pipeline_config else 10
+
+        try:
+            loaded = await self.conversation_store.load_latest_conversation(
+                session.launcher_type, session.launcher_id, pipeline_uuid, max_round
+            )
+        except Exception as e:
+            self.ap.logger.error(
+                f'Failed to load conversation for {session.launcher_type.value}_{session.launcher_id}: {e}'
+            )
+            return None
+
+        if loaded is None:
+            return None
+
+        record, messages = loaded
+
+        return core_entities.Conversation(
+            prompt=self._build_prompt(prompt_config),
+            messages=messages,
+            use_funcs=await self.ap.tool_mgr.get_all_functions(
+                plugin_enabled=True,
+            ),
+            pipeline_uuid=pipeline_uuid,
+            bot_uuid=bot_uuid,
+            uuid=record.external_uuid,
+            record_uuid=record.uuid,
+            round_count=record.round_count,
+            summary=record.summary,
+        )
@@ -0,0 +1,302 @@
+from __future__ import annotations
+
+import asyncio
+import datetime
+import traceback
+import typing
+import uuid
+
+import sqlalchemy
+
+from ...core import app, entities as core_entities
+from ...entity.persistence import conversation as persistence_conversation
+from ...provider import entities as provider_entities
+
+
+MAX_OP_ATTEMPTS = 5
+"""单个待写操作最多尝试写入的次数，超过后丢弃"""
+
+
+class ConversationStore:
+    """对话持久化存储
+
+    写入采用 write-behind：处理请求时只把操作追加到待写队列，由后台任务定期批量写入数据库，
+    不阻塞流水线。读取（加载会话的当前对话）前会先写入待写队列，保证读到最新数据。
+    """
+
+    ap: app.Application
+
+    enabled: bool
+    """是否启用对话持久化"""
+
+    flush_interval: float
+    """批量写入的间隔秒数"""
+
+    max_pending: int
+    """待写操作超过此数量时立即写入"""
+
+    pending: list[tuple[str, typing.Any, int]]
+    """待写操作队列，按顺序执行，每项为 (操作, 数据, 已失败次数)"""
+
+    flush_lock: asyncio.Lock
+
+    flush_event: asyncio.Event
+
+    def __init__(self, ap: app.Application):
+        self.ap = ap
+        self.pending = []
+        self.flush_lock = asyncio.Lock()
+        self.flush_event = asyncio.Event()
+
+    async def initialize(self):
+        store_cfg = self.ap.instance_config.data.get('conversation-store', {})
+
+        self.enabled = store_cfg.get('enable', False)
+        self.flush_interval = store_cfg.get('flush-interval', 2)
+        self.max_pending = store_cfg.get('max-pending', 200)
+
+    def _enqueue(self, op: str, data: typing.Any):
+        self.pending.append((op, data, 0))
+
+        if len(self.pending) >= self.max_pending:
+            self.flush_event.set()
+
+    def _conversation_values(
+        self, session: core_entities.Session, conversation: core_entities.Conversation
+    ) -> dict[str, typing.Any]:
+        return {
+            'uuid': conversation.record_uuid,
+            'launcher_type': session.launcher_type.value,
+            'launcher_id': str(session.launcher_id),
+            'pipeline_uuid': conversation.pipeline_uuid,
+            'bot_uuid': conversation.bot_uuid,
+            'external_uuid': conversation.uuid,
+            'round_count': conversation.round_count,
+            'summary': conversation.summary,
+            'archived': False,
+            'updated_at': datetime.datetime.now(),
+        }
+
+    # ======= 写入（write-behind） =======
+
+    def add_conversation(self, session: core_entities.Session, conversation: core_entities.Conversation):
+        """记录新建的对话"""
+        if not self.enabled:
+            return
+
+        conversation.record_uuid = str(uuid.uuid4())
+        self._enqueue('upsert-conversation', self._conversation_values(session, conversation))
+
+    def append_round(
+        self,
+        session: core_entities.Session,
+        conversation: core_entities.Conversation,
+        messages: list[provider_entities.Message],
+    ):
+        """记录对话新增的一轮消息"""
+        if not self.enabled or conversation.record_uuid is None:
+            return
+
+        conversation.round_count += 1
+
+        self._enqueue('upsert-conversation', self._conversation_values(session, conversation))
+        self._enqueue(
+            'insert-messages',
+            (conversation.record_uuid, conversation.round_count, messages),
+        )
+
+    def update_conversation(self, session: core_entities.Session, conversation: core_entities.Conversation):
+        """记录对话自身信息（如摘要）的变化"""
+        if not self.enabled or conversation.record_uuid is None:
+            return
+
+        self._enqueue('upsert-conversation', self._conversation_values(session, conversation))
+
+    def archive_conversation(self, conversation: core_entities.Conversation):
+        """标记对话已被重置，之后不会再被加载为当前对话"""
+        if not self.enabled or conversation.record_uuid is None:
+            return
+
+        self._enqueue('archive-conversation', conversation.record_uuid)
+
+    def archive_pipeline_conversations(self, pipeline_uuid: str):
+        """标记使用指定流水线的所有对话已被重置"""
+        if not self.enabled:
+            return
+
+        self._enqueue('archive-pipeline', pipeline_uuid)
+
+    def delete_conversation(self, conversation: core_entities.Conversation):
+        """删除对话及其消息"""
+        if not self.enabled or conversation.record_uuid is None:
+            return
+
+        self._enqueue('delete-conversation', conversation.record_uuid)
+
+    def delete_session_conversations(self, session: core_entities.Session):
+        """删除会话的所有对话及其消息"""
+        if not self.enabled:
+            return
+
+        self._enqueue('delete-session', (session.launcher_type.value, str(session.launcher_id)))
+
+    async def flush(self):
+        """把待写操作写入数据库"""
+        async with self.flush_lock:
+            if not self.pending:
+                return
+
+            pending, self.pending = self.pending, []
+
+            try:
+                async with self.ap.persistence_mgr.get_db_engine().begin() as conn:
+                    for op, data, _ in pending:
+                        await self._execute_op(conn, op, data)
+                return
+            except Exception as e:
+                self.ap.logger.warning(f'Failed to persist conversations in batch, retrying one by one: {e}')
+
+            # 逐个写入，找出失败的操作，避免一个无法写入的操作阻塞之后所有的写入
+            failed = []
+
+            for op, data, failures in pending:
+                try:
+                    async with self.ap.persistence_mgr.get_db_engine().begin() as conn:
+                        await self._execute_op(conn, op, data)
+                except Exception as e:
+                    if failures + 1 >= MAX_OP_ATTEMPTS:
+                        self.ap.logger.error(
+                            f'Dropped conversation store op {op} after {MAX_OP_ATTEMPTS} attempts: {e}'
+                        )
+                        self.ap.logger.debug(f'Traceback: {traceback.format_exc()}')
+                    else:
+                        failed.append((op, data, failures + 1))
+
+            if failed:
+                # 放回队列，下次重试
+                self.pending = failed + self.pending
+                self.ap.logger.error(f'Failed to persist {len(failed)} conversation store ops, will retry')
+
+    async def _execute_op(self, conn, op: str, data: typing.Any):
+        if op == 'upsert-conversation':
+            result = await conn.execute(
+                sqlalchemy.update(persistence_conversation.Conversation)
+                .where(persistence_conversation.Conversation.uuid == data['uuid'])
+                .values(**{k: v for k, v in data.items() if k not in ('uuid', 'archived')})
+            )
+            if result.rowcount == 0:
+                await conn.execute(sqlalchemy.insert(persistence_conversation.Conversation).values(**data))
+        elif op == 'insert-messages':
+            record_uuid, round_index, messages = data
+            rows = [
+                {
+                    'conversation_uuid': record_uuid,
+                    'round_index': round_index,
+                    'role': message.role,
+                    'content': message.dict(exclude_none=True),
+                }
+                for message in messages
+                if isinstance(message, provider_entities.Message)
+            ]
+            if rows:
+                await conn.execute(sqlalchemy.insert(persistence_conversation.Message), rows)
+        elif op == 'archive-conversation':
+            await conn.execute(
+                sqlalchemy.update(persistence_conversation.Conversation)
+                .where(persistence_conversation.Conversation.uuid == data)
+                .values(archived=True)
+            )
+        elif op == 'archive-pipeline':
+            await conn.execute(
+                sqlalchemy.update(persistence_conversation.Conversation)
+                .where(persistence_conversation.Conversation.pipeline_uuid == data)
+                .values(archived=True)
+            )
+        elif op == 'delete-conversation':
+            await conn.execute(
+                sqlalchemy.delete(persistence_conversation.Message).where(
+                    persistence_conversation.Message.conversation_uuid == data
+                )
+            )
+            await conn.execute(
+                sqlalchemy.delete(persistence_conversation.Conversation).where(
+                    persistence_conversation.Conversation.uuid == data
+                )
+            )
+        elif op == 'delete-session':
+            launcher_type, launcher_id = data
+            record_uuids = sqlalchemy.select(persistence_conversation.Conversation.uuid).where(
+                persistence_conversation.Conversation.launcher_type == launcher_type,
+                persistence_conversation.Conversation.launcher_id == launcher_id,
+            )
+            await conn.execute(
+                sqlalchemy.delete(persistence_conversation.Message).where(
+                    persistence_conversation.Message.conversation_uuid.in_(record_uuids)
+                )
+            )
+            await conn.execute(
+                sqlalchemy.delete(persistence_conversation.Conversation).where(
+                    persistence_conversation.Conversation.launcher_type == launcher_type,
+                    persistence_conversation.Conversation.launcher_id == launcher_id,
+                )
+            )
+
+    async def run(self):
+        """后台批量写入"""
+        try:
+            while True:
+                try:
+                    await asyncio.wait_for(self.flush_event.wait(), timeout=self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self.flush_event.clear()
+
+                await self.flush()
+        finally:
+            # 退出前写入剩余的操作
+            await self.flush()
+
+    # ======= 读取 =======
+
+    async def load_latest_conversation(
+        self,
+        launcher_type: core_entities.LauncherTypes,
+        launcher_id: typing.Union[int, str],
+        pipeline_uuid: str,
+        max_rounds: int,
+    ) -> tuple[persistence_conversation.Conversation, list[provider_entities.Message]] | None:
+        """加载会话在指定流水线下最近的未重置对话，只加载最后 max_rounds 轮消息"""
+        if not self.enabled:
+            return None
+
+        await self.flush()
+
+        result = await self.ap.persistence_mgr.execute_async(
+            sqlalchemy.select(persistence_conversation.Conversation)
+            .where(
+                persistence_conversation.Conversation.launcher_type == launcher_type.value,
+                persistence_conversation.Conversation.launcher_id == str(launcher_id),
+                persistence_conversation.Conversation.pipeline_uuid == pipeline_uuid,
+                persistence_conversation.Conversation.archived == False,  # noqa: E712
+            )
+            .order_by(persistence_conversation.Conversation.updated_at.desc())
+            .limit(1)
+        )
+
+        record = result.first()
+
+        if record is None:
+            return None
+
+        result = await self.ap.persistence_mgr.execute_async(
+            sqlalchemy.select(persistence_conversation.Message)
+            .where(
+                persistence_conversation.Message.conversation_uuid == record.uuid,
+                persistence_conversation.Message.round_index > record.round_count - max_rounds,
+            )
+            .order_by(persistence_conversation.Message.id)
+        )
+
+        messages = [provider_entities.Message(**row.content) for row in result.all()]
+
+        return record, messages
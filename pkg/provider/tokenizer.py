@@ -0,0 +1,143 @@
+from __future__ import annotations
+
+import asyncio
+import json
+
+import tiktoken
+import tiktoken.model
+
+from . import entities as llm_entities
+from .tools import entities as tools_entities
+
+
+DEFAULT_ENCODING = 'cl100k_base'
+"""无法识别模型时使用的编码"""
+
+MESSAGE_OVERHEAD_TOKENS = 4
+"""每条消息的格式开销（role、分隔符等）"""
+
+IMAGE_TOKENS = 85
+"""每张图片按低精度计算的 token 数"""
+
+
+class Tokenizer:
+    """按模型计算 token 数
+
+    消息的 token 数缓存在 Message 对象上，同一条历史消息只在第一次计算时编码。
+    """
+
+    name: str
+    """编码名称，也是消息上缓存的键"""
+
+    encoding: tiktoken.Encoding | None
+    """编码器，加载失败（如无法下载编码文件）时为 None，此时按字符数估算"""
+
+    def __init__(self, name: str, encoding: tiktoken.Encoding | None):
+        self.name = name
+        self.encoding = encoding
+
+    @property
+    def estimated(self) -> bool:
+        """是否为估算值"""
+        return self.encoding is None
+
+    def count_text(self, text: str) -> int:
+        if not text:
+            return 0
+
+        if self.encoding is not None:
+            return len(self.encoding.encode(text, disallowed_special=()))
+
+        # 估算：ASCII 约 4 字符一个 token，其他字符（如中文）约一字一个 token
+        ascii_count = sum(1 for c in text if c.isascii())
+        return (ascii_count + 3) // 4 + (len(text) - ascii_count)
+
+    def _count_message(self, message: llm_entities.Message) -> int:
+        tokens = MESSAGE_OVERHEAD_TOKENS
+
+        if message.name:
+            tokens += self.count_text(message.name)
+
+        if isinstance(message.content, str):
+            tokens += self.count_text(message.content)
+        elif isinstance(message.content, list):
+            for ce in message.content:
+                if ce.type == 'text':
+                    tokens += self.count_text(ce.text)
+                else:
+                    tokens += IMAGE_TOKENS
+
+        if message.tool_calls:
+            for tool_call in message.tool_calls:
+                tokens += self.count_text(tool_call.function.name)
+                tokens += self.count_text(tool_call.function.arguments)
+
+        return tokens
+
+    def count_message(self, message: llm_entities.Message) -> int:
+        """计算消息的 token 数，结果缓存在消息上"""
+        cache = message._token_counts
+
+        tokens = cache.get(self.name)
+
+        if tokens is None:
+            tokens = self._count_message(message)
+            cache[self.name] = tokens
+
+        return tokens
+
+    def count_messages(self, messages: list[llm_entities.Message]) -> int:
+        return sum(self.count_message(message) for message in messages)
+
+    def count_functions(self, funcs: list[tools_entities.LLMFunction]) -> int:
+        """计算工具定义的 token 数"""
+        tokens = 0
+
+        for func in funcs:
+            schema = json.dumps(
+                {
+                    'name': func.name,
+                    'description': func.description,
+                    'parameters': func.parameters,
+                },
+                ensure_ascii=False,
+            )
+            tokens += self.count_text(schema)
+
+        return tokens
+
+
+_tokenizers: dict[str, Tokenizer] = {}
+
+_loading_lock = asyncio.Lock()
+
+
+def get_encoding_name(model_name: str) -> str:
+    try:
+        return tiktoken.model.encoding_name_for_model(model_name)
+    except KeyError:
+        return DEFAULT_ENCODING
+
+
+async def get_tokenizer(model_name: str) -> Tokenizer:
+    """获取模型的 Tokenizer
+
+    编码文件首次使用时可能需要下载，在线程中加载，不阻塞事件循环。
+    """
+    name = get_encoding_name(model_name)
+
+    tokenizer = _tokenizers.get(name)
+
+    if tokenizer is not None:
+        return tokenizer
+
+    async with _loading_lock:
+        if name not in _tokenizers:
+            try:
+                encoding = await asyncio.to_thread(tiktoken.get_encoding, name)
+            except Exception:
+                encoding = None
+
+            _tokenizers[name] = Tokenizer(name, encoding)
+
+    return _tokenizers[name]
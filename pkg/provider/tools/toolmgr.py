@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import json
 import typing
 
 from ...core import app, entities as core_entities
@@ -37,24 +38,37 @@ class ToolManager:
 
         return all_functions
 
-    async def generate_tools_for_openai(self, use_funcs: list[entities.LLMFunction]) -> list:
-        """生成函数列表"""
+    def _stable_funcs(self, use_funcs: list[entities.LLMFunction], stable: bool) -> list[entities.LLMFunction]:
+        # 工具位于请求前缀的最前面，按名称排序使提示词缓存不受工具加载顺序影响
+        return sorted(use_funcs, key=lambda f: f.name) if stable else use_funcs
+
+    def _stable_schema(self, parameters: dict, stable: bool) -> dict:
+        # 参数 schema 的键按字母排序，序列化结果在重启、重载插件后保持一致
+        return json.loads(json.dumps(parameters, sort_keys=True)) if stable else parameters
+
+    async def generate_tools_for_openai(self, use_funcs: list[entities.LLMFunction], stable: bool = False) -> list:
+        """生成函数列表
+
+        Args:
+            use_funcs (list[entities.LLMFunction]): 函数列表
+            stable (bool): 是否按名称和键排序，以便命中服务商的提示词缓存
+        """
         tools = []
 
-        for function in use_funcs:
+        for function in self._stable_funcs(use_funcs, stable):
             function_schema = {
                 'type': 'function',
                 'function': {
                     'name': function.name,
                     'description': function.description,
-                    'parameters': function.parameters,
+                    'parameters': self._stable_schema(function.parameters, stable),
                 },
             }
             tools.append(function_schema)
 
         return tools
 
-    async def generate_tools_for_anthropic(self, use_funcs: list[entities.LLMFunction]) -> list:
+    async def generate_tools_for_anthropic(self, use_funcs: list[entities.LLMFunction], stable: bool = False) -> list:
         """为anthropic生成函数列表
 
         e.g.
@@ -79,11 +93,11 @@ class ToolManager:
 
         tools = []
 
-        for function in use_funcs:
+        for function in self._stable_funcs(use_funcs, stable):
             function_schema = {
                 'name': function.name,
                 'description': function.description,
-                'input_schema': function.parameters,
+                'input_schema': self._stable_schema(function.parameters, stable),
             }
             tools.append(function_schema)
 
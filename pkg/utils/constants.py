@@ -1,6 +1,6 @@
 semantic_version = 'v4.0.8.1'
 
-required_database_version = 3
+required_database_version = 8
 """标记本版本所需要的数据库结构版本，用于判断数据库迁移"""
 
 debug_mode = False
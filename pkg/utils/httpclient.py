@@ -0,0 +1,122 @@
+"""全局共享的 HTTP 客户端
+
+请求器、Runner 和图片下载等工具函数不再各自新建客户端，而是从这里取共享的客户端，
+连接保持在连接池中复用，避免每条消息都重新建立 TCP 和 TLS 连接。
+
+httpx.AsyncClient 按 (base_url, 代理, 是否读取环境变量代理) 复用，aiohttp.ClientSession 按是否读取环境变量代理复用。
+取到的客户端不能关闭，也不能修改其属性；超时等参数在每次请求时传入。应用退出时由 close_all 统一关闭。
+"""
+
+from __future__ import annotations
+
+import importlib.util
+import typing
+
+import aiohttp
+import httpx
+
+
+DEFAULT_CONFIG: dict[str, typing.Any] = {
+    'max-connections': 100,
+    'max-keepalive-connections': 20,
+    'keepalive-expiry': 30,
+    'http2': True,
+}
+
+DEFAULT_TIMEOUT = 120
+"""客户端的默认超时（秒），调用方一般应在请求时传入自己的超时"""
+
+_config: dict[str, typing.Any] = DEFAULT_CONFIG.copy()
+
+_httpx_clients: dict[tuple[str, typing.Optional[str], bool], httpx.AsyncClient] = {}
+
+_aiohttp_sessions: dict[bool, aiohttp.ClientSession] = {}
+
+
+def configure(config: dict[str, typing.Any]):
+    """设置连接池参数，只影响之后新建的客户端
+
+    Args:
+        config (dict): 实例配置中的 http-client 部分
+    """
+    global _config
+
+    _config = {**DEFAULT_CONFIG, **config}
+
+
+def http2_enabled() -> bool:
+    """是否启用 HTTP/2，需要安装 h2"""
+    return bool(_config['http2']) and importlib.util.find_spec('h2') is not None
+
+
+def get_httpx_client(
+    base_url: str = '',
+    proxy: typing.Optional[str] = None,
+    trust_env: bool = True,
+) -> httpx.AsyncClient:
+    """获取共享的 httpx 客户端
+
+    Args:
+        base_url (str, optional): 基础 URL. Defaults to ''.
+        proxy (str, optional): 代理地址，为 None 时按 trust_env 决定是否使用环境变量中的代理. Defaults to None.
+        trust_env (bool, optional): 是否读取环境变量中的代理等设置. Defaults to True.
+    """
+    key = (base_url, proxy, trust_env)
+
+    client = _httpx_clients.get(key)
+
+    if client is None or client.is_closed:
+        client = httpx.AsyncClient(
+            base_url=base_url,
+            proxy=proxy,
+            trust_env=trust_env,
+            timeout=DEFAULT_TIMEOUT,
+            follow_redirects=True,
+            http2=http2_enabled(),
+            limits=httpx.Limits(
+                max_connections=_config['max-connections'],
+                max_keepalive_connections=_config['max-keepalive-connections'],
+                keepalive_expiry=_config['keepalive-expiry'],
+            ),
+        )
+        _httpx_clients[key] = client
+
+    return client
+
+
+def get_aiohttp_session(trust_env: bool = True) -> aiohttp.ClientSession:
+    """获取共享的 aiohttp 会话，需在事件循环中调用
+
+    Args:
+        trust_env (bool, optional): 是否读取环境变量中的代理等设置. Defaults to True.
+    """
+    session = _aiohttp_sessions.get(trust_env)
+
+    if session is None or session.closed:
+        session = aiohttp.ClientSession(
+            trust_env=trust_env,
+            connector=aiohttp.TCPConnector(
+                limit=_config['max-connections'],
+                keepalive_timeout=_config['keepalive-expiry'],
+            ),
+        )
+        _aiohttp_sessions[trust_env] = session
+
+    return session
+
+
+async def close_all():
+    """关闭所有共享的客户端，应用退出时调用"""
+    clients = list(_httpx_clients.values())
+    sessions = list(_aiohttp_sessions.values())
+
+    _httpx_clients.clear()
+    _aiohttp_sessions.clear()
+
+    for client in clients:
+        if not client.is_closed:
+            await client.aclose()
+
+    for session in sessions:
+        if not session.closed:
+            await session.close()
@@ -6,10 +6,11 @@ import ssl
 
 import aiohttp
 import PIL.Image
-import httpx
 
 import asyncio
 
+from . import httpclient
+
 
 async def get_gewechat_image_base64(
     gewechat_url: str,
@@ -47,53 +48,55 @@ async def get_gewechat_image_base64(
     )
 
     try:
-        async with aiohttp.ClientSession(timeout=timeout) as session:
-            # 获取图片下载链接
-            try:
-                async with session.post(
-                    f'{gewechat_url}/v2/api/message/downloadImage',
-                    headers=headers,
-                    json={'appId': app_id, 'type': image_type, 'xml': xml_content},
-                ) as response:
-                    if response.status != 200:
-                        # print(response)
-                        raise Exception(f'获取gewechat图片下载失败: {await response.text()}')
-
-                    resp_data = await response.json()
-                    if resp_data.get('ret') != 200:
-                        raise Exception(f'获取gewechat图片下载链接失败: {resp_data}')
-
-                    file_url = resp_data['data']['fileUrl']
-            except asyncio.TimeoutError:
-                raise Exception('获取图片下载链接超时')
-            except aiohttp.ClientError as e:
-                raise Exception(f'获取图片下载链接网络错误: {str(e)}')
-
-            # 解析原始URL并替换端口
-            base_url = gewechat_file_url
-            download_url = f'{base_url}/download/{file_url}'
-
-            # 下载图片
-            try:
-                async with session.get(download_url) as img_response:
-                    if img_response.status != 200:
-                        raise Exception(f'下载图片失败: {await img_response.text()}, URL: {download_url}')
-
-                    image_data = await img_response.read()
-
-                    content_type = img_response.headers.get('Content-Type', '')
-                    if content_type:
-                        image_format = content_type.split('/')[-1]
-                    else:
-                        image_format = file_url.split('.')[-1]
-
-                    base64_str = base64.b64encode(image_data).decode('utf-8')
-
-                    return base64_str, image_format
-            except asyncio.TimeoutError:
-                raise Exception(f'下载图片超时, URL: {download_url}')
-            except aiohttp.ClientError as e:
-                raise Exception(f'下载图片网络错误: {str(e)}, URL: {download_url}')
+        session = httpclient.get_aiohttp_session(trust_env=False)
+
+        # 获取图片下载链接
+        try:
+            async with session.post(
+                f'{gewechat_url}/v2/api/message/downloadImage',
+                headers=headers,
+                json={'appId': app_id, 'type': image_type, 'xml': xml_content},
+                timeout=timeout,
+            ) as response:
+                if response.status != 200:
+                    # print(response)
+                    raise Exception(f'获取gewechat图片下载失败: {await response.text()}')
+
+                resp_data = await response.json()
+                if resp_data.get('ret') != 200:
+                    raise Exception(f'获取gewechat图片下载链接失败: {resp_data}')
+
+                file_url = resp_data['data']['fileUrl']
+        except asyncio.TimeoutError:
+            raise Exception('获取图片下载链接超时')
+        except aiohttp.ClientError as e:
+            raise Exception(f'获取图片下载链接网络错误: {str(e)}')
+
+        # 解析原始URL并替换端口
+        base_url = gewechat_file_url
+        download_url = f'{base_url}/download/{file_url}'
+
+        # 下载图片
+        try:
+            async with session.get(download_url, timeout=timeout) as img_response:
+                if img_response.status != 200:
+                    raise Exception(f'下载图片失败: {await img_response.text()}, URL: {download_url}')
+
+                image_data = await img_response.read()
+
+                content_type = img_response.headers.get('Content-Type', '')
+                if content_type:
+                    image_format = content_type.split('/')[-1]
+                else:
+                    image_format = file_url.split('.')[-1]
+
+                base64_str = base64.b64encode(image_data).decode('utf-8')
+
+                return base64_str, image_format
+        except asyncio.TimeoutError:
+            raise Exception(f'下载图片超时, URL: {download_url}')
+        except aiohttp.ClientError as e:
+            raise Exception(f'下载图片网络错误: {str(e)}, URL: {download_url}')
     except Exception as e:
         raise Exception(f'获取图片失败: {str(e)}') from e
 
@@ -104,24 +107,24 @@ async def get_wecom_image_base64(pic_url: str) -> tuple[str, str]:
     :param pic_url: 企业微信图片URL
     :return: (base64_str, image_format)
     """
-    async with aiohttp.ClientSession() as session:
-        async with session.get(pic_url) as response:
-            if response.status != 200:
-                raise Exception(f'Failed to download image: {response.status}')
+    session = httpclient.get_aiohttp_session(trust_env=False)
+    async with session.get(pic_url) as response:
+        if response.status != 200:
+            raise Exception(f'Failed to download image: {response.status}')
 
-            # 读取图片数据
-            image_data = await response.read()
+        # 读取图片数据
+        image_data = await response.read()
 
-            # 获取图片格式
-            content_type = response.headers.get('Content-Type', '')
-            image_format = content_type.split('/')[-1]  # 例如 'image/jpeg' -> 'jpeg'
+        # 获取图片格式
+        content_type = response.headers.get('Content-Type', '')
+        image_format = content_type.split('/')[-1]  # 例如 'image/jpeg' -> 'jpeg'
 
-            # 转换为 base64
-            import base64
+        # 转换为 base64
+        import base64
 
-            image_base64 = base64.b64encode(image_data).decode('utf-8')
+        image_base64 = base64.b64encode(image_data).decode('utf-8')
 
-            return image_base64, image_format
+        return image_base64, image_format
 
 
 async def get_qq_official_image_base64(pic_url: str, content_type: str) -> tuple[str, str]:
@@ -129,13 +132,13 @@ async def get_qq_official_image_base64(pic_url: str, content_type: str) -> tuple
     下载QQ官方图片，
     并且转换为base64格式
     """
-    async with httpx.AsyncClient() as client:
-        response = await client.get(pic_url)
-        response.raise_for_status()  # 确保请求成功
-        image_data = response.content
-        base64_data = base64.b64encode(image_data).decode('utf-8')
+    client = httpclient.get_httpx_client()
+    response = await client.get(pic_url)
+    response.raise_for_status()  # 确保请求成功
+    image_data = response.content
+    base64_data = base64.b64encode(image_data).decode('utf-8')
 
-        return f'data:{content_type};base64,{base64_data}'
+    return f'data:{content_type};base64,{base64_data}'
 
 
 def get_qq_image_downloadable_url(image_url: str) -> tuple[str, dict]:
@@ -152,19 +155,19 @@ async def get_qq_image_bytes(image_url: str, query: dict = {}) -> tuple[bytes, s
     ssl_context = ssl.create_default_context()
     ssl_context.check_hostname = False
     ssl_context.verify_mode = ssl.CERT_NONE
-    async with aiohttp.ClientSession(trust_env=False) as session:
-        async with session.get(image_url, params=query, ssl=ssl_context) as resp:
-            resp.raise_for_status()
-            file_bytes = await resp.read()
-            content_type = resp.headers.get('Content-Type')
-            if not content_type:
-                image_format = 'jpeg'
-            elif not content_type.startswith('image/'):
-                pil_img = PIL.Image.open(io.BytesIO(file_bytes))
-                image_format = pil_img.format.lower()
-            else:
-                image_format = content_type.split('/')[-1]
-            return file_bytes, image_format
+    session = httpclient.get_aiohttp_session(trust_env=False)
+    async with session.get(image_url, params=query, ssl=ssl_context) as resp:
+        resp.raise_for_status()
+        file_bytes = await resp.read()
+        content_type = resp.headers.get('Content-Type')
+        if not content_type:
+            image_format = 'jpeg'
+        elif not content_type.startswith('image/'):
+            pil_img = PIL.Image.open(io.BytesIO(file_bytes))
+            image_format = pil_img.format.lower()
+        else:
+            image_format = content_type.split('/')[-1]
+        return file_bytes, image_format
 
 
 async def qq_image_url_to_base64(image_url: str) -> typing.Tuple[str, str]:
@@ -202,11 +205,11 @@ async def extract_b64_and_format(image_base64_data: str) -> typing.Tuple[str, st
 async def get_slack_image_to_base64(pic_url: str, bot_token: str):
     headers = {'Authorization': f'Bearer {bot_token}'}
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(pic_url, headers=headers) as resp:
-                mime_type = resp.headers.get("Content-Type", "application/octet-stream")
-                file_bytes = await resp.read()
-                base64_str = base64.b64encode(file_bytes).decode("utf-8")
-            return f"data:{mime_type};base64,{base64_str}"
+        session = httpclient.get_aiohttp_session(trust_env=False)
+        async with session.get(pic_url, headers=headers) as resp:
+            mime_type = resp.headers.get("Content-Type", "application/octet-stream")
+            file_bytes = await resp.read()
+            base64_str = base64.b64encode(file_bytes).decode("utf-8")
+        return f"data:{mime_type};base64,{base64_str}"
     except Exception as e:
         raise (e)
\ No newline at end of file
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import bisect
+import math
+
+
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+"""默认延迟分桶上界（秒）"""
+
+
+class Histogram:
+    """分桶直方图，用于统计延迟等数值的分布
+
+    只保存各桶计数，内存占用固定，observe 为 O(log(桶数))。
+    """
+
+    buckets: tuple[float, ...]
+    """各桶上界，最后隐含一个 +Inf 桶"""
+
+    counts: list[int]
+
+    count: int
+
+    sum: float
+
+    min: float
+
+    max: float
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value < self.min:
+            self.min = value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """估算分位数，返回所在桶的上界（落在 +Inf 桶时返回观测到的最大值）"""
+        if self.count == 0:
+            return 0.0
+
+        rank = q * self.count
+        accumulated = 0
+        for i, bucket_count in enumerate(self.counts):
+            accumulated += bucket_count
+            if accumulated >= rank and bucket_count > 0:
+                return min(self.buckets[i], self.max) if i < len(self.buckets) else self.max
+
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'sum': self.sum,
+            'avg': self.sum / self.count if self.count else 0.0,
+            'min': self.min if self.count else 0.0,
+            'max': self.max,
+            'p50': self.quantile(0.5),
+            'p95': self.quantile(0.95),
+            'p99': self.quantile(0.99),
+            'buckets': {
+                **{str(bound): self.counts[i] for i, bound in enumerate(self.buckets)},
+                '+Inf': self.counts[-1],
+            },
+        }
@@ -0,0 +1,134 @@
+# 流水线执行开销基准测试
+# 在项目根目录执行: python res/scripts/bench_pipeline_exec.py
+#
+# 各阶段直接返回预先构造好的结果，只测量调度本身的开销，
+# 对比旧的递归 + isinstance 判断实现与加载时编译执行方式的新实现。
+import asyncio
+import logging
+import os
+import sys
+import time
+import types
+import typing
+
+sys.path.insert(0, os.getcwd())
+
+from pkg.core import app  # noqa: E402, F401  先导入 app 以避免循环导入
+from pkg.core import entities as core_entities  # noqa: E402
+from pkg.pipeline import entities as pipeline_entities, pipelinemgr, stage  # noqa: E402
+
+ROUNDS = 20000
+STAGE_COUNT = 12
+
+
+class AsyncResultStage(stage.PipelineStage):
+    async def process(self, query, stage_inst_name):
+        return self.result
+
+
+class GeneratorStage(stage.PipelineStage):
+    async def process(self, query, stage_inst_name):
+        yield self.result
+
+
+async def legacy_execute_from_stage(pipeline: pipelinemgr.RuntimePipeline, stage_index: int, query):
+    """改造前的实现，用于对比"""
+    i = stage_index
+
+    while i < len(pipeline.stage_containers):
+        stage_container = pipeline.stage_containers[i]
+
+        query.current_stage = stage_container
+
+        result = stage_container.inst.process(query, stage_container.inst_name)
+
+        if isinstance(result, typing.Coroutine):
+            result = await result
+
+        if isinstance(result, pipeline_entities.StageProcessResult):
+            pipeline.ap.logger.debug(f'Stage {stage_container.inst_name} processed query {query} res {result}')
+            await pipeline._check_output(query, result)
+
+            if result.result_type == pipeline_entities.ResultType.INTERRUPT:
+                pipeline.ap.logger.debug(f'Stage {stage_container.inst_name} interrupted query {query}')
+                break
+            elif result.result_type == pipeline_entities.ResultType.CONTINUE:
+                query = result.new_query
+        elif isinstance(result, typing.AsyncGenerator):
+            pipeline.ap.logger.debug(f'Stage {stage_container.inst_name} processed query {query} gen')
+
+            async for sub_result in result:
+                pipeline.ap.logger.debug(f'Stage {stage_container.inst_name} processed query {query} res {sub_result}')
+                await pipeline._check_output(query, sub_result)
+
+                if sub_result.result_type == pipeline_entities.ResultType.INTERRUPT:
+                    pipeline.ap.logger.debug(f'Stage {stage_container.inst_name} interrupted query {query}')
+                    break
+                elif sub_result.result_type == pipeline_entities.ResultType.CONTINUE:
+                    query = sub_result.new_query
+                    await legacy_execute_from_stage(pipeline, i + 1, query)
+            break
+
+        i += 1
+
+
+def build_pipeline(ap, query) -> pipelinemgr.RuntimePipeline:
+    result = pipeline_entities.StageProcessResult.construct(
+        result_type=pipeline_entities.ResultType.CONTINUE,
+        new_query=query,
+        user_notice=None,
+        console_notice='',
+        debug_notice='',
+        error_notice='',
+    )
+
+    containers = []
+    for i in range(STAGE_COUNT):
+        # 与默认流水线相近：中间两个阶段为生成器
+        stage_cls = GeneratorStage if i in (6, 9) else AsyncResultStage
+        inst = stage_cls(ap)
+        inst.result = result
+        containers.append(pipelinemgr.StageInstContainer(inst_name=f'stage-{i}', inst=inst))
+
+    return pipelinemgr.RuntimePipeline(ap, types.SimpleNamespace(config={}), containers)
+
+
+async def bench(name: str, run: typing.Callable[[], typing.Awaitable[None]]):
+    for _ in range(ROUNDS // 10):
+        await run()
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        await run()
+    elapsed = time.perf_counter() - start
+
+    per_query_us = elapsed / ROUNDS * 1e6
+    print(f'{name:<10} {per_query_us:8.2f} us/query {per_query_us / STAGE_COUNT:8.2f} us/stage')
+
+
+async def main():
+    logger = logging.getLogger('bench')
+    logger.setLevel(logging.INFO)
+    ap = types.SimpleNamespace(logger=logger)
+
+    query = core_entities.Query(
+        query_id=0,
+        launcher_type=core_entities.LauncherTypes.PERSON,
+        launcher_id=0,
+        sender_id=0,
+        message_event=None,
+        message_chain=None,
+        adapter=None,
+        resp_messages=[],
+        resp_message_chain=[],
+    )
+
+    pipeline = build_pipeline(ap, query)
+
+    print(f'{STAGE_COUNT} stages, {ROUNDS} rounds')
+    await bench('legacy', lambda: legacy_execute_from_stage(pipeline, 0, query))
+    await bench('compiled', lambda: pipeline._execute_from_stage(0, query))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
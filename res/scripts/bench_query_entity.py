@@ -0,0 +1,141 @@
+# Query 对象开销基准测试
+# 在项目根目录执行: python res/scripts/bench_query_entity.py
+#
+# 对比改造前的 pydantic 模型与现在的 __slots__ 实现：
+# 构造、经过各阶段的 StageProcessResult、debug 日志中的 repr，以及单个对象的内存分配。
+import os
+import sys
+import time
+import tracemalloc
+import typing
+
+import pydantic.v1 as pydantic
+
+sys.path.insert(0, os.getcwd())
+
+from pkg.core import app  # noqa: E402, F401  先导入 app 以避免循环导入
+from pkg.core import entities as core_entities  # noqa: E402
+from pkg.pipeline import entities as pipeline_entities  # noqa: E402
+from pkg.platform import adapter as msadapter  # noqa: E402
+from pkg.platform.types import entities as platform_entities, events as platform_events, message as platform_message  # noqa: E402
+from pkg.provider import entities as llm_entities  # noqa: E402
+
+ROUNDS = 20000
+STAGE_COUNT = 12
+
+
+class LegacyQuery(pydantic.BaseModel):
+    """改造前的实现，用于对比"""
+
+    query_id: int
+    launcher_type: core_entities.LauncherTypes
+    launcher_id: typing.Union[int, str]
+    sender_id: typing.Union[int, str]
+    message_event: platform_events.MessageEvent
+    message_chain: platform_message.MessageChain
+    bot_uuid: typing.Optional[str] = None
+    pipeline_uuid: typing.Optional[str] = None
+    pipeline_config: typing.Optional[dict[str, typing.Any]] = None
+    adapter: msadapter.MessagePlatformAdapter
+    session: typing.Optional[core_entities.Session] = None
+    messages: typing.Optional[list[llm_entities.Message]] = []
+    prompt: typing.Optional[llm_entities.Prompt] = None
+    user_message: typing.Optional[llm_entities.Message] = None
+    variables: typing.Optional[dict[str, typing.Any]] = None
+    use_funcs: typing.Optional[list] = None
+    resp_messages: typing.Optional[list] = []
+    resp_message_chain: typing.Optional[list[platform_message.MessageChain]] = None
+    current_stage: typing.Optional[typing.Any] = None
+    enqueue_time: typing.Optional[float] = None
+    deadline: typing.Optional[float] = None
+
+    class Config:
+        arbitrary_types_allowed = True
+
+
+class LegacyStageProcessResult(pipeline_entities.StageProcessResult):
+    new_query: LegacyQuery
+
+
+class DummyAdapter(msadapter.MessagePlatformAdapter):
+    def __init__(self):
+        pass
+
+
+def make_kwargs() -> dict:
+    message_chain = platform_message.MessageChain([platform_message.Plain(text='hello')])
+    return dict(
+        query_id=0,
+        launcher_type=core_entities.LauncherTypes.PERSON,
+        launcher_id=12345,
+        sender_id=12345,
+        message_event=platform_events.FriendMessage(
+            sender=platform_entities.Friend(id=12345, nickname='bench', remark='bench'),
+            message_chain=message_chain,
+            time=0,
+        ),
+        message_chain=message_chain,
+        adapter=DummyAdapter(),
+        bot_uuid='bench-bot',
+        pipeline_uuid='bench-pipeline',
+        resp_messages=[],
+        resp_message_chain=[],
+    )
+
+
+def bench(name: str, run: typing.Callable[[], typing.Any]):
+    for _ in range(ROUNDS // 10):
+        run()
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        run()
+    elapsed = time.perf_counter() - start
+
+    print(f'{name:<32} {elapsed / ROUNDS * 1e6:8.2f} us')
+
+
+def measure_alloc(name: str, factory: typing.Callable[[], typing.Any]):
+    tracemalloc.start()
+    snapshot_before = tracemalloc.take_snapshot()
+    objs = [factory() for _ in range(1000)]
+    snapshot_after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+
+    allocated = sum(stat.size_diff for stat in snapshot_after.compare_to(snapshot_before, 'filename'))
+    print(f'{name:<32} {allocated / len(objs):8.0f} B/query')
+
+
+def main():
+    kwargs = make_kwargs()
+
+    legacy_query = LegacyQuery(**kwargs)
+    query = core_entities.Query(**kwargs)
+
+    def legacy_pipeline():
+        q = legacy_query
+        for _ in range(STAGE_COUNT):
+            q = LegacyStageProcessResult(result_type=pipeline_entities.ResultType.CONTINUE, new_query=q).new_query
+
+    def slots_pipeline():
+        q = query
+        for _ in range(STAGE_COUNT):
+            q = pipeline_entities.StageProcessResult(
+                result_type=pipeline_entities.ResultType.CONTINUE, new_query=q
+            ).new_query
+
+    print(f'{ROUNDS} rounds, {STAGE_COUNT} stages')
+    bench('construct legacy', lambda: LegacyQuery(**kwargs))
+    bench('construct slots', lambda: core_entities.Query(**kwargs))
+    bench('stage results legacy', legacy_pipeline)
+    bench('stage results slots', slots_pipeline)
+    bench('repr legacy', lambda: repr(legacy_query))
+    bench('repr slots', lambda: repr(query))
+    bench('validate slots (plugin event)', query.validate)
+
+    measure_alloc('alloc legacy', lambda: LegacyQuery(**kwargs))
+    measure_alloc('alloc slots', lambda: core_entities.Query(**kwargs))
+
+
+if __name__ == '__main__':
+    main()
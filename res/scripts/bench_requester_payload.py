@@ -0,0 +1,79 @@
+# 请求消息转换开销基准测试
+# 在项目根目录执行: python res/scripts/bench_requester_payload.py
+#
+# 50 回合的前文，每轮对话只新增一条用户消息。
+# 对比改造前每次请求都对整个前文执行 dict() 并合并文本的实现，与按消息缓存转换结果的新实现。
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.getcwd())
+
+from pkg.core import app  # noqa: E402, F401  先导入 app 以避免循环导入
+from pkg.provider import entities as llm_entities  # noqa: E402
+from pkg.provider.modelmgr.requesters import anthropicmsgs, chatcmpl  # noqa: E402
+
+ROUNDS = 2000
+HISTORY_ROUNDS = 50
+
+
+def make_history() -> list[llm_entities.Message]:
+    messages = [llm_entities.Message(role='system', content='You are a helpful assistant.')]
+
+    for i in range(HISTORY_ROUNDS):
+        messages.append(
+            llm_entities.Message(
+                role='user',
+                content=[llm_entities.ContentElement.from_text(f'question {i} ' * 20)],
+            )
+        )
+        messages.append(llm_entities.Message(role='assistant', content=f'answer {i} ' * 60))
+
+    return messages
+
+
+def legacy_openai_serialize(messages: list[llm_entities.Message]) -> list[dict]:
+    """改造前的实现，用于对比"""
+    req_messages = []
+    for m in messages:
+        msg_dict = m.dict(exclude_none=True)
+        content = msg_dict.get('content')
+        if isinstance(content, list):
+            if all(isinstance(part, dict) and part.get('type') == 'text' for part in content):
+                msg_dict['content'] = '\n'.join(part['text'] for part in content)
+        req_messages.append(msg_dict)
+    return req_messages
+
+
+async def bench(name: str, run):
+    history = make_history()
+
+    start = time.perf_counter()
+    for i in range(ROUNDS):
+        # 每轮只有本次的用户消息是新的
+        await run(history + [llm_entities.Message(role='user', content=f'new question {i}')])
+    elapsed = time.perf_counter() - start
+
+    print(f'{name:<32} {elapsed / ROUNDS * 1e6:10.2f} us/turn')
+
+
+async def main():
+    openai_requester = chatcmpl.OpenAIChatCompletions(None, {})
+    anthropic_requester = anthropicmsgs.AnthropicMessages(None, {})
+
+    async def legacy_openai(messages):
+        return legacy_openai_serialize(messages)
+
+    async def anthropic_uncached(messages):
+        return [await anthropic_requester._serialize_message(m) for m in messages]
+
+    print(f'{ROUNDS} turns, {HISTORY_ROUNDS} rounds of history ({HISTORY_ROUNDS * 2 + 2} messages per request)')
+    await bench('openai legacy', legacy_openai)
+    await bench('openai cached', openai_requester.serialize_messages)
+    await bench('anthropic uncached', anthropic_uncached)
+    await bench('anthropic cached', anthropic_requester.serialize_messages)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
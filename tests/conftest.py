@@ -0,0 +1,2 @@
+# 与程序启动时相同，先导入 app，避免单独导入各模块时出现循环导入
+import pkg.core.app  # noqa: F401
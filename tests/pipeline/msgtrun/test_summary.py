@@ -0,0 +1,65 @@
+import types
+
+import pytest
+
+from pkg.pipeline.msgtrun.truncators import summary
+from pkg.provider import entities as llm_entities
+from pkg.provider.modelmgr.requesters import anthropicmsgs
+
+
+def _make_query(prompt_messages: list[llm_entities.Message]) -> types.SimpleNamespace:
+    messages = [
+        llm_entities.Message(role='user', content='hi'),
+        llm_entities.Message(role='assistant', content='hello'),
+    ]
+
+    return types.SimpleNamespace(
+        query_id=1,
+        pipeline_config={'ai': {'local-agent': {'max-round': 10}}},
+        session=types.SimpleNamespace(
+            using_conversation=types.SimpleNamespace(messages=messages, summary='The user likes cats.')
+        ),
+        messages=list(messages),
+        prompt=llm_entities.Prompt(name='default', messages=prompt_messages),
+    )
+
+
+@pytest.mark.asyncio
+async def test_summary_is_merged_into_system_prompt():
+    truncator = summary.SummaryTruncator(ap=None)
+    query = _make_query([llm_entities.Message(role='system', content='You are a helpful assistant.')])
+
+    query = await truncator.truncate(query)
+
+    assert [m.role for m in query.prompt.messages] == ['system']
+    assert query.prompt.messages[0].content == (
+        'You are a helpful assistant.\n\n' + summary.SUMMARY_PREFIX + 'The user likes cats.'
+    )
+
+
+@pytest.mark.asyncio
+async def test_summary_without_system_prompt():
+    truncator = summary.SummaryTruncator(ap=None)
+    query = _make_query([])
+
+    query = await truncator.truncate(query)
+
+    assert query.prompt.messages == [
+        llm_entities.Message(role='system', content=summary.SUMMARY_PREFIX + 'The user likes cats.')
+    ]
+
+
+@pytest.mark.asyncio
+async def test_anthropic_args_with_summary():
+    truncator = summary.SummaryTruncator(ap=None)
+    query = _make_query([llm_entities.Message(role='system', content='You are a helpful assistant.')])
+
+    query = await truncator.truncate(query)
+
+    requester = anthropicmsgs.AnthropicMessages(ap=None, config={})
+    model = types.SimpleNamespace(model_entity=types.SimpleNamespace(name='claude'))
+
+    args = await requester._make_args(model, query.prompt.messages + query.messages)
+
+    assert 'The user likes cats.' in args['system']
+    assert [m['role'] for m in args['messages']] == ['user', 'assistant']
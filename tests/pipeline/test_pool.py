@@ -0,0 +1,56 @@
+import collections
+import types
+
+from pkg.pipeline import pool
+from pkg.platform.types import message as platform_message
+
+
+def _make_pool() -> pool.QueryPool:
+    ap = types.SimpleNamespace(
+        instance_config=types.SimpleNamespace(
+            data={
+                'admins': [],
+                'command': {'prefix': ['!', '！']},
+                'concurrency': {'session': 1},
+                'query-pool': {'coalesce-window': 2},
+            }
+        )
+    )
+    return pool.QueryPool(ap)
+
+
+def _make_query(text: str, sender_id: str = 'user') -> types.SimpleNamespace:
+    return types.SimpleNamespace(
+        sender_id=sender_id,
+        message_chain=platform_message.MessageChain([platform_message.Plain(text)]),
+    )
+
+
+def test_coalesce_merges_consecutive_messages():
+    query_pool = _make_pool()
+    query = _make_query('hi')
+    queue = collections.deque([_make_query('there'), _make_query('other', sender_id='other')])
+
+    assert query_pool._coalesce(query, queue) == 1
+    assert str(query.message_chain) == 'hi\nthere'
+    assert len(queue) == 1
+
+
+def test_coalesce_stops_at_command():
+    query_pool = _make_pool()
+    query = _make_query('hi')
+    queue = collections.deque([_make_query('!reset'), _make_query('hello')])
+
+    assert query_pool._coalesce(query, queue) == 0
+    assert str(query.message_chain) == 'hi'
+    assert len(queue) == 2
+
+
+def test_command_does_not_merge_following_messages():
+    query_pool = _make_pool()
+    query = _make_query('！reset')
+    queue = collections.deque([_make_query('hi')])
+
+    assert query_pool._coalesce(query, queue) == 0
+    assert str(query.message_chain) == '！reset'
+    assert len(queue) == 1
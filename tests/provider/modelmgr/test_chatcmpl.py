@@ -0,0 +1,84 @@
+import json
+
+import httpx
+import openai
+import pytest
+
+from pkg.provider.modelmgr.requesters import chatcmpl
+
+
+def _sse(*chunks: dict) -> bytes:
+    return b''.join(f'data: {json.dumps(chunk)}\n\n'.encode() for chunk in chunks) + b'data: [DONE]\n\n'
+
+
+def _chunk(content: str) -> dict:
+    return {
+        'id': 'chatcmpl-1',
+        'object': 'chat.completion.chunk',
+        'created': 0,
+        'model': 'test',
+        'choices': [{'index': 0, 'delta': {'role': 'assistant', 'content': content}, 'finish_reason': None}],
+    }
+
+
+def _make_requester(accept_stream_options: bool) -> tuple[chatcmpl.OpenAIChatCompletions, list[dict]]:
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        requests.append(body)
+
+        if 'stream_options' in body and not accept_stream_options:
+            return httpx.Response(400, json={'error': {'message': 'Unrecognized request argument: stream_options'}})
+
+        return httpx.Response(
+            200, headers={'content-type': 'text/event-stream'}, content=_sse(_chunk('Hel'), _chunk('lo'))
+        )
+
+    requester = chatcmpl.OpenAIChatCompletions(ap=None, config={})
+    requester.client = openai.AsyncClient(
+        api_key='test',
+        base_url='http://test/v1',
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+
+    return requester, requests
+
+
+async def _collect(requester: chatcmpl.OpenAIChatCompletions):
+    stream = chatcmpl.ChatCompletionStream()
+
+    async for chunk in await requester._req_stream({'model': 'test', 'messages': []}, api_key='test'):
+        stream.feed(chunk)
+
+    return stream.make_msg()
+
+
+@pytest.mark.asyncio
+async def test_stream_requests_usage():
+    requester, requests = _make_requester(accept_stream_options=True)
+
+    message = await _collect(requester)
+
+    assert message.content == 'Hello'
+    assert requests[0]['stream_options'] == {'include_usage': True}
+    assert requester.stream_usage_supported
+
+
+@pytest.mark.asyncio
+async def test_stream_retries_without_stream_options():
+    requester, requests = _make_requester(accept_stream_options=False)
+
+    message = await _collect(requester)
+
+    assert message.content == 'Hello'
+    assert message.usage is None
+    assert len(requests) == 2
+    assert 'stream_options' not in requests[1]
+    assert not requester.stream_usage_supported
+
+    # 之后的请求不再发送 stream_options
+    await _collect(requester)
+    assert len(requests) == 3
+    assert 'stream_options' not in requests[2]
@@ -0,0 +1,129 @@
+import asyncio
+import time
+
+import pytest
+
+from pkg.provider.modelmgr import limiter
+
+
+@pytest.mark.asyncio
+async def test_acquire_queues_over_concurrency_limit():
+    model_limiter = limiter.ModelLimiter(max_concurrency=1)
+
+    await model_limiter.acquire()
+
+    task = asyncio.create_task(model_limiter.acquire())
+    await asyncio.sleep(0.01)
+
+    assert not task.done()
+    assert model_limiter.waiting == 1
+
+    await model_limiter.release()
+    await asyncio.wait_for(task, 1)
+
+    assert model_limiter.active == 1
+    assert model_limiter.waiting == 0
+
+
+@pytest.mark.asyncio
+async def test_cancel_while_reacquiring_pipeline_slot():
+    model_limiter = limiter.ModelLimiter(max_concurrency=1)
+    semaphore = asyncio.Semaphore(1)
+
+    await model_limiter.acquire()
+
+    async def query():
+        slot = limiter.PipelineSlot(semaphore)
+        limiter.current_pipeline_slot.set(slot)
+
+        async with slot:
+            await model_limiter.acquire()
+
+    task = asyncio.create_task(query())
+    await asyncio.sleep(0.01)
+
+    # 排队期间归还了流水线名额，被另一个请求取走
+    other_slot = limiter.PipelineSlot(semaphore)
+    await asyncio.wait_for(other_slot.acquire(), 1)
+
+    # 模型空出后请求计入 active，然后等待取回流水线名额
+    await model_limiter.release()
+    await asyncio.sleep(0.01)
+    assert model_limiter.active == 1
+
+    task.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    assert model_limiter.active == 0
+    assert model_limiter.is_idle()
+
+    other_slot.release()
+
+
+def test_rpm_delay():
+    model_limiter = limiter.ModelLimiter(rpm_limit=2)
+    now = time.monotonic()
+
+    model_limiter._request_times.extend([now - 10, now - 5])
+
+    assert model_limiter._get_delay(now) == pytest.approx(limiter.RATE_WINDOW - 10)
+    assert model_limiter._get_delay(now + limiter.RATE_WINDOW) == 0.0
+
+
+def test_tpm_delay():
+    model_limiter = limiter.ModelLimiter(tpm_limit=100)
+
+    model_limiter.record_tokens(60)
+    assert model_limiter.is_idle()
+
+    model_limiter.record_tokens(60)
+    now = time.monotonic()
+
+    assert model_limiter._get_delay(now) > limiter.RATE_WINDOW - 1
+    assert model_limiter._get_delay(now + limiter.RATE_WINDOW) == 0.0
+
+
+def test_pause_after_rate_limited():
+    model_limiter = limiter.ModelLimiter()
+
+    model_limiter.on_rate_limited(pause=30)
+
+    assert not model_limiter.is_idle()
+    assert model_limiter._get_delay(time.monotonic()) > 29
+
+
+def test_aimd_recovers_to_max_concurrency():
+    model_limiter = limiter.ModelLimiter(max_concurrency=4)
+    model_limiter.active = 4
+
+    model_limiter.on_rate_limited()
+
+    assert model_limiter.throttled_count == 1
+    assert model_limiter.concurrency_limit == 2
+
+    model_limiter.active = 0
+
+    for _ in range(20):
+        model_limiter.on_success()
+
+    assert model_limiter.concurrency_limit == 4
+
+
+def test_aimd_removes_limit_without_max_concurrency():
+    model_limiter = limiter.ModelLimiter()
+    model_limiter.active = 4
+
+    model_limiter.on_rate_limited()
+
+    assert model_limiter.concurrency_limit == 2
+
+    model_limiter.on_success()
+    assert 2 < model_limiter.concurrency_limit < 3
+
+    model_limiter.active = 0
+
+    for _ in range(100):
+        model_limiter.on_success()
+
+    assert model_limiter.concurrency_limit is None
@@ -0,0 +1,83 @@
+from pkg.provider import entities as llm_entities
+from pkg.provider.modelmgr import respcache
+from pkg.provider.tools import entities as tools_entities
+
+
+def test_normalize_text():
+    assert respcache.normalize_text('  Ｈｅｌｌｏ，\n  World！ ') == respcache.normalize_text('hello, world')
+    assert respcache.normalize_text('What is 1.5?') == 'what is 1.5'
+    assert respcache.normalize_text('1.5') != respcache.normalize_text('15')
+
+
+def _messages(question: str) -> list[llm_entities.Message]:
+    return [
+        llm_entities.Message(role='system', content='You are a helpful assistant.'),
+        llm_entities.Message(role='user', content=question),
+    ]
+
+
+def test_exact_match():
+    cache = respcache.ResponseCache()
+    reply = llm_entities.Message(role='assistant', content='1.5 + 1 = 2.5')
+
+    cache.put(cache.make_key('model', _messages('What is 1.5 + 1?')), reply, ttl=60)
+
+    assert cache.get(cache.make_key('model', _messages('what is 1.5 + 1'))).content == reply.content
+    assert cache.get(cache.make_key('model', _messages('What is 15 + 1?'))) is None
+    assert cache.get(cache.make_key('other-model', _messages('What is 1.5 + 1?'))) is None
+    assert cache.hit_count == 1
+    assert cache.miss_count == 2
+
+
+def test_similar_match():
+    cache = respcache.ResponseCache()
+    reply = llm_entities.Message(role='assistant', content='See the docs.')
+
+    cache.put(cache.make_key('model', _messages('how do I install the bot')), reply, ttl=60)
+    key = cache.make_key('model', _messages('how do I install this bot'))
+
+    assert cache.get(key) is None
+    assert cache.get(key, similarity=0.7).content == reply.content
+    assert cache.similar_hit_count == 1
+
+
+def test_zero_ttl_and_eviction():
+    cache = respcache.ResponseCache(max_entries=1)
+    reply = llm_entities.Message(role='assistant', content='ok')
+
+    uncached_key = cache.make_key('model', _messages('uncached'))
+    cache.put(uncached_key, reply, ttl=0)
+    assert cache.get(uncached_key) is None
+
+    first_key = cache.make_key('model', _messages('first'))
+    cache.put(first_key, reply, ttl=60)
+    cache.put(cache.make_key('model', _messages('second')), reply, ttl=60)
+
+    assert cache.get(first_key) is None
+    assert cache.eviction_count == 1
+
+
+def test_bypass_tool_calls():
+    cache = respcache.ResponseCache()
+    messages = _messages('hello')
+    messages.insert(1, llm_entities.Message(role='tool', content='result', tool_call_id='call_1'))
+
+    assert cache.make_key('model', messages) is None
+    assert cache.bypass_count == 1
+
+
+def test_tools_are_part_of_key():
+    cache = respcache.ResponseCache()
+    reply = llm_entities.Message(role='assistant', content='ok')
+    func = tools_entities.LLMFunction(
+        name='search',
+        human_desc='search',
+        description='search the web',
+        parameters={},
+        func=lambda: None,
+    )
+
+    cache.put(cache.make_key('model', _messages('hello')), reply, ttl=60)
+
+    assert cache.get(cache.make_key('model', _messages('hello'), [func])) is None
+    assert cache.get(cache.make_key('model', _messages('hello'), [])) is not None
@@ -0,0 +1,61 @@
+import types
+
+import pytest
+
+from pkg.provider import entities as llm_entities
+from pkg.provider.modelmgr import respcache
+from pkg.provider.runners import localagent
+
+
+class FakeModelManager:
+    def __init__(self, answer_model_uuid: str):
+        self.answer_model_uuid = answer_model_uuid
+        self.response_cache = respcache.ResponseCache()
+        self.request_count = 0
+
+    def get_fallback_chain(self, primary, local_agent_cfg):
+        return [(primary, None)]
+
+    async def invoke_llm(self, query, chain, messages, funcs=None, hedge=False):
+        self.request_count += 1
+        return llm_entities.Message(role='assistant', content='hello', model_uuid=self.answer_model_uuid)
+
+
+def _make_query() -> types.SimpleNamespace:
+    return types.SimpleNamespace(
+        pipeline_config={'ai': {'local-agent': {'response-cache': True}}},
+        use_llm_model=types.SimpleNamespace(model_entity=types.SimpleNamespace(uuid='primary')),
+        use_funcs=[],
+    )
+
+
+async def _invoke(runner: localagent.LocalAgentRunner) -> llm_entities.Message:
+    messages = [llm_entities.Message(role='user', content='hi')]
+
+    async for msg in runner._invoke(_make_query(), messages, stream=False):
+        pass
+
+    return msg
+
+
+@pytest.mark.asyncio
+async def test_primary_reply_is_cached():
+    model_mgr = FakeModelManager('primary')
+    runner = localagent.LocalAgentRunner(types.SimpleNamespace(model_mgr=model_mgr), {})
+
+    await _invoke(runner)
+    await _invoke(runner)
+
+    assert model_mgr.request_count == 1
+
+
+@pytest.mark.asyncio
+async def test_fallback_reply_is_not_cached():
+    model_mgr = FakeModelManager('fallback')
+    runner = localagent.LocalAgentRunner(types.SimpleNamespace(model_mgr=model_mgr), {})
+
+    await _invoke(runner)
+    await _invoke(runner)
+
+    assert model_mgr.request_count == 2
+    assert len(model_mgr.response_cache.entries) == 0